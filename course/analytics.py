@@ -25,24 +25,29 @@ THE SOFTWARE.
 
 import json
 import operator
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
+from itertools import pairwise, repeat
 from typing import TYPE_CHECKING, Any, ClassVar, final
 
 from django import http
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
+from django.core.exceptions import (
+    ObjectDoesNotExist,
+    PermissionDenied,
+    SuspiciousOperation,
+)
 from django.db import connection
-from django.db.models import FloatField, OuterRef, Subquery
+from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils.translation import gettext as _, pgettext
-from pytools import not_none
 
 from course.constants import FlowPermission, ParticipationPermission as PPerm
 from course.content import FlowDesc, get_flow_desc
 from course.models import FlowPageVisit, FlowPageVisitGrade, FlowSession
 from course.utils import (
     CoursePageContext,
+    EchoBuffer,
     PageInstanceCache,
     course_view,
     render_course_page,
@@ -50,9 +55,34 @@ from course.utils import (
 
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import (
+        Callable,
+        Collection,
+        Iterable,
+        Iterator,
+        Set as AbstractSet,
+    )
+
+    from django.db.models import QuerySet
+
+    from course.models import Course, FlowAnalyticsSnapshot
+    from course.page.base import PageBase, PageContext
+    from course.repo import Repo_ish, RevisionID_ish
+
 
-    from course.page.base import PageBase
+@dataclass(frozen=True)
+class AnalyticsContext:
+    """The parts of a :class:`~course.utils.CoursePageContext` needed to
+    compute analytics outside of a request, e.g. in a task.
+    """
+
+    course: Course
+    repo: Repo_ish
+    course_commit_sha: RevisionID_ish
+
+    @property
+    def course_identifier(self) -> str:
+        return self.course.identifier
 
 
 # {{{ flow list
@@ -110,35 +140,43 @@ class Histogram:
         self.num_bin_title_formatter = num_bin_title_formatter
 
     def add_data_point(self, value: float | str | None, weight: float = 1):
-        if isinstance(value, str):
-            self.string_weights[value] = \
-                    self.string_weights.get(value, 0) + weight
-        elif value is None:
-            self.add_data_point(
-                "".join([
-                        "(",
-                        pgettext("No data", "None"),
-                        ")"]),
-                weight)
-        else:
-            if (self.num_max_value is not None
-                    and value > self.num_max_value):
-                self.add_data_point(
-                    "".join([
-                            "(",
-                            pgettext("Value of grade", "value greater than max"),
-                            ")"]),
-                    weight)
-            elif (self.num_min_value is not None
-                    and value < self.num_min_value):
-                self.add_data_point(
-                    "".join([
-                            "(",
-                            pgettext("Value of grade", "value smaller than min"),
-                            ")"]),
-                    weight)
-            else:
-                self.num_values.append((value, weight))
+        self.add_data_points([value], [weight])
+
+    def add_data_points(self,
+                values: Iterable[float | str | None],
+                weights: Iterable[float] | None = None) -> None:
+        """Add many data points at once, e.g. straight from
+        :meth:`~django.db.models.query.QuerySet.values_list`.
+
+        :arg weights: if not given, each data point has a weight of 1.
+        """
+        if weights is None:
+            weights = repeat(1)
+
+        none_title = "".join(["(", pgettext("No data", "None"), ")"])
+        greater_title = "".join([
+                "(", pgettext("Value of grade", "value greater than max"), ")"])
+        smaller_title = "".join([
+                "(", pgettext("Value of grade", "value smaller than min"), ")"])
+
+        min_value = self.num_min_value
+        max_value = self.num_max_value
+        string_weights = self.string_weights
+        num_values = self.num_values
+
+        for value, weight in zip(values, weights, strict=False):
+            if value is None:
+                value = none_title
+            elif not isinstance(value, str):
+                if max_value is not None and value > max_value:
+                    value = greater_title
+                elif min_value is not None and value < min_value:
+                    value = smaller_title
+                else:
+                    num_values.append((value, weight))
+                    continue
+
+            string_weights[value] = string_weights.get(value, 0) + weight
 
     def total_weight(self):
         return (
@@ -181,22 +219,41 @@ class Histogram:
                         min_value+bin_width*i
                         for i in range(self.num_bin_count)]
 
-        bins: list[float] = [0 for _i in range(len(num_bin_starts))]
-
         temp_string_weights = self.string_weights.copy()
 
-        oob = pgettext("Value in histogram", "<out of bounds>")
-
-        from bisect import bisect
-        for value, weight in self.num_values:
-            if ((max_value is not None
-                    and value > max_value)
-                    or value < num_bin_starts[0]):
-                temp_string_weights[oob] = \
-                        temp_string_weights.get(oob, 0) + weight
-            else:
-                bin_nr = bisect(num_bin_starts, value)-1
-                bins[bin_nr] += weight
+        # Bin sorted values by looking up bin boundaries, using prefix sums
+        # of the weights.
+        from bisect import bisect_left, bisect_right
+        from itertools import accumulate
+
+        sorted_num_values = sorted(self.num_values, key=operator.itemgetter(0))
+        values = [value for value, _weight in sorted_num_values]
+        cumulative_weights = [
+                0, *accumulate(weight for _value, weight in sorted_num_values)]
+
+        first_index = bisect_left(values, num_bin_starts[0])
+        end_index = (
+                bisect_right(values, max_value)
+                if max_value is not None else len(values))
+        end_index = max(end_index, first_index)
+
+        bin_boundaries = [
+                first_index,
+                *(min(max(bisect_left(values, start), first_index), end_index)
+                    for start in num_bin_starts[1:]),
+                end_index]
+
+        bins: list[float] = [
+                cumulative_weights[bin_end] - cumulative_weights[bin_start]
+                for bin_start, bin_end in pairwise(bin_boundaries)]
+
+        oob_weight = (
+                cumulative_weights[first_index]
+                + cumulative_weights[-1] - cumulative_weights[end_index])
+        if first_index > 0 or end_index < len(values):
+            oob = pgettext("Value in histogram", "<out of bounds>")
+            temp_string_weights[oob] = \
+                    temp_string_weights.get(oob, 0) + oob_weight
 
         total_weight = self.total_weight()
 
@@ -220,19 +277,61 @@ class Histogram:
         return num_bin_info + str_bin_info
 
     def html(self):
-        bin_info_list = self.get_bin_info_list()
-        max_len = max(len(bin.title) for bin in bin_info_list)
+        return render_bin_info_list(self.get_bin_info_list())
 
-        if max_len < 20:
-            from django.template.loader import render_to_string
-            return render_to_string("course/histogram-wide.html", {
-                "bin_info_list": bin_info_list,
-                })
-        else:
-            from django.template.loader import render_to_string
-            return render_to_string("course/histogram.html", {
-                "bin_info_list": bin_info_list,
-                })
+
+def render_bin_info_list(bin_info_list: list[BinInfo]) -> str:
+    max_len = max(len(bin.title) for bin in bin_info_list)
+
+    if max_len < 20:
+        from django.template.loader import render_to_string
+        return render_to_string("course/histogram-wide.html", {
+            "bin_info_list": bin_info_list,
+            })
+    else:
+        from django.template.loader import render_to_string
+        return render_to_string("course/histogram.html", {
+            "bin_info_list": bin_info_list,
+            })
+
+
+@dataclass(frozen=True)
+class StoredHistogram:
+    """A :class:`Histogram` whose bins were computed earlier, as kept in
+    a :class:`course.models.FlowAnalyticsSnapshot`.
+    """
+
+    bin_info_list: list[BinInfo]
+    weight: float
+
+    @staticmethod
+    def from_histogram(hist: Histogram) -> StoredHistogram:
+        return StoredHistogram(
+                bin_info_list=hist.get_bin_info_list(),
+                weight=hist.total_weight())
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> StoredHistogram:
+        return StoredHistogram(
+                bin_info_list=[
+                    BinInfo(**bin_info) for bin_info in data["bin_info_list"]],
+                weight=data["weight"])
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "bin_info_list": [
+                asdict(bin_info) for bin_info in self.bin_info_list],
+            "weight": self.weight,
+            }
+
+    def total_weight(self):
+        return self.weight
+
+    def get_bin_info_list(self):
+        return self.bin_info_list
+
+    def html(self):
+        return render_bin_info_list(self.bin_info_list)
 
 # }}}
 
@@ -262,28 +361,45 @@ def is_page_multiple_submit(flow_desc: FlowDesc, page: PageBase):
 
 # {{{ flow analytics
 
-def make_grade_histogram(pctx: CoursePageContext, flow_id: str):
-    qset = FlowSession.objects.filter(
-            course=pctx.course,
-            flow_id=flow_id,
-            participation__roles__permissions__permission=(
-                PPerm.included_in_grade_statistics))
+def make_grade_histogram(
+            pctx: CoursePageContext | AnalyticsContext, flow_id: str):
+    from django.db.models import (
+        Case,
+        ExpressionWrapper,
+        F,
+        FloatField,
+        Q,
+        Value,
+        When,
+    )
+    from django.db.models.functions import Cast
+
+    percentages = (FlowSession.objects
+            .filter(
+                course=pctx.course,
+                flow_id=flow_id,
+                participation__roles__permissions__permission=(
+                    PPerm.included_in_grade_statistics))
+            .annotate(points_percentage=Case(
+                When(
+                    Q(points__isnull=False) & ~Q(max_points=0),
+                    then=ExpressionWrapper(
+                        100 * Cast("points", FloatField())
+                        / Cast(F("max_points"), FloatField()),
+                        output_field=FloatField())),
+                default=Value(None, output_field=FloatField())))
+            .values_list("in_progress", "points_percentage"))
+
+    in_progress_title = "".join(["<",
+            pgettext("Status of session", "in progress"),
+            ">"])
 
     hist = Histogram(
         num_min_value=0,
         num_max_value=100)
-    for session in qset:
-        if session.in_progress:
-            hist.add_data_point(
-                    "".join(["<",
-                        pgettext("Status of session", "in progress"),
-                        ">"]))
-        else:
-            pperc = session.points_percentage()
-            if pperc is not None:
-                pperc = float(pperc)
-
-            hist.add_data_point(pperc)
+    hist.add_data_points(
+            in_progress_title if in_progress else pperc
+            for in_progress, pperc in percentages)
 
     return hist
 
@@ -291,37 +407,111 @@ def make_grade_histogram(pctx: CoursePageContext, flow_id: str):
 NUM_QUARTILES = 4
 
 
+def _get_quartile_sessions(course: Course, flow_id: str) -> QuerySet[FlowSession]:
+    """Return the sessions of *flow_id* that are ranked into score quartiles:
+    completed sessions with a nonzero maximum score, of participants with
+    grade-statistics permission.
+    """
+    from course.models import Participation
+
+    return (FlowSession.objects
+            .filter(
+                course=course,
+                flow_id=flow_id,
+                in_progress=False,
+                points__isnull=False,
+                max_points__isnull=False,
+                participation__in=Participation.objects.filter(
+                    course=course,
+                    roles__permissions__permission=(
+                        PPerm.included_in_grade_statistics)))
+            .exclude(max_points=0))
+
+
+def _annotate_session_quartiles(
+        sessions: QuerySet[FlowSession]) -> QuerySet[FlowSession]:
+    """Annotate *sessions* with ``quartile``, the index (0 = Q1, ..., 3 = Q4)
+    of the quartile of each session's percentage score. Sessions are ranked
+    in the database.
+    """
+    from django.db.models import (
+        Count,
+        ExpressionWrapper,
+        F,
+        FloatField,
+        IntegerField,
+        Value,
+        Window,
+    )
+    from django.db.models.functions import Cast, RowNumber
+
+    rank = Window(
+            RowNumber(),
+            order_by=[
+                (Cast("points", FloatField())
+                    / Cast("max_points", FloatField())).asc(),
+                F("id").asc()])
+
+    # (rank - 1) < nsessions, so this is at most NUM_QUARTILES - 1.
+    return sessions.annotate(
+            quartile=ExpressionWrapper(
+                (rank - Value(1)) * Value(NUM_QUARTILES)
+                / Window(Count("id")),
+                output_field=IntegerField()))
+
+
 def compute_session_quartile_map(
-        pctx: CoursePageContext,
+        pctx: CoursePageContext | AnalyticsContext,
         flow_id: str) -> dict[int, int]:
     """Return a mapping from session ID to quartile index (0 = Q1, ..., 3 = Q4).
 
     Quartiles are assigned based on each session's percentage score, using only
     completed sessions for participants with grade-statistics permission.
+    Sessions are ranked in the database. The result is cached until a session
+    of the flow is completed, removed or regraded.
     """
-    sessions = FlowSession.objects.filter(
-            course=pctx.course,
-            flow_id=flow_id,
-            in_progress=False,
-            participation__roles__permissions__permission=(
-                PPerm.included_in_grade_statistics)
-    ).distinct()
-
-    session_scores: list[tuple[int, float]] = []
-    for session in sessions:
-        pperc = session.points_percentage()
-        if pperc is not None:
-            session_scores.append((session.id, float(pperc)))
-
-    if not session_scores:
+    from urllib.parse import quote_plus
+
+    from django.core import cache
+    from django.db.models import Count, Max, Sum
+
+    sessions = _get_quartile_sessions(pctx.course, flow_id)
+
+    cache_stamp = sessions.aggregate(
+            count=Count("id"),
+            max_id=Max("id"),
+            total_points=Sum("points"),
+            last_completion_time=Max("completion_time"))
+    if not cache_stamp["count"]:
         return {}
 
-    session_scores.sort(key=operator.itemgetter(1))
-    n = len(session_scores)
-    return {
-        sid: min(NUM_QUARTILES - 1, int(i * NUM_QUARTILES / n))
-        for i, (sid, _score) in enumerate(session_scores)
-    }
+    last_completion_time = cache_stamp["last_completion_time"]
+    cache_key = "%".join((
+        "RELATE_SESSION_QUARTILES",
+        str(pctx.course.id),
+        quote_plus(flow_id),
+        str(cache_stamp["count"]),
+        str(cache_stamp["max_id"]),
+        str(cache_stamp["total_points"]),
+        last_completion_time.isoformat() if last_completion_time else "",
+        ))
+
+    def_cache = cache.caches["default"]
+
+    result: dict[int, int] | None = None
+    # Memcache is apparently limited to 250 characters.
+    if len(cache_key) < 240:
+        result = def_cache.get(cache_key)
+    if result is not None:
+        return result
+
+    result = dict(_annotate_session_quartiles(sessions)
+            .values_list("id", "quartile"))
+
+    if len(cache_key) < 240:
+        def_cache.set(cache_key, result, None)
+
+    return result
 
 
 @dataclass
@@ -379,111 +569,251 @@ def safe_div(num: float, denom: float):
     return num/denom
 
 
-def make_page_answer_stats_list(
-            pctx: CoursePageContext,
-            flow_id: str,
-            restrict_to_first_attempt: bool):
-    flow_desc = get_flow_desc(pctx.repo, pctx.course, flow_id,
-            pctx.course_commit_sha)
+@dataclass
+class _PageVisitAggregate:
+    total_count: int = 0
+    empty_count: int = 0
+    graded_count: int = 0
+    points: float = 0
 
-    page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
+    def add(self, other: _PageVisitAggregate) -> None:
+        self.total_count += other.total_count
+        self.empty_count += other.empty_count
+        self.graded_count += other.graded_count
+        self.points += other.points
 
-    session_quartile_map = compute_session_quartile_map(pctx, flow_id)
 
-    page_info_list: list[PageAnswerStats] = []
-    for group_desc in flow_desc.groups:
-        for page_desc in group_desc.pages:
-            points = 0
-            graded_count = 0
-            empty_count = 0
-
-            answer_count = 0
-            total_count = 0
-
-            quartile_points: list[float] = [0.0] * NUM_QUARTILES
-            quartile_graded_counts: list[int] = [0] * NUM_QUARTILES
-
-            visits = (FlowPageVisit.objects
-                    .filter(
-                        flow_session__course=pctx.course,
-                        flow_session__flow_id=flow_id,
-                        flow_session__participation__roles__permissions__permission=(
-                            PPerm.included_in_grade_statistics),
-                        page_data__group_id=group_desc.id,
-                        page_data__page_id=page_desc.id,
-                        is_submitted_answer=True,
-                        ))
-
-            if connection.features.can_distinct_on_fields:
-                if restrict_to_first_attempt:
-                    visits = (visits
-                            .distinct("flow_session__participation__id")
-                            .order_by("flow_session__participation__id",
-                                "visit_time"))
-                elif is_page_multiple_submit(flow_desc, page_desc):
-                    visits = (visits
-                            .distinct("page_data__id")
-                            .order_by("page_data__id", "-visit_time"))
-
-            latest_grade_correctness = Subquery(
-                    FlowPageVisitGrade.objects.filter(
-                        visit=OuterRef("pk"),
-                    ).order_by("-grade_time").values("correctness")[:1],
-                    output_field=FloatField(),
-                    )
+@dataclass
+class _PageAggregates:
+    overall: _PageVisitAggregate
+    # sums of latest grade correctness and graded counts, per quartile
+    quartile_points: list[float]
+    quartile_graded_counts: list[int]
+    sample_page_data_id: int
 
-            visits = (visits
-                    .select_related("flow_session")
-                    .select_related("page_data")
-                    .annotate(latest_grade_correctness=latest_grade_correctness))
 
-            answer_expected = False
+def _get_page_visit_aggregates(
+            pctx: CoursePageContext | AnalyticsContext,
+            flow_id: str,
+            restrict_to_first_attempt: bool,
+            multiple_submit_pages: set[tuple[str, str]],
+            page_ids: Collection[str] | None = None,
+        ) -> dict[tuple[str, str], _PageAggregates]:
+    """Aggregate submitted answer visits (and their latest grades) in one
+    query for all pages of the flow, returning a mapping from
+    (group ID, page ID) to aggregates.
+
+    On databases that support ``DISTINCT ON``, only the first attempt of
+    each participant is counted if *restrict_to_first_attempt*, otherwise
+    only the latest visit of each page in *multiple_submit_pages* in
+    each session.
+
+    Visits are attributed to the score quartile of their session (see
+    :func:`compute_session_quartile_map`), which is ranked in the same query.
+
+    If *page_ids* is given, only visits to pages with those IDs are
+    aggregated.
+    """
+    from course.models import FlowPageData, Participation
 
-            title = None
-            for visit in visits:
-                page = page_cache.get_page(group_desc.id, page_desc.id,
-                        pctx.course_commit_sha)
+    ptcp_sql, ptcp_params = (Participation.objects
+            .filter(
+                course=pctx.course,
+                roles__permissions__permission=(
+                    PPerm.included_in_grade_statistics))
+            .values("id")
+            .query.sql_with_params())
+
+    quartile_sql, quartile_params = (
+            _annotate_session_quartiles(
+                _get_quartile_sessions(pctx.course, flow_id))
+            .order_by()
+            .values("id", "quartile")
+            .query.sql_with_params())
+
+    page_sql = ""
+    page_params: list[str] = []
+    if page_ids is not None:
+        page_params = sorted(page_ids)
+        if not page_params:
+            return {}
+        page_sql = "AND pd.page_id IN ({})".format(
+                ", ".join(["%s"] * len(page_params)))
+
+    query = f"""
+        WITH session_quartiles AS (
+            {quartile_sql}
+        ),
+        graded_visits AS (
+            SELECT
+                v.id AS id,
+                v.page_data_id AS page_data_id,
+                v.flow_session_id AS flow_session_id,
+                v.visit_time AS visit_time,
+                s.participation_id AS participation_id,
+                pd.group_id AS group_id,
+                pd.page_id AS page_id,
+                v.answer IS NULL AS is_empty,
+                g.correctness AS correctness,
+                q.quartile AS quartile,
+                ROW_NUMBER() OVER (
+                    PARTITION BY v.id
+                    ORDER BY g.grade_time DESC) AS grade_rank
+            FROM {FlowPageVisit._meta.db_table} v
+            JOIN {FlowSession._meta.db_table} s ON s.id = v.flow_session_id
+            JOIN {FlowPageData._meta.db_table} pd ON pd.id = v.page_data_id
+            LEFT JOIN {FlowPageVisitGrade._meta.db_table} g ON g.visit_id = v.id
+            LEFT JOIN session_quartiles q ON q.id = v.flow_session_id
+            WHERE s.course_id = %s
+                AND s.flow_id = %s
+                AND v.is_submitted_answer = %s
+                AND s.participation_id IN ({ptcp_sql})
+                {page_sql}
+        ),
+        candidate_visits AS (
+            SELECT
+                group_id,
+                page_id,
+                page_data_id,
+                is_empty,
+                correctness,
+                quartile,
+                ROW_NUMBER() OVER (
+                    PARTITION BY participation_id, group_id, page_id
+                    ORDER BY visit_time) AS attempt_rank,
+                ROW_NUMBER() OVER (
+                    PARTITION BY page_data_id
+                    ORDER BY visit_time DESC) AS recency_rank
+            FROM graded_visits
+            WHERE grade_rank = 1
+        )
+        SELECT
+            group_id,
+            page_id,
+            quartile,
+            attempt_rank = 1,
+            recency_rank = 1,
+            COUNT(*),
+            SUM(CASE WHEN is_empty THEN 1 ELSE 0 END),
+            COUNT(correctness),
+            SUM(CASE WHEN is_empty THEN 0 ELSE correctness END),
+            SUM(correctness),
+            MAX(page_data_id)
+        FROM candidate_visits
+        GROUP BY
+            group_id, page_id, quartile,
+            attempt_rank = 1, recency_rank = 1
+        """
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, [
+            *quartile_params,
+            pctx.course.id, flow_id, True,
+            *ptcp_params,
+            *page_params])
+        rows = cursor.fetchall()
+
+    dedup_visits = connection.features.can_distinct_on_fields
+
+    result: dict[tuple[str, str], _PageAggregates] = {}
+    for (group_id, page_id, quartile, is_first_attempt, is_latest,
+            total_count, empty_count, graded_count, points, quartile_points,
+            max_page_data_id) in rows:
+        if dedup_visits:
+            if restrict_to_first_attempt:
+                if not is_first_attempt:
+                    continue
+            elif (group_id, page_id) in multiple_submit_pages and not is_latest:
+                continue
 
-                answer_expected = answer_expected or page.expects_answer()
+        page_aggr = result.get((group_id, page_id))
+        if page_aggr is None:
+            page_aggr = result[group_id, page_id] = _PageAggregates(
+                    overall=_PageVisitAggregate(),
+                    quartile_points=[0.0] * NUM_QUARTILES,
+                    quartile_graded_counts=[0] * NUM_QUARTILES,
+                    sample_page_data_id=max_page_data_id)
+
+        page_aggr.overall.add(_PageVisitAggregate(
+                total_count=total_count,
+                empty_count=empty_count or 0,
+                graded_count=graded_count,
+                points=points or 0))
+        page_aggr.sample_page_data_id = max(
+                page_aggr.sample_page_data_id, max_page_data_id)
+
+        if quartile is not None and graded_count:
+            page_aggr.quartile_points[quartile] += quartile_points or 0
+            page_aggr.quartile_graded_counts[quartile] += graded_count
 
-                from course.page import PageContext
-                grading_page_context = PageContext(
-                        course=pctx.course,
-                        repo=pctx.repo,
-                        commit_sha=pctx.course_commit_sha,
-                        flow_session=visit.flow_session)
+    return result
 
-                title = page.page_title(grading_page_context, visit.page_data.data)
 
-                correctness: float | None = visit.latest_grade_correctness
+def make_page_answer_stats_list(
+            pctx: CoursePageContext | AnalyticsContext,
+            flow_id: str,
+            restrict_to_first_attempt: bool,
+            pages: AbstractSet[tuple[str, str]] | None = None,
+        ) -> list[PageAnswerStats]:
+    """
+    :arg pages: if given, a set of (group ID, page ID) tuples to which
+        the returned statistics are restricted.
+    """
+    flow_desc = get_flow_desc(pctx.repo, pctx.course, flow_id,
+            pctx.course_commit_sha)
 
-                if visit.answer is not None:
-                    answer_count += 1
-                else:
-                    empty_count += 1
+    page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
 
-                total_count += 1
+    page_aggregates = _get_page_visit_aggregates(
+            pctx, flow_id,
+            restrict_to_first_attempt=restrict_to_first_attempt,
+            multiple_submit_pages={
+                (group_desc.id, page_desc.id)
+                for group_desc in flow_desc.groups
+                for page_desc in group_desc.pages
+                if is_page_multiple_submit(flow_desc, page_desc)},
+            page_ids=(
+                {page_id for _group_id, page_id in pages}
+                if pages is not None else None))
+
+    from course.models import FlowPageData
+    sample_page_data = (FlowPageData.objects
+            .select_related("flow_session")
+            .in_bulk([
+                page_aggr.sample_page_data_id
+                for page_aggr in page_aggregates.values()]))
 
-                if correctness is not None:
-                    if visit.answer is None:
-                        assert correctness == 0
-                    else:
-                        points += correctness
+    from course.page import PageContext
 
-                    graded_count += 1
+    page_info_list: list[PageAnswerStats] = []
+    for group_desc in flow_desc.groups:
+        for page_desc in group_desc.pages:
+            if pages is not None and (group_desc.id, page_desc.id) not in pages:
+                continue
 
-                    quartile = session_quartile_map.get(
-                            visit.flow_session_id)
-                    if quartile is not None:
-                        quartile_points[quartile] += correctness
-                        quartile_graded_counts[quartile] += 1
+            page_aggr = page_aggregates.get((group_desc.id, page_desc.id))
+            if page_aggr is None:
+                continue
 
-            if not answer_expected:
+            page = page_cache.get_page(group_desc.id, page_desc.id,
+                    pctx.course_commit_sha)
+            if not page.expects_answer():
                 continue
 
+            page_data = sample_page_data[page_aggr.sample_page_data_id]
+            title = page.page_title(
+                    PageContext(
+                        course=pctx.course,
+                        repo=pctx.repo,
+                        commit_sha=pctx.course_commit_sha,
+                        flow_session=page_data.flow_session),
+                    page_data.data)
+
+            overall = page_aggr.overall
             quartile_correctness_list: list[float | None] = [
-                    safe_div(quartile_points[q], quartile_graded_counts[q])
-                    if quartile_graded_counts[q] > 0
+                    safe_div(page_aggr.quartile_points[q],
+                        page_aggr.quartile_graded_counts[q])
+                    if page_aggr.quartile_graded_counts[q] > 0
                     else None
                     for q in range(NUM_QUARTILES)]
 
@@ -491,12 +821,13 @@ def make_page_answer_stats_list(
                     PageAnswerStats(
                         group_id=group_desc.id,
                         page_id=page_desc.id,
-                        title=not_none(title),
-                        average_correctness=safe_div(points, graded_count),
+                        title=title,
+                        average_correctness=safe_div(
+                            overall.points, overall.graded_count),
                         average_emptiness=safe_div(
-                            empty_count, graded_count),
-                        answer_count=answer_count,
-                        total_count=total_count,
+                            overall.empty_count, overall.graded_count),
+                        answer_count=overall.total_count - overall.empty_count,
+                        total_count=overall.total_count,
                         url=reverse(
                             "relate-page_analytics",
                             args=(
@@ -510,10 +841,22 @@ def make_page_answer_stats_list(
     return page_info_list
 
 
-def make_time_histogram(pctx: CoursePageContext, flow_id: str):
-    qset = FlowSession.objects.filter(
-            course=pctx.course,
-            flow_id=flow_id)
+def make_time_histogram(
+            pctx: CoursePageContext | AnalyticsContext, flow_id: str):
+    from django.db.models import DurationField, ExpressionWrapper, F
+
+    durations = (FlowSession.objects
+            .filter(
+                course=pctx.course,
+                flow_id=flow_id)
+            .annotate(duration=ExpressionWrapper(
+                F("completion_time") - F("start_time"),
+                output_field=DurationField()))
+            .values_list("in_progress", "duration"))
+
+    in_progress_title = "".join(["<",
+            pgettext("Status of session", "in progress"),
+            ">"])
 
     from relate.utils import string_concat
     hist = Histogram(
@@ -523,22 +866,16 @@ def make_time_histogram(pctx: CoursePageContext, flow_id: str):
                     "> %.1f ",
                     pgettext("Minute (time unit)", "min"))
                 % minutes))
-    for session in qset:
-        if session.in_progress:
-            hist.add_data_point(
-                    "".join(["<",
-                        pgettext("Status of session", "in progress"),
-                        ">"]))
-        else:
-            assert session.completion_time is not None
-            delta = session.completion_time - session.start_time
-            minutes = delta.total_seconds() / 60
-            hist.add_data_point(minutes)
+    hist.add_data_points(
+            in_progress_title if in_progress
+            else duration.total_seconds() / 60 if duration is not None
+            else None
+            for in_progress, duration in durations)
 
     return hist
 
 
-def count_participants(pctx: CoursePageContext, flow_id: str):
+def count_participants(pctx: CoursePageContext | AnalyticsContext, flow_id: str):
     if not connection.features.can_distinct_on_fields:
         return None
 
@@ -560,23 +897,47 @@ def flow_analytics(pctx: CoursePageContext, flow_id: str):
     restrict_to_first_attempt = bool(
             bool(pctx.request.GET.get("restrict_to_first_attempt") == "1"))
 
-    try:
-        stats_list = make_page_answer_stats_list(pctx, flow_id,
-                restrict_to_first_attempt)
-    except ObjectDoesNotExist:
-        messages.add_message(pctx.request, messages.ERROR,
-                _("Flow '%s' was not found in the repository, but it exists in "
-                    "the database--maybe it was deleted?")
-                % flow_id)
-        raise http.Http404()
+    from course.repo import serialize_revision
+    snapshot = get_flow_analytics_snapshot(
+            pctx, flow_id, restrict_to_first_attempt)
+
+    if snapshot is not None:
+        grade_histogram: Histogram | StoredHistogram = \
+                StoredHistogram.from_json(snapshot.data["grade_histogram"])
+        time_histogram: Histogram | StoredHistogram = \
+                StoredHistogram.from_json(snapshot.data["time_histogram"])
+        stats_list = [
+                PageAnswerStats(**page_stats)
+                for page_stats in snapshot.data["page_answer_stats"]]
+        participant_count = snapshot.data["participant_count"]
+
+    else:
+        try:
+            stats_list = make_page_answer_stats_list(pctx, flow_id,
+                    restrict_to_first_attempt)
+        except ObjectDoesNotExist:
+            messages.add_message(pctx.request, messages.ERROR,
+                    _("Flow '%s' was not found in the repository, but it exists in "
+                        "the database--maybe it was deleted?")
+                    % flow_id)
+            raise http.Http404()
+
+        grade_histogram = make_grade_histogram(pctx, flow_id)
+        time_histogram = make_time_histogram(pctx, flow_id)
+        participant_count = count_participants(pctx, flow_id)
 
     return render_course_page(pctx, "course/analytics-flow.html", {
         "flow_identifier": flow_id,
-        "grade_histogram": make_grade_histogram(pctx, flow_id),
+        "grade_histogram": grade_histogram,
         "page_answer_stats_list": stats_list,
-        "time_histogram": make_time_histogram(pctx, flow_id),
-        "participant_count": count_participants(pctx, flow_id),
+        "time_histogram": time_histogram,
+        "participant_count": participant_count,
         "restrict_to_first_attempt": restrict_to_first_attempt,
+        "snapshot": snapshot,
+        # snapshots are refreshed at the course's active revision
+        "may_take_snapshot": (
+            serialize_revision(pctx.course_commit_sha)
+            == pctx.course.active_git_commit_sha),
         })
 
 # }}}
@@ -592,19 +953,170 @@ class AnswerStats:
     percentage: float
 
 
-@login_required
-@course_view
-def page_analytics(pctx: CoursePageContext, flow_id: str, group_id: str, page_id: str):
-    if not pctx.has_permission(PPerm.view_analytics):
-        raise PermissionDenied(_("may not view analytics"))
+@dataclass(frozen=True)
+class PageAnswerDistribution:
+    title: str | None
+    body: str | None
+    answer_stats_list: list[AnswerStats]
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> PageAnswerDistribution:
+        from django.utils.safestring import mark_safe
+
+        return PageAnswerDistribution(
+                title=data["title"],
+                body=data["body"],
+                answer_stats_list=[
+                    AnswerStats(
+                        # escaped by to_json
+                        normalized_answer=mark_safe(astats["normalized_answer"]),
+                        correctness=astats["correctness"],
+                        count=astats["count"],
+                        percentage=astats["percentage"])
+                    for astats in data["answer_stats_list"]])
+
+    def to_json(self) -> dict[str, Any]:
+        from django.utils.html import conditional_escape
+
+        return {
+            "title": self.title,
+            "body": self.body,
+            "answer_stats_list": [
+                {
+                    "normalized_answer": str(
+                        conditional_escape(astats.normalized_answer)),
+                    "correctness": astats.correctness,
+                    "count": astats.count,
+                    "percentage": astats.percentage,
+                    }
+                for astats in self.answer_stats_list],
+            }
+
+
+def get_normalized_answer_html(
+            page: PageBase,
+            page_context: PageContext,
+            page_data: Any,
+            answer_data: Any,
+        ) -> str | None:
+    """Return the normalized answer of *answer_data* as HTML, escaping it
+    unless the page marked it safe.
+    """
+    from django.utils.html import conditional_escape
 
-    flow_desc = get_flow_desc(pctx.repo, pctx.course, flow_id,
-            pctx.course_commit_sha)
+    normalized_answer = page.normalized_answer(
+            page_context, page_data, answer_data)
+    if normalized_answer is None:
+        return None
 
-    restrict_to_first_attempt = int(
-            bool(pctx.request.GET.get("restrict_to_first_attempt") == "1"))
+    return str(conditional_escape(normalized_answer))
 
-    page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
+
+def cache_normalized_answer(
+            page: PageBase,
+            page_context: PageContext,
+            visit: FlowPageVisit,
+        ) -> None:
+    from course.models import FlowPageVisitNormalizedAnswer
+    from course.repo import serialize_revision
+
+    FlowPageVisitNormalizedAnswer.objects.update_or_create(
+            visit=visit,
+            defaults={
+                "commit_sha": serialize_revision(page_context.commit_sha),
+                "normalized_answer": get_normalized_answer_html(
+                    page, page_context, visit.page_data.data, visit.answer),
+                })
+
+
+def cache_normalized_answers(
+            course: Course,
+            repo: Repo_ish,
+            commit_sha: RevisionID_ish,
+            visits: QuerySet[FlowPageVisit],
+            chunk_size: int = 500,
+        ) -> tuple[int, int]:
+    """Compute and store the normalized answers of those *visits* which
+    have no cached normalized answer for *commit_sha*.
+
+    :returns: a tuple of the number of normalized answers stored and the
+        number of visits skipped because their page no longer exists
+        at *commit_sha*.
+    """
+    from course.models import FlowPageVisitNormalizedAnswer
+    from course.page import PageContext
+    from course.repo import serialize_revision
+
+    serialized_commit_sha = serialize_revision(commit_sha)
+
+    stale_visits = (visits
+            .exclude(normalized_answer_cache__commit_sha=serialized_commit_sha)
+            .select_related("flow_session", "page_data")
+            .order_by("id"))
+
+    page_caches: dict[str, PageInstanceCache] = {}
+    batch: list[FlowPageVisitNormalizedAnswer] = []
+    stored_count = 0
+    skipped_count = 0
+
+    def flush() -> None:
+        nonlocal stored_count
+        FlowPageVisitNormalizedAnswer.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=["visit"],
+                update_fields=["commit_sha", "normalized_answer"])
+        stored_count += len(batch)
+        batch.clear()
+
+    for visit in stale_visits.iterator(chunk_size=chunk_size):
+        flow_id = visit.flow_session.flow_id
+        page_cache = page_caches.get(flow_id)
+        if page_cache is None:
+            page_cache = page_caches[flow_id] = PageInstanceCache(
+                    repo, course, flow_id)
+
+        try:
+            page = page_cache.get_page(
+                    visit.page_data.group_id, visit.page_data.page_id,
+                    commit_sha)
+        except ObjectDoesNotExist:
+            skipped_count += 1
+            continue
+
+        page_context = PageContext(
+                course=course,
+                repo=repo,
+                commit_sha=commit_sha,
+                flow_session=visit.flow_session)
+
+        batch.append(FlowPageVisitNormalizedAnswer(
+                visit=visit,
+                commit_sha=serialized_commit_sha,
+                normalized_answer=get_normalized_answer_html(
+                    page, page_context, visit.page_data.data, visit.answer)))
+        if len(batch) >= chunk_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return stored_count, skipped_count
+
+
+def make_page_answer_distribution(
+            pctx: CoursePageContext | AnalyticsContext,
+            flow_id: str,
+            group_id: str,
+            page_id: str,
+            restrict_to_first_attempt: bool,
+        ) -> PageAnswerDistribution:
+    from django.utils.safestring import mark_safe
+
+    from course.models import FlowPageVisitNormalizedAnswer
+
+    flow_desc = get_flow_desc(pctx.repo, pctx.course, flow_id,
+            pctx.course_commit_sha)
 
     visits = (FlowPageVisit.objects
             .filter(
@@ -630,74 +1142,489 @@ def page_analytics(pctx: CoursePageContext, flow_id: str, group_id: str, page_id
                     .distinct("page_data__id")
                     .order_by("page_data__id", "-visit_time"))
 
-    visits = (visits
-            .select_related("flow_session")
-            .select_related("page_data"))
-
-    normalized_answer_and_correctness_to_count: dict[tuple[str, float | None], int] = {}
+    cache_normalized_answers(
+            pctx.course, pctx.repo, pctx.course_commit_sha,
+            FlowPageVisit.objects.filter(id__in=visits.values("id")))
+
+    # {{{ count visits by normalized answer and latest grade correctness
+
+    visit_sql, visit_params = visits.values("id").query.sql_with_params()
+
+    # As in FlowPageVisit.get_most_recent_feedback, grades without
+    # feedback have no correctness.
+    query = f"""
+        WITH graded_answers AS (
+            SELECT
+                na.normalized_answer AS normalized_answer,
+                CASE WHEN g.feedback IS NULL THEN NULL
+                    ELSE g.correctness END AS correctness,
+                ROW_NUMBER() OVER (
+                    PARTITION BY na.visit_id
+                    ORDER BY g.grade_time DESC) AS grade_rank
+            FROM {FlowPageVisitNormalizedAnswer._meta.db_table} na
+            LEFT JOIN {FlowPageVisitGrade._meta.db_table} g
+                ON g.visit_id = na.visit_id
+            WHERE na.visit_id IN ({visit_sql})
+        )
+        SELECT normalized_answer, correctness, COUNT(*)
+        FROM graded_answers
+        WHERE grade_rank = 1
+        GROUP BY normalized_answer, correctness
+        """
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, visit_params)
+        rows = cursor.fetchall()
+
+    # }}}
 
     title = None
     body = None
-    total_count = 0
-    graded_count = 0
 
-    for visit in visits:
-        page = page_cache.get_page(group_id, page_id, pctx.course_commit_sha)
+    sample_visit = (visits
+            .select_related("flow_session", "page_data")
+            .first())
+    if sample_visit is not None:
+        page = PageInstanceCache(pctx.repo, pctx.course, flow_id).get_page(
+                group_id, page_id, pctx.course_commit_sha)
 
         from course.page import PageContext
         grading_page_context = PageContext(
                 course=pctx.course,
                 repo=pctx.repo,
                 commit_sha=pctx.course_commit_sha,
-                flow_session=visit.flow_session)
-
-        title = page.page_title(grading_page_context, visit.page_data.data)
-        body = page.analytic_view_body(grading_page_context, visit.page_data.data)
-
-        normalized_answer = page.normalized_answer(
-                    grading_page_context, visit.page_data.data, visit.answer)
-        if normalized_answer is None:
-            normalized_answer = _("(No answer)")
-
-        answer_feedback = visit.get_most_recent_feedback()
-
-        if answer_feedback is not None:
-            key = (normalized_answer, answer_feedback.correctness)
-            normalized_answer_and_correctness_to_count[key] = \
-                    normalized_answer_and_correctness_to_count.get(key, 0) + 1
-            graded_count += 1
-        else:
-            key = (normalized_answer, None)
-            normalized_answer_and_correctness_to_count[key] = \
-                    normalized_answer_and_correctness_to_count.get(key, 0) + 1
-
-        total_count += 1
-
-    answer_stats: list[AnswerStats] = []
-    for (normalized_answer, correctness), count in \
-            normalized_answer_and_correctness_to_count.items():
-        answer_stats.append(
-                AnswerStats(
-                    normalized_answer=normalized_answer,
-                    correctness=correctness,
-                    count=count,
-                    percentage=safe_div(100 * count, total_count)))
+                flow_session=sample_visit.flow_session)
+
+        title = page.page_title(grading_page_context, sample_visit.page_data.data)
+        body = page.analytic_view_body(
+                grading_page_context, sample_visit.page_data.data)
+
+    total_count = sum(count for _answer, _correctness, count in rows)
+
+    answer_stats = [
+            AnswerStats(
+                # escaped by get_normalized_answer_html
+                normalized_answer=(
+                    mark_safe(normalized_answer)
+                    if normalized_answer is not None
+                    else _("(No answer)")),
+                correctness=correctness,
+                count=count,
+                percentage=safe_div(100 * count, total_count))
+            for normalized_answer, correctness, count in rows]
 
     answer_stats = sorted(
             answer_stats,
             key=lambda astats: astats.percentage,
             reverse=True)
 
+    return PageAnswerDistribution(
+            title=title,
+            body=body,
+            answer_stats_list=answer_stats)
+
+
+@login_required
+@course_view
+def page_analytics(pctx: CoursePageContext, flow_id: str, group_id: str, page_id: str):
+    if not pctx.has_permission(PPerm.view_analytics):
+        raise PermissionDenied(_("may not view analytics"))
+
+    restrict_to_first_attempt = int(
+            bool(pctx.request.GET.get("restrict_to_first_attempt") == "1"))
+
+    snapshot = get_flow_analytics_snapshot(
+            pctx, flow_id, bool(restrict_to_first_attempt))
+    if snapshot is not None:
+        distribution = get_snapshot_page_answer_distribution(
+                pctx, snapshot, group_id, page_id)
+    else:
+        distribution = make_page_answer_distribution(
+                pctx, flow_id, group_id, page_id,
+                bool(restrict_to_first_attempt))
+
     return render_course_page(pctx, "course/analytics-page.html", {
         "flow_identifier": flow_id,
         "group_id": group_id,
         "page_id": page_id,
-        "title": title,
-        "body": body,
-        "answer_stats_list": answer_stats,
+        "title": distribution.title,
+        "body": distribution.body,
+        "answer_stats_list": distribution.answer_stats_list,
         "restrict_to_first_attempt": restrict_to_first_attempt,
+        "snapshot": snapshot,
         })
 
 # }}}
 
+
+# {{{ analytics snapshots
+
+def _get_flow_watermarks(course: Course, flow_id: str) -> tuple[int, int]:
+    from django.db.models import Max
+
+    visit_watermark = (FlowPageVisit.objects
+            .filter(
+                flow_session__course=course,
+                flow_session__flow_id=flow_id)
+            .aggregate(watermark=Max("id")))["watermark"]
+    grade_watermark = (FlowPageVisitGrade.objects
+            .filter(
+                visit__flow_session__course=course,
+                visit__flow_session__flow_id=flow_id)
+            .aggregate(watermark=Max("id")))["watermark"]
+
+    return visit_watermark or 0, grade_watermark or 0
+
+
+def _get_changed_pages(
+            course: Course,
+            flow_id: str,
+            visit_watermark: int,
+            grade_watermark: int,
+        ) -> set[tuple[str, str]]:
+    """Return (group ID, page ID) tuples of the pages that have visits or
+    grades beyond the watermarks.
+    """
+    from django.db.models import Q
+
+    return set(FlowPageVisit.objects
+            .filter(
+                flow_session__course=course,
+                flow_session__flow_id=flow_id)
+            .filter(
+                Q(id__gt=visit_watermark)
+                | Q(grades__id__gt=grade_watermark))
+            .values_list("page_data__group_id", "page_data__page_id")
+            .distinct())
+
+
+def _get_quartile_digest(session_quartile_map: dict[int, int]) -> str:
+    from hashlib import sha256
+    return sha256(
+            json.dumps(sorted(session_quartile_map.items())).encode()
+            ).hexdigest()
+
+
+def _get_page_key(group_id: str, page_id: str) -> str:
+    return f"{group_id}/{page_id}"
+
+
+def update_flow_analytics_snapshot(
+            actx: AnalyticsContext,
+            flow_id: str,
+            restrict_to_first_attempt: bool,
+            full: bool = False,
+        ) -> FlowAnalyticsSnapshot:
+    """Create or refresh the :class:`~course.models.FlowAnalyticsSnapshot`
+    of *flow_id*.
+
+    Session-level statistics (histograms and participant count) are always
+    recomputed. Per-page statistics and answer distributions are only
+    recomputed for pages with visits or grades beyond the snapshot's
+    watermarks, unless *full* is set, the course revision changed, or the
+    session quartiles changed (which affects all pages).
+    """
+    from django.db import transaction
+    from django.utils.timezone import now
+
+    from course.models import FlowAnalyticsSnapshot
+    from course.repo import serialize_revision
+
+    course = actx.course
+    commit_sha = serialize_revision(actx.course_commit_sha)
+    flow_desc = get_flow_desc(actx.repo, course, flow_id, actx.course_commit_sha)
+
+    # Determine the watermarks first, so that visits arriving while the
+    # statistics are computed are (re)considered by the next refresh.
+    visit_watermark, grade_watermark = _get_flow_watermarks(course, flow_id)
+    quartile_digest = _get_quartile_digest(
+            compute_session_quartile_map(actx, flow_id))
+
+    with transaction.atomic():
+        snapshot, created = (FlowAnalyticsSnapshot.objects
+                .select_for_update()
+                .get_or_create(
+                    course=course,
+                    flow_id=flow_id,
+                    restrict_to_first_attempt=restrict_to_first_attempt,
+                    defaults={"commit_sha": commit_sha}))
+
+        full = (full
+                or created
+                or snapshot.commit_sha != commit_sha
+                or snapshot.quartile_digest != quartile_digest)
+
+        if full:
+            changed_pages = None
+            page_stats_by_key: dict[tuple[str, str], dict[str, Any]] = {}
+        else:
+            changed_pages = _get_changed_pages(
+                    course, flow_id,
+                    snapshot.visit_watermark, snapshot.grade_watermark)
+            page_stats_by_key = {
+                    (page_stats["group_id"], page_stats["page_id"]): page_stats
+                    for page_stats in snapshot.data.get("page_answer_stats", [])
+                    if (page_stats["group_id"], page_stats["page_id"])
+                    not in changed_pages}
+
+        if changed_pages is None or changed_pages:
+            for page_stats in make_page_answer_stats_list(
+                    actx, flow_id, restrict_to_first_attempt,
+                    pages=changed_pages):
+                page_stats_by_key[page_stats.group_id, page_stats.page_id] = \
+                        asdict(page_stats)
+
+        # Answer distributions are only kept for pages that have been
+        # looked at, see get_snapshot_page_answer_distribution.
+        distributions = snapshot.data.get("page_answer_distributions", {})
+        for group_desc in flow_desc.groups:
+            for page_desc in group_desc.pages:
+                key = _get_page_key(group_desc.id, page_desc.id)
+                if key in distributions and (
+                        changed_pages is None
+                        or (group_desc.id, page_desc.id) in changed_pages):
+                    distributions[key] = make_page_answer_distribution(
+                            actx, flow_id, group_desc.id, page_desc.id,
+                            restrict_to_first_attempt).to_json()
+
+        snapshot.data = {
+            "grade_histogram": StoredHistogram.from_histogram(
+                make_grade_histogram(actx, flow_id)).to_json(),
+            "time_histogram": StoredHistogram.from_histogram(
+                make_time_histogram(actx, flow_id)).to_json(),
+            "participant_count": count_participants(actx, flow_id),
+            "page_answer_stats": [
+                page_stats_by_key[group_desc.id, page_desc.id]
+                for group_desc in flow_desc.groups
+                for page_desc in group_desc.pages
+                if (group_desc.id, page_desc.id) in page_stats_by_key],
+            "page_answer_distributions": distributions,
+            }
+        snapshot.commit_sha = commit_sha
+        snapshot.visit_watermark = visit_watermark
+        snapshot.grade_watermark = grade_watermark
+        snapshot.quartile_digest = quartile_digest
+        snapshot.refresh_time = now()
+        snapshot.save()
+
+    return snapshot
+
+
+def get_flow_analytics_snapshot(
+            pctx: CoursePageContext,
+            flow_id: str,
+            restrict_to_first_attempt: bool,
+        ) -> FlowAnalyticsSnapshot | None:
+    """Return the snapshot of *flow_id* if there is one for the course
+    revision that *pctx* is looking at.
+    """
+    from course.models import FlowAnalyticsSnapshot
+    from course.repo import serialize_revision
+
+    return (FlowAnalyticsSnapshot.objects
+            .filter(
+                course=pctx.course,
+                flow_id=flow_id,
+                restrict_to_first_attempt=restrict_to_first_attempt,
+                commit_sha=serialize_revision(pctx.course_commit_sha))
+            .first())
+
+
+def get_snapshot_page_answer_distribution(
+            pctx: CoursePageContext,
+            snapshot: FlowAnalyticsSnapshot,
+            group_id: str,
+            page_id: str,
+        ) -> PageAnswerDistribution:
+    key = _get_page_key(group_id, page_id)
+
+    data = snapshot.data.get("page_answer_distributions", {}).get(key)
+    if data is not None:
+        return PageAnswerDistribution.from_json(data)
+
+    distribution = make_page_answer_distribution(
+            pctx, snapshot.flow_id, group_id, page_id,
+            snapshot.restrict_to_first_attempt)
+
+    from django.db import transaction
+
+    from course.models import FlowAnalyticsSnapshot
+
+    with transaction.atomic():
+        locked_snapshot = (FlowAnalyticsSnapshot.objects
+                .select_for_update()
+                .get(pk=snapshot.pk))
+        (locked_snapshot.data
+                .setdefault("page_answer_distributions", {}))[key] = \
+                        distribution.to_json()
+        locked_snapshot.save(update_fields=["data"])
+
+    return distribution
+
+
+@login_required
+@course_view
+def refresh_flow_analytics(pctx: CoursePageContext, flow_id: str):
+    if not pctx.has_permission(PPerm.view_analytics):
+        raise PermissionDenied(_("may not view analytics"))
+
+    request = pctx.request
+    if request.method != "POST":
+        raise SuspiciousOperation(_("only POST allowed"))
+
+    from course.tasks import refresh_flow_analytics_snapshot
+    async_res = refresh_flow_analytics_snapshot.delay(
+            pctx.course.id, flow_id,
+            restrict_to_first_attempt=(
+                request.POST.get("restrict_to_first_attempt") == "1"))
+
+    return redirect("relate-monitor_task", async_res.id)
+
+# }}}
+
+
+# {{{ code run statistics
+
+def _percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+
+    idx = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[idx]
+
+
+@dataclass(frozen=True)
+class CodeRunPhaseStats:
+    phase: str
+    count: int
+    p50: float | None
+    p90: float | None
+    p99: float | None
+    max: float | None
+    histogram: Histogram
+
+
+def _get_code_run_records(pctx: CoursePageContext, flow_id: str | None):
+    from course.models import CodeRunRecord
+    qset = CodeRunRecord.objects.filter(course=pctx.course)
+    if flow_id is not None:
+        qset = qset.filter(flow_id=flow_id)
+    return qset
+
+
+@login_required
+@course_view
+def code_run_statistics(pctx: CoursePageContext):
+    if not pctx.has_permission(PPerm.view_analytics):
+        raise PermissionDenied(_("may not view analytics"))
+
+    from django.db.models import Count
+
+    from course.page.code_runner import CODE_RUN_PHASES
+
+    flow_id = pctx.request.GET.get("flow_id") or None
+
+    flow_id_counts = list(
+            _get_code_run_records(pctx, None)
+            .values_list("flow_id")
+            .annotate(count=Count("id"))
+            .order_by("flow_id"))
+
+    def format_seconds(seconds: float) -> str:
+        return f"> {seconds:.2f} s"
+
+    phase_values: dict[str, list[float]] = {
+            phase: [] for phase in [*CODE_RUN_PHASES, "total"]}
+    result_hist = Histogram()
+    host_hist = Histogram()
+    retry_hist = Histogram()
+
+    for result, exec_host, retry_count, total_time, phase_timings in (
+            _get_code_run_records(pctx, flow_id)
+            .values_list(
+                "result", "exec_host", "retry_count", "total_time",
+                "phase_timings")
+            .iterator()):
+        result_hist.add_data_point(result)
+        host_hist.add_data_point(exec_host or _("(unknown)"))
+        retry_hist.add_data_point(str(retry_count))
+
+        phase_values["total"].append(total_time)
+        for phase, seconds in (phase_timings or {}).items():
+            if phase in phase_values:
+                phase_values[phase].append(seconds)
+
+    phase_stats_list: list[CodeRunPhaseStats] = []
+    for phase, values in phase_values.items():
+        if not values:
+            continue
+
+        values.sort()
+        hist = Histogram(
+                num_log_bins=True,
+                num_bin_title_formatter=format_seconds)
+        for value in values:
+            hist.add_data_point(value)
+
+        phase_stats_list.append(CodeRunPhaseStats(
+            phase=phase,
+            count=len(values),
+            p50=_percentile(values, 0.5),
+            p90=_percentile(values, 0.9),
+            p99=_percentile(values, 0.99),
+            max=values[-1],
+            histogram=hist))
+
+    return render_course_page(pctx, "course/analytics-code-runs.html", {
+        "flow_identifier": flow_id,
+        "flow_id_counts": flow_id_counts,
+        "run_count": len(phase_values["total"]),
+        "phase_stats_list": phase_stats_list,
+        "result_histogram": result_hist,
+        "host_histogram": host_hist,
+        "retry_histogram": retry_hist,
+        })
+
+
+@login_required
+@course_view
+def export_code_run_statistics_csv(pctx: CoursePageContext):
+    if not pctx.has_permission(PPerm.view_analytics):
+        raise PermissionDenied(_("may not view analytics"))
+
+    from course.page.code_runner import CODE_RUN_PHASES
+
+    flow_id = pctx.request.GET.get("flow_id") or None
+
+    import csv
+    writer = csv.writer(EchoBuffer())
+
+    def generate_rows() -> Iterator[str]:
+        yield writer.writerow([
+            "time", "flow_id", "page_id", "backend", "image", "exec_host",
+            "result", "retry_count", "total_time",
+            *CODE_RUN_PHASES])
+
+        for row in (
+                _get_code_run_records(pctx, flow_id)
+                .values_list(
+                    "time", "flow_id", "page_id", "backend", "image",
+                    "exec_host", "result", "retry_count", "total_time",
+                    "phase_timings")
+                .iterator()):
+            *fields, phase_timings = row
+            phase_timings = phase_timings or {}
+            yield writer.writerow([
+                *fields,
+                *(phase_timings.get(phase, "") for phase in CODE_RUN_PHASES)])
+
+    response = http.StreamingHttpResponse(
+            generate_rows(),
+            content_type="text/plain; charset=utf-8")
+    response["Content-Disposition"] = (
+            f'attachment; filename="code-runs-{pctx.course.identifier}.csv"')
+    return response
+
+# }}}
+
 # vim: foldmethod=marker
@@ -1207,6 +1207,65 @@ class APIError(Exception):
     pass
 
 
+# Verifying a token against its stored (deliberately slow) password hash on
+# every API request limits throughput, so successful verifications are
+# remembered for this many seconds. The cache only stands in for
+# check_password: the token itself is still loaded from the database on
+# every request, so that revocation and expiry take effect immediately.
+API_TOKEN_VERIFIED_CACHE_TIMEOUT = 5 * 60
+
+
+def _get_verified_token_cache_key(token_id: int) -> str:
+    return f"relate-api-token-verified:{token_id}"
+
+
+def _get_token_secret_digest(token_id: int, token_hash_str: str) -> str:
+    from django.utils.crypto import salted_hmac
+    return salted_hmac(
+            "relate.api-token-verified", f"{token_id}:{token_hash_str}",
+            algorithm="sha256").hexdigest()
+
+
+def _get_verified_token_state(token: AuthenticationToken) -> tuple[Any, ...]:
+    return (token.token_hash, token.valid_until, token.revocation_time)
+
+
+def forget_verified_token(token_id: int) -> None:
+    """Drop the cached verification of the token with *token_id*, if any."""
+    from django.core.cache import caches
+    caches["default"].delete(_get_verified_token_cache_key(token_id))
+
+
+def check_token_secret(token: AuthenticationToken, token_hash_str: str) -> bool:
+    """Return whether *token_hash_str* is the secret of *token*, using a
+    short-lived cache of prior successful verifications keyed by an HMAC of
+    the presented secret. Cached verifications are only used while the
+    stored hash, validity and revocation time of *token* are unchanged.
+    """
+    assert token.token_hash is not None
+
+    from django.core.cache import caches
+    cache = caches["default"]
+
+    cache_key = _get_verified_token_cache_key(token.id)
+    digest = _get_token_secret_digest(token.id, token_hash_str)
+    state = _get_verified_token_state(token)
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        cached_digest, cached_state = cached
+        if (secrets.compare_digest(cached_digest, digest)
+                and cached_state == state):
+            return True
+
+    from django.contrib.auth.hashers import check_password
+    if not check_password(token_hash_str, token.token_hash):
+        return False
+
+    cache.set(cache_key, (digest, state), API_TOKEN_VERIFIED_CACHE_TIMEOUT)
+    return True
+
+
 def find_matching_token(
         course_identifier: str | None = None,
         token_id: int | None = None,
@@ -1223,11 +1282,10 @@ def find_matching_token(
     except AuthenticationToken.DoesNotExist:
         return None
 
-    if token.token_hash is None:
+    if token.token_hash is None or token_hash_str is None:
         return None
 
-    from django.contrib.auth.hashers import check_password
-    if not check_password(token_hash_str, token.token_hash):
+    if not check_token_secret(token, token_hash_str):
         return None
 
     if token.revocation_time is not None:
@@ -1250,7 +1308,7 @@ class APIBearerTokenBackend:
             return None
 
         token.last_use_time = now_datetime
-        token.save()
+        token.save(update_fields=["last_use_time"])
 
         return token.user
 
@@ -579,6 +579,10 @@ DEFAULT_ACCESS_KINDS = ["public", "in_exam", "student", "ta",
 
 SESSION_LOCKED_TO_FLOW_PK = "relate_session_locked_to_exam_flow_session_pk"
 
+# Cached facts about the flow session in SESSION_LOCKED_TO_FLOW_PK, see
+# course.exam.ExamLockdownMiddleware.
+SESSION_EXAM_LOCKDOWN_STATE = "relate_exam_lockdown_state"
+
 # }}}
 
 # vim: foldmethod=marker
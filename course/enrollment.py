@@ -23,6 +23,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+from dataclasses import dataclass
 from sys import intern
 from typing import TYPE_CHECKING, Any
 
@@ -37,7 +38,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied, SuspiciousOperation
 from django.db import IntegrityError, transaction
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.shortcuts import (  # ruff:ignore[unused-import]
     get_object_or_404,
     redirect,
@@ -57,11 +58,13 @@ from course.constants import (
 )
 from course.models import (
     Course,
+    FlowSession,
     Participation,
     ParticipationPermission,
     ParticipationPreapproval,
     ParticipationRole,
     ParticipationTag,
+    invalidate_permission_cache,
 )
 from course.utils import LanguageOverride, course_view, render_course_page
 from relate.utils import StyledForm, StyledModelForm, string_concat
@@ -70,9 +73,10 @@ from relate.utils import StyledForm, StyledModelForm, string_concat
 # {{{ for mypy
 
 if TYPE_CHECKING:
-    from collections.abc import Set as AbstractSet
+    from collections.abc import Iterable, Set as AbstractSet
 
     from django.contrib.auth.models import AnonymousUser
+    from django.db.models import query
 
     import accounts.models
     from course.utils import CoursePageContext
@@ -114,15 +118,23 @@ def get_participation_for_request(
 
 def get_participation_role_identifiers(
         course: Course, participation: Participation | None) -> AbstractSet[str]:
+    from course.models import get_cached_permission_data
+
     if participation is None:
-        return frozenset(
-                ParticipationRole.objects.filter(
-                    course=course,
-                    is_default_for_unenrolled=True)
-                .values_list("identifier", flat=True))
+        return get_cached_permission_data(
+                course.id, "unenrolled-role-identifiers",
+                lambda: frozenset(
+                    ParticipationRole.objects.filter(
+                        course=course,
+                        is_default_for_unenrolled=True)
+                    .values_list("identifier", flat=True)))
 
     else:
-        return {r.identifier for r in participation.roles.all()}
+        return get_cached_permission_data(
+                course.id,
+                f"participation-role-identifiers:{participation.pk}",
+                lambda: frozenset(
+                    participation.roles.values_list("identifier", flat=True)))
 
 # }}}
 
@@ -137,16 +149,24 @@ def get_participation_permissions(
     if participation is not None:
         return participation.permissions()
     else:
-        from course.models import ParticipationRolePermission
+        from course.models import (
+            ParticipationRolePermission,
+            get_cached_permission_data,
+        )
 
-        perm_list = list(
-                ParticipationRolePermission.objects.filter(
-                    role__is_default_for_unenrolled=True)
-                .values_list("permission", "argument"))
+        def get_unenrolled_permissions() -> frozenset[tuple[str, str | None]]:
+            perm_list = list(
+                    ParticipationRolePermission.objects.filter(
+                        role__course=course,
+                        role__is_default_for_unenrolled=True)
+                    .values_list("permission", "argument"))
 
-        return frozenset(
-                (permission, argument) if argument else (permission, None)
-                for permission, argument in perm_list)
+            return frozenset(
+                    (permission, argument) if argument else (permission, None)
+                    for permission, argument in perm_list)
+
+        return get_cached_permission_data(
+                course.id, "unenrolled-permissions", get_unenrolled_permissions)
 
 
 # }}}
@@ -346,31 +366,50 @@ def handle_enrollment_request(
 # {{{ admin actions
 
 def decide_enrollment(approved, modeladmin, request, queryset):
-    count = 0
-
-    for participation in queryset:
-        if participation.status != ParticipationStatus.requested:
-            continue
-
-        if approved:
-            participation.status = ParticipationStatus.active
-        else:
-            participation.status = ParticipationStatus.denied
-        participation.save()
+    requested = list(queryset
+            .filter(status=ParticipationStatus.requested)
+            .select_related("user", "course"))
 
-        send_enrollment_decision(participation, approved, request)
+    with get_enrollment_mail_connection() as connection:
+        for participation in requested:
+            if approved:
+                participation.status = ParticipationStatus.active
+            else:
+                participation.status = ParticipationStatus.denied
+            participation.save()
 
-        count += 1
+            send_enrollment_decision(participation, approved, request,
+                    connection=connection)
 
     messages.add_message(request, messages.INFO,
             # Translators: how many enroll requests have ben processed.
-            _("%d requests processed.") % count)
+            _("%d requests processed.") % len(requested))
+
+
+def get_enrollment_mail_connection() -> Any:
+    """Return the mail connection used for enrollment decisions. To send
+    several messages over a single connection, use it as a context manager.
+    """
+    if settings.RELATE_EMAIL_SMTP_ALLOW_NONAUTHORIZED_SENDER:
+        from django.core.mail import get_connection
+        return get_connection()
+
+    from relate.utils import get_outbound_mail_connection
+    return (
+            get_outbound_mail_connection("enroll")
+            if hasattr(settings, "ENROLLMENT_EMAIL_FROM")
+            else get_outbound_mail_connection("robot"))
 
 
 def send_enrollment_decision(
         participation: Participation,
         approved: bool,
-        request: http.HttpRequest | None = None) -> None:
+        request: http.HttpRequest | None = None,
+        connection: Any = None) -> None:
+    """
+    :arg connection: the mail connection to use. If not given, one is
+        obtained from :func:`get_enrollment_mail_connection`.
+    """
     course = participation.course
     with LanguageOverride(course=course):
         if request:
@@ -393,18 +432,14 @@ def send_enrollment_decision(
             })
 
         from django.core.mail import EmailMessage
-        email_kwargs = {}
         if settings.RELATE_EMAIL_SMTP_ALLOW_NONAUTHORIZED_SENDER:
             from_email = course.get_from_email()
         else:
             from_email = getattr(settings, "ENROLLMENT_EMAIL_FROM",
                                  settings.ROBOT_EMAIL_FROM)
-            from relate.utils import get_outbound_mail_connection
-            email_kwargs.update(
-                {"connection": (
-                    get_outbound_mail_connection("enroll")
-                    if hasattr(settings, "ENROLLMENT_EMAIL_FROM")
-                    else get_outbound_mail_connection("robot"))})
+
+        if connection is None:
+            connection = get_enrollment_mail_connection()
 
         msg = EmailMessage(
                 string_concat("[%s] ", _("Your enrollment request"))
@@ -412,7 +447,7 @@ def send_enrollment_decision(
                 message,
                 from_email,
                 [participation.user.email],
-                **email_kwargs)
+                connection=connection)
         msg.bcc = [course.notify_email]
         msg.send()
 
@@ -460,6 +495,88 @@ class BulkPreapprovalsForm(StyledForm):
                 Submit("submit", _("Preapprove")))
 
 
+def add_preapprovals(
+        course: Course,
+        preapp_type: str,
+        entries: Iterable[str],
+        roles: Iterable[ParticipationRole],
+        creator: accounts.models.User | None = None,
+        request: http.HttpRequest | None = None,
+        ) -> tuple[int, int, int]:
+    """Preapprove the participants identified by *entries* in *course*.
+
+    :arg preapp_type: ``"email"`` or ``"institutional_id"``, the kind of data
+        in *entries*. Entries are compared case-insensitively and blank
+        entries are ignored.
+    :returns: a tuple ``(created_count, exist_count, pending_approved_count)``
+        of the numbers of preapprovals created, of entries that already had
+        a preapproval, and of pending enrollment requests that were
+        approved because of the new preapprovals.
+    """
+    assert preapp_type in ["email", "institutional_id"]
+
+    known = {
+            value.lower()
+            for value in ParticipationPreapproval.objects
+            .filter(course=course, **{f"{preapp_type}__isnull": False})
+            .values_list(preapp_type, flat=True)}
+
+    new_entries: list[str] = []
+    exist_count = 0
+    for entry in entries:
+        entry = entry.strip()
+
+        if not entry:
+            continue
+
+        if entry.lower() in known:
+            exist_count += 1
+        else:
+            known.add(entry.lower())
+            new_entries.append(entry)
+
+    new_keys = {entry.lower() for entry in new_entries}
+
+    # approve pending enrollment requests of the newly preapproved
+    pending_qset = Participation.objects.filter(
+            course=course,
+            status=ParticipationStatus.requested)
+    if (preapp_type == "institutional_id"
+            and course.preapproval_require_verified_inst_id):
+        pending_qset = pending_qset.filter(user__institutional_id_verified=True)
+
+    pending = [
+            participation
+            for participation in pending_qset.select_related("user", "course")
+            if (getattr(participation.user, preapp_type) or "").lower()
+            in new_keys]
+
+    if pending:
+        with get_enrollment_mail_connection() as connection:
+            for participation in pending:
+                participation.status = ParticipationStatus.active
+                participation.save()
+                send_enrollment_decision(participation, True, request,
+                        connection=connection)
+
+    preapprovals = ParticipationPreapproval.objects.bulk_create(
+            [ParticipationPreapproval(
+                course=course, creator=creator, **{preapp_type: entry})
+                for entry in new_entries],
+            batch_size=1000)
+
+    roles = list(roles)
+    roles_through = ParticipationPreapproval.roles.through
+    roles_through.objects.bulk_create(
+            [roles_through(participationpreapproval=preapproval,
+                participationrole=role)
+                for preapproval in preapprovals
+                for role in roles],
+            batch_size=1000)
+
+    return len(new_entries), exist_count, len(pending)
+
+
 @login_required
 @transaction.atomic
 @course_view
@@ -473,64 +590,14 @@ def create_preapprovals(pctx):
         form = BulkPreapprovalsForm(pctx.course, request.POST)
         if form.is_valid():
 
-            created_count = 0
-            exist_count = 0
-            pending_approved_count = 0
-
-            roles = form.cleaned_data["roles"]
-            preapp_type = form.cleaned_data["preapproval_type"]
-
-            for ln in form.cleaned_data["preapproval_data"].split("\n"):
-                ln = ln.strip()
-
-                if not ln:
-                    continue
-
-                preapp_filter_kwargs = {f"{preapp_type}__iexact": ln}
-
-                try:
-                    ParticipationPreapproval.objects.get(
-                        course=pctx.course, **preapp_filter_kwargs)
-                except ParticipationPreapproval.DoesNotExist:
-
-                    # approve if ln is requesting enrollment
-                    user_filter_kwargs = {f"user__{preapp_type}__iexact": ln}
-                    if preapp_type == "institutional_id":
-                        if pctx.course.preapproval_require_verified_inst_id:
-                            user_filter_kwargs.update(
-                                {"user__institutional_id_verified": True})
-
-                    try:
-                        pending = Participation.objects.get(
-                                course=pctx.course,
-                                status=ParticipationStatus.requested,
-                                **user_filter_kwargs)
-
-                    except Participation.DoesNotExist:
-                        pass
-
-                    else:
-                        pending.status = ParticipationStatus.active
-                        pending.save()
-                        send_enrollment_decision(pending, True, request)
-                        pending_approved_count += 1
-
-                else:
-                    exist_count += 1
-                    continue
-
-                preapproval = ParticipationPreapproval()
-                if preapp_type == "email":
-                    preapproval.email = ln
-                else:
-                    assert preapp_type == "institutional_id"
-                    preapproval.institutional_id = ln
-                preapproval.course = pctx.course
-                preapproval.creator = request.user
-                preapproval.save()
-                preapproval.roles.set(roles)
-
-                created_count += 1
+            created_count, exist_count, pending_approved_count = (
+                    add_preapprovals(
+                        pctx.course,
+                        form.cleaned_data["preapproval_type"],
+                        form.cleaned_data["preapproval_data"].split("\n"),
+                        form.cleaned_data["roles"],
+                        creator=request.user,
+                        request=request))
 
             messages.add_message(request, messages.INFO,
                     _(
@@ -610,7 +677,7 @@ _LEX_TABLE: LexTable = [
 
 _TERMINALS = ([
     _id, _email, _email_contains, _user, _user_contains, _tagged, _role, _status,
-    _institutional_id, _institutional_id_contains
+    _institutional_id, _institutional_id_contains, _has_started, _has_submitted
 ])
 
 # {{{ operator precedence
@@ -625,6 +692,14 @@ _PREC_NOT = 30
 # {{{ parser
 
 def parse_query(course: Course, expr_str: str) -> Q:
+    """Parse a participation query into a :class:`~django.db.models.Q` to be
+    applied to :class:`~course.models.Participation` objects of *course*.
+
+    Terms that refer to related objects (tags, roles, flow sessions) are
+    expressed as ``EXISTS`` subqueries rather than joins. That way, they
+    neither duplicate rows nor constrain each other when combined, so that
+    e.g. ``tagged:a and tagged:b`` matches participations with both tags.
+    """
 
     def parse_terminal(pstate: LexIterator):
         next_tag = pstate.next_tag()
@@ -666,11 +741,11 @@ def parse_query(course: Course, expr_str: str) -> Q:
             return result
 
         elif next_tag is _tagged:
-            ptag, _created = ParticipationTag.objects.get_or_create(
-                    course=course,
-                    name=pstate.next_match_obj().group(1))
-
-            result = Q(tags__pk=ptag.pk)
+            result = Q(Exists(
+                    Participation.tags.through.objects.filter(
+                        participation=OuterRef("pk"),
+                        participationtag__course=course,
+                        participationtag__name=pstate.next_match_obj().group(1))))
 
             pstate.advance()
             return result
@@ -678,11 +753,11 @@ def parse_query(course: Course, expr_str: str) -> Q:
         elif next_tag is _role:
             name_map = {"teaching_assistant": "ta"}
             name = pstate.next_match_obj().group(1)
-            prole, _created = ParticipationRole.objects.get_or_create(
-                    course=course,
-                    identifier=name_map.get(name, name))
-
-            result = Q(roles__pk=prole.pk)
+            result = Q(Exists(
+                    Participation.roles.through.objects.filter(
+                        participation=OuterRef("pk"),
+                        participationrole__course=course,
+                        participationrole__identifier=name_map.get(name, name))))
 
             pstate.advance()
             return result
@@ -695,18 +770,23 @@ def parse_query(course: Course, expr_str: str) -> Q:
 
         elif next_tag is _has_started:
             flow_id = pstate.next_match_obj().group(1)
-            result = (
-                    Q(flow_sessions__flow_id=flow_id)
-                    & Q(flow_sessions__course=course))
+            # A participation's flow sessions are all in its course. Not
+            # filtering by course lets the database use the index on
+            # (participation, flow_id, in_progress).
+            result = Q(Exists(
+                    FlowSession.objects.filter(
+                        participation=OuterRef("pk"),
+                        flow_id=flow_id)))
             pstate.advance()
             return result
 
         elif next_tag is _has_submitted:
             flow_id = pstate.next_match_obj().group(1)
-            result = (
-                    Q(flow_sessions__flow_id=flow_id)
-                    & Q(flow_sessions__course=course)
-                    & Q(flow_sessions__in_progress=False))
+            result = Q(Exists(
+                    FlowSession.objects.filter(
+                        participation=OuterRef("pk"),
+                        flow_id=flow_id,
+                        in_progress=False)))
             pstate.advance()
             return result
 
@@ -772,6 +852,12 @@ def parse_query(course: Course, expr_str: str) -> Q:
 
 # {{{ participation query
 
+QUERY_PARTICIPATIONS_PAGE_SIZE = 500
+
+# Results are counted up to this many, to bound the cost of counting.
+QUERY_PARTICIPATIONS_MAX_COUNT = 10 * QUERY_PARTICIPATIONS_PAGE_SIZE
+
+
 class ParticipationQueryForm(StyledForm):
     queries = forms.CharField(
             required=True,
@@ -808,6 +894,13 @@ class ParticipationQueryForm(StyledForm):
     tag = forms.CharField(label=_("Tag"),
             help_text=_("Tag to apply or remove"),
             required=False)
+    page = forms.IntegerField(label=_("Result page"),
+            min_value=1, initial=1,
+            help_text=string_concat(
+                _("Results are listed %d at a time.")
+                % QUERY_PARTICIPATIONS_PAGE_SIZE, " ",
+                _("Operations apply to all results.")),
+            required=False)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -827,6 +920,99 @@ class ParticipationQueryForm(StyledForm):
         return tag
 
 
+def _count_query_result_pages(count: int) -> int:
+    return max(1, -(-count // QUERY_PARTICIPATIONS_PAGE_SIZE))
+
+
+@dataclass(frozen=True)
+class ParticipationQueryResultPage:
+    number: int
+    start_index: int
+    end_index: int
+    # the number of results, at most QUERY_PARTICIPATIONS_MAX_COUNT
+    count: int
+    # whether there are more results than that
+    more: bool
+
+    @property
+    def num_pages(self) -> int:
+        return _count_query_result_pages(self.count)
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.more or self.num_pages > 1
+
+
+def get_participation_query_page(
+        result_qset: query.QuerySet[Participation],
+        number: int | None,
+        ) -> tuple[ParticipationQueryResultPage, list[int]]:
+    """Count the results of the ordered *result_qset* (up to
+    :data:`QUERY_PARTICIPATIONS_MAX_COUNT`) and find the primary keys of
+    the results on page *number*.
+    """
+    count = result_qset[:QUERY_PARTICIPATIONS_MAX_COUNT + 1].count()
+    more = count > QUERY_PARTICIPATIONS_MAX_COUNT
+    count = min(count, QUERY_PARTICIPATIONS_MAX_COUNT)
+
+    number = max(1, number or 1)
+    if not more:
+        number = min(number, _count_query_result_pages(count))
+
+    start = (number - 1) * QUERY_PARTICIPATIONS_PAGE_SIZE
+    pks = list(result_qset
+            .values_list("pk", flat=True)
+            [start:start + QUERY_PARTICIPATIONS_PAGE_SIZE])
+
+    return ParticipationQueryResultPage(
+            number=number,
+            start_index=start + 1,
+            end_index=start + len(pks),
+            count=count,
+            more=more), pks
+
+
+def apply_participation_query_operation(
+        course: Course,
+        result_qset: query.QuerySet[Participation],
+        op: str,
+        tag_name: str | None) -> int:
+    """Apply *op* (see :class:`ParticipationQueryForm`) to all
+    participations in *result_qset*, in the database.
+
+    :returns: the number of participations changed.
+    """
+    if op == "drop":
+        count = (result_qset
+                .exclude(status=ParticipationStatus.dropped)
+                .update(status=ParticipationStatus.dropped))
+        invalidate_permission_cache(course.id)
+        return count
+
+    ptag, __ = ParticipationTag.objects.get_or_create(
+            course=course, name=tag_name)
+    through = Participation.tags.through
+
+    if op == "remove_tag":
+        count, __ = (through.objects
+                .filter(participationtag=ptag,
+                    participation__in=result_qset.values("pk"))
+                .delete())
+        return count
+
+    assert op == "apply_tag"
+
+    untagged_ids = list(result_qset
+            .exclude(tags=ptag)
+            .values_list("pk", flat=True))
+    through.objects.bulk_create(
+            [through(participation_id=pid, participationtag=ptag)
+                for pid in untagged_ids],
+            batch_size=1000,
+            ignore_conflicts=True)
+    return len(untagged_ids)
+
+
 @login_required
 @transaction.atomic
 @course_view
@@ -839,6 +1025,7 @@ def query_participations(pctx):
     request = pctx.request
 
     result = None
+    result_page = None
 
     if request.method == "POST":
         form = ParticipationQueryForm(request.POST)
@@ -870,34 +1057,31 @@ def query_participations(pctx):
                 parsed_query = None
 
             if parsed_query is not None:
-                result = list(Participation.objects
+                result_qset = (Participation.objects
                         .filter(course=pctx.course)
                         .filter(parsed_query)
-                        .order_by("user__username")
-                        .select_related("user")
-                        .prefetch_related("tags"))
+                        .order_by("user__username", "id"))
 
-                if "apply" in request.POST:
+                # Find the page before applying the operation, so that it
+                # lists what the operation was applied to, even if the query
+                # no longer matches it.
+                result_page, result_pks = get_participation_query_page(
+                        result_qset, form.cleaned_data["page"])
 
-                    if form.cleaned_data["op"] == "apply_tag":
-                        ptag, __ = ParticipationTag.objects.get_or_create(
-                                course=pctx.course, name=form.cleaned_data["tag"])
-                        for p in result:
-                            p.tags.add(ptag)
-                    elif form.cleaned_data["op"] == "remove_tag":
-                        ptag, __ = ParticipationTag.objects.get_or_create(
-                                course=pctx.course, name=form.cleaned_data["tag"])
-                        for p in result:
-                            p.tags.remove(ptag)
-                    else:
-                        assert form.cleaned_data["op"] == "drop"
-                        for p in result:
-                            p.status = ParticipationStatus.dropped
-                            p.save()
+                if "apply" in request.POST:
+                    count = apply_participation_query_operation(
+                            pctx.course, result_qset,
+                            form.cleaned_data["op"], form.cleaned_data["tag"])
 
                     messages.add_message(request, messages.INFO,
                             "Operation successful on %d participations."
-                            % len(result))
+                            % count)
+
+                result = list(Participation.objects
+                        .filter(pk__in=result_pks)
+                        .order_by("user__username", "id")
+                        .select_related("user")
+                        .prefetch_related("tags"))
 
     else:
         form = ParticipationQueryForm()
@@ -905,6 +1089,7 @@ def query_participations(pctx):
     return render_course_page(pctx, "course/query-participations.html", {
         "form": form,
         "result": result,
+        "result_page": result_page,
     })
 
 # }}}
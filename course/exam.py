@@ -25,7 +25,8 @@ THE SOFTWARE.
 
 import secrets
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, cast
+from functools import cache
+from typing import TYPE_CHECKING, Any, cast
 
 from crispy_forms.layout import Submit
 from django import forms, http
@@ -49,6 +50,7 @@ from django.views.decorators.debug import sensitive_post_parameters
 from pytools import not_none
 
 from course.constants import (
+    SESSION_EXAM_LOCKDOWN_STATE,
     SESSION_LOCKED_TO_FLOW_PK,
     ExamTicketState,
     ParticipationPermission as PPerm,
@@ -76,10 +78,12 @@ from relate.utils import (
 
 if TYPE_CHECKING:
     import datetime
-    from collections.abc import Collection, Iterable
+    from collections.abc import Callable, Collection, Iterable, Sequence
 
     from django.http.request import HttpRequest
 
+    from accounts.models import User
+
 # }}}
 
 
@@ -90,6 +94,19 @@ def gen_ticket_code():
     return "".join(secrets.choice(ticket_alphabet) for _ in range(12))
 
 
+def gen_ticket_codes(count: int, exclude: Iterable[str] = ()) -> list[str]:
+    """Return *count* distinct ticket codes, none of which is in *exclude*."""
+    seen = set(exclude)
+    codes: list[str] = []
+    while len(codes) < count:
+        code = gen_ticket_code()
+        if code not in seen:
+            seen.add(code)
+            codes.append(code)
+
+    return codes
+
+
 # {{{ issue ticket
 
 class IssueTicketForm(StyledForm):
@@ -399,6 +416,70 @@ class TicketInfo:
     exam_description: str
 
 
+def make_exam_tickets(
+        exam: Exam,
+        participations: Iterable[Participation],
+        creator: User | None,
+        *,
+        code: str | None = None,
+        require_login: bool = False,
+        valid_start_time: datetime.datetime | None = None,
+        valid_end_time: datetime.datetime | None = None,
+        restrict_to_facility: str | None = None,
+        ) -> list[ExamTicket]:
+    """Return unsaved, valid :class:`~course.models.ExamTicket` instances for
+    *exam*, one per participation. Unless *code* is given, each ticket gets
+    a fresh code distinct from the other new tickets and from the existing
+    tickets for *exam*.
+
+    Use :func:`save_exam_tickets` to store them.
+    """
+    participations = list(participations)
+
+    if code:
+        codes = [code] * len(participations)
+    else:
+        codes = gen_ticket_codes(len(participations),
+                exclude=ExamTicket.objects.filter(exam=exam)
+                    .values_list("code", flat=True))
+
+    return [
+            ExamTicket(
+                exam=exam,
+                participation=participation,
+                creator=creator,
+                state=ExamTicketState.valid,
+                code=ticket_code,
+                require_login=require_login,
+                valid_start_time=valid_start_time,
+                valid_end_time=valid_end_time,
+                restrict_to_facility=restrict_to_facility)
+            for participation, ticket_code in zip(
+                participations, codes, strict=True)]
+
+
+def save_exam_tickets(
+        exam: Exam,
+        tickets: Sequence[ExamTicket],
+        *,
+        revoke_prior: bool = False) -> None:
+    """Store *tickets* (as returned by :func:`make_exam_tickets`) in a single
+    transaction, optionally revoking all prior valid or used tickets for
+    *exam* first.
+    """
+    with transaction.atomic():
+        if revoke_prior:
+            ExamTicket.objects.filter(
+                    exam=exam,
+                    state__in=(
+                        ExamTicketState.valid,
+                        ExamTicketState.used,
+                        )
+                    ).update(state=ExamTicketState.revoked)
+
+        ExamTicket.objects.bulk_create(tickets, batch_size=1000)
+
+
 @course_view
 def batch_issue_exam_tickets(pctx: CoursePageContext):
     if not pctx.has_permission(PPerm.batch_issue_exam_ticket):
@@ -418,62 +499,47 @@ def batch_issue_exam_tickets(pctx: CoursePageContext):
             import minijinja
 
             from course.content import markup_to_html
+
+            participation_qset = (
+                    Participation.objects.filter(
+                        course=pctx.course,
+                        status=ParticipationStatus.active)
+                    .select_related("user")
+                    .order_by("user__last_name"))
+            if form.cleaned_data["limit_to_tag"]:
+                participation_qset = participation_qset.filter(
+                        tags__pk=form.cleaned_data["limit_to_tag"].pk)
+
+            tickets = make_exam_tickets(
+                    exam, participation_qset, request.user,
+                    code=form.cleaned_data["code"],
+                    require_login=form.cleaned_data["require_login"],
+                    valid_start_time=form.cleaned_data["valid_start_time"],
+                    valid_end_time=form.cleaned_data["valid_end_time"],
+                    restrict_to_facility=(
+                        form.cleaned_data["restrict_to_facility"]))
+
+            # The ticket sheet is rendered before anything is saved, so that
+            # no tickets are issued if rendering fails, and so that the
+            # transaction storing the tickets stays short.
             try:
-                with transaction.atomic():
-                    if form.cleaned_data["revoke_prior"]:
-                        ExamTicket.objects.filter(
-                                exam=exam,
-                                state__in=(
-                                    ExamTicketState.valid,
-                                    ExamTicketState.used,
+                checkin_uri = pctx.request.build_absolute_uri(
+                        reverse("relate-check_in_for_exam"))
+                form_text = markup_to_html(
+                        pctx.course, pctx.repo, pctx.course_commit_sha,
+                        form.cleaned_data["format"], jinja_env={
+                                "tickets": [
+                                    TicketInfo(
+                                        user_name=ticket.participation.user.username,
+                                        full_name=not_none(
+                                            ticket.participation.user
+                                            .get_full_name()),
+                                        code=ticket.code,
+                                        exam_description=exam.description,
                                     )
-                                ).update(state=ExamTicketState.revoked)
-
-                    tickets = []
-                    participation_qset = (
-                            Participation.objects.filter(
-                                course=pctx.course,
-                                status=ParticipationStatus.active)
-                            .order_by("user__last_name"))
-                    if form.cleaned_data["limit_to_tag"]:
-                        participation_qset = participation_qset.filter(
-                                tags__pk=form.cleaned_data["limit_to_tag"].pk)
-
-                    for participation in participation_qset:
-                        ticket = ExamTicket()
-                        ticket.exam = exam
-                        ticket.participation = participation
-                        ticket.creator = request.user
-                        ticket.state = ExamTicketState.valid
-                        if form.cleaned_data["code"]:
-                            ticket.code = form.cleaned_data["code"]
-                        else:
-                            ticket.code = gen_ticket_code()
-                        ticket.require_login = form.cleaned_data["require_login"]
-                        ticket.valid_start_time = \
-                                form.cleaned_data["valid_start_time"]
-                        ticket.valid_end_time = form.cleaned_data["valid_end_time"]
-                        ticket.restrict_to_facility = \
-                                form.cleaned_data["restrict_to_facility"]
-                        ticket.save()
-
-                        tickets.append(
-                               TicketInfo(
-                                   user_name=ticket.participation.user.username,
-                                   full_name=not_none(
-                                       ticket.participation.user.get_full_name()),
-                                   code=ticket.code,
-                                   exam_description=ticket.exam.description,
-                               ))
-
-                    checkin_uri = pctx.request.build_absolute_uri(
-                            reverse("relate-check_in_for_exam"))
-                    form_text = markup_to_html(
-                            pctx.course, pctx.repo, pctx.course_commit_sha,
-                            form.cleaned_data["format"], jinja_env={
-                                    "tickets": tickets,
-                                    "checkin_uri": checkin_uri,
-                                    })
+                                    for ticket in tickets],
+                                "checkin_uri": checkin_uri,
+                                })
             except minijinja.TemplateError as e:
                 messages.add_message(request, messages.ERROR,
                     mark_safe(string_concat(
@@ -488,6 +554,9 @@ def batch_issue_exam_tickets(pctx: CoursePageContext):
                     % {"err_type": type(e).__name__,
                         "err_str": escape(str(e))})
             else:
+                save_exam_tickets(exam, tickets,
+                        revoke_prior=form.cleaned_data["revoke_prior"])
+
                 messages.add_message(request, messages.SUCCESS,
                         _("%d tickets issued.") % len(tickets))
 
@@ -730,7 +799,9 @@ def get_login_exam_ticket(request: http.HttpRequest) -> ExamTicket | None:
     if exam_ticket_pk is None:
         return None
 
-    return ExamTicket.objects.get(pk=exam_ticket_pk)
+    return (ExamTicket.objects
+            .select_related("exam", "participation")
+            .get(pk=exam_ticket_pk))
 
 
 # {{{ lockdown middleware
@@ -806,96 +877,178 @@ class ExamFacilityMiddleware:
         return self.get_response(request)
 
 
-class ExamLockdownMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+# The lockdown state cached in the session is checked against the database
+# again after this many seconds, or once the login exam ticket expires,
+# whichever comes first.
+EXAM_LOCKDOWN_STATE_MAX_AGE = 10 * 60
 
-    def __call__(self, request: RelateHttpRequest):
-        request.relate_exam_lockdown = False
 
-        if SESSION_LOCKED_TO_FLOW_PK in request.session:
-            exam_flow_session_pk = request.session[SESSION_LOCKED_TO_FLOW_PK]
+def lock_down_to_flow_session(
+        request: http.HttpRequest, flow_session: FlowSession) -> None:
+    """Lock the session of *request* down to *flow_session*, and cache what
+    :class:`ExamLockdownMiddleware` needs to know about it in the session.
+    """
+    import time
+
+    state = request.session.get(SESSION_EXAM_LOCKDOWN_STATE)
+    if (request.session.get(SESSION_LOCKED_TO_FLOW_PK) == flow_session.pk
+            and state is not None
+            and state["flow_session_pk"] == flow_session.pk
+            and time.time() < state["expires"]):
+        return
+
+    expires = time.time() + EXAM_LOCKDOWN_STATE_MAX_AGE
+
+    ticket = get_login_exam_ticket(request)
+    ticket_valid_end_time = None
+    if ticket is not None and ticket.valid_end_time is not None:
+        ticket_valid_end_time = ticket.valid_end_time.isoformat()
+        expires = min(expires, ticket.valid_end_time.timestamp())
+
+    request.session[SESSION_LOCKED_TO_FLOW_PK] = flow_session.pk
+    request.session[SESSION_EXAM_LOCKDOWN_STATE] = {
+            "flow_session_pk": flow_session.pk,
+            "flow_id": flow_session.flow_id,
+            "course_identifier": flow_session.course.identifier,
+            "ticket_valid_end_time": ticket_valid_end_time,
+            "expires": expires,
+            }
 
-            try:
-                exam_flow_session = FlowSession.objects.get(pk=exam_flow_session_pk)
-            except ObjectDoesNotExist:
-                msg = _("Error while processing exam lockdown: "
-                        "flow session not found.")
-                messages.add_message(request, messages.ERROR, msg)
-                raise PermissionDenied(msg)
 
-            request.relate_exam_lockdown = True
+def _get_exam_lockdown_state(request: http.HttpRequest) -> dict[str, Any]:
+    import time
 
-            from django.urls import resolve
-            resolver_match = resolve(request.path)
+    exam_flow_session_pk = request.session[SESSION_LOCKED_TO_FLOW_PK]
+
+    state = request.session.get(SESSION_EXAM_LOCKDOWN_STATE)
+    if (state is not None
+            and state["flow_session_pk"] == exam_flow_session_pk
+            and time.time() < state["expires"]):
+        return state
+
+    try:
+        exam_flow_session = (FlowSession.objects
+                .select_related("course")
+                .get(pk=exam_flow_session_pk))
+    except ObjectDoesNotExist:
+        msg = _("Error while processing exam lockdown: "
+                "flow session not found.")
+        messages.add_message(request, messages.ERROR, msg)
+        raise PermissionDenied(msg) from None
+
+    try:
+        lock_down_to_flow_session(request, exam_flow_session)
+    except ExamTicket.DoesNotExist:
+        request.session.pop("relate_exam_ticket_pk_used_for_login", None)
+        lock_down_to_flow_session(request, exam_flow_session)
+
+    return request.session[SESSION_EXAM_LOCKDOWN_STATE]
+
+
+@cache
+def _get_exam_lockdown_allowed_views() -> tuple[
+        frozenset[Callable[..., Any]], frozenset[Callable[..., Any]]]:
+    """
+    :returns: a tuple ``(always_allowed, allowed_for_locked_session)`` of
+        view functions.
+    """
+    from course.auth import (
+        sign_in_by_email,
+        sign_in_by_user_pw,
+        sign_in_choice,
+        sign_in_stage2_with_token,
+        sign_out,
+        user_profile,
+    )
+    from course.flow import (
+        finish_flow_session_view,
+        update_expiration_mode,
+        update_page_bookmark_state,
+        view_flow_page,
+        view_flow_page_with_ext_resource_tabs,
+        view_resume_flow,
+    )
+    from course.views import get_current_repo_file, get_repo_file
+
+    return (
+            frozenset([
+                # NB: These two recognize and manage file access specific to
+                # exams lockdown.
+                get_repo_file,
+                get_current_repo_file,
+
+                check_in_for_exam,
+                list_available_exams,
 
-            from course.auth import (
-                sign_in_by_email,
-                sign_in_by_user_pw,
                 sign_in_choice,
+                sign_in_by_email,
                 sign_in_stage2_with_token,
-                sign_out,
+                sign_in_by_user_pw,
                 user_profile,
-            )
-            from course.flow import (
-                finish_flow_session_view,
-                update_expiration_mode,
-                update_page_bookmark_state,
+                sign_out]),
+            frozenset([
+                view_resume_flow,
                 view_flow_page,
                 view_flow_page_with_ext_resource_tabs,
-                view_resume_flow,
-                view_start_flow,
-            )
-            from course.views import get_current_repo_file, get_repo_file
+                update_expiration_mode,
+                update_page_bookmark_state,
+                finish_flow_session_view]))
 
-            ok = False
-            if (
-                resolver_match.func in [
-                    # NB: These two recognize and manage file access specific to
-                    # exams lockdown.
-                    get_repo_file,
-                    get_current_repo_file,
 
-                    check_in_for_exam,
-                    list_available_exams,
+class ExamLockdownMiddleware:
+    """While the session is locked to an exam flow session, only allow views
+    needed to take that exam.
 
-                    sign_in_choice,
-                    sign_in_by_email,
-                    sign_in_stage2_with_token,
-                    sign_in_by_user_pw,
-                    user_profile,
-                    sign_out]
+    The check happens in :meth:`process_view`, using the view that Django
+    has already resolved, and the flow session facts cached in the session
+    by :func:`lock_down_to_flow_session`, so that it normally needs no
+    database queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: RelateHttpRequest):
+        request.relate_exam_lockdown = SESSION_LOCKED_TO_FLOW_PK in request.session
+
+        return self.get_response(request)
+
+    def process_view(self, request: RelateHttpRequest,
+            view_func: Callable[..., Any],
+            view_args: Sequence[Any],
+            view_kwargs: dict[str, Any]) -> http.HttpResponse | None:
+        if SESSION_LOCKED_TO_FLOW_PK not in request.session:
+            return None
+
+        state = _get_exam_lockdown_state(request)
+
+        always_allowed, allowed_for_locked_session = (
+                _get_exam_lockdown_allowed_views())
+
+        from course.flow import view_start_flow
+
+        if (
+                view_func in always_allowed
                 or request.path.startswith("/saml2")
                 or request.path.startswith("/select2")
                 or (
-                    resolver_match.func in [
-                        view_resume_flow,
-                        view_flow_page,
-                        view_flow_page_with_ext_resource_tabs,
-                        update_expiration_mode,
-                        update_page_bookmark_state,
-                        finish_flow_session_view]
+                    view_func in allowed_for_locked_session
                     and (
-                        int(resolver_match.kwargs["flow_session_id"])
-                        == exam_flow_session_pk))
+                        int(view_kwargs["flow_session_id"])
+                        == state["flow_session_pk"]))
                 or (
-                    resolver_match.func == view_start_flow
-                    and (
-                        resolver_match.kwargs["flow_id"]
-                        == exam_flow_session.flow_id))):
-                ok = True
-
-            if not ok:
-                messages.add_message(request, messages.ERROR,
-                        _("Your RELATE session is currently locked down "
-                        "to this exam flow. Navigating to other parts of "
-                        "RELATE is not currently allowed. "
-                        "To exit this exam, log out."))
-                return redirect("relate-view_start_flow",
-                        exam_flow_session.course.identifier,
-                        exam_flow_session.flow_id)
+                    view_func is view_start_flow
+                    and view_kwargs["flow_id"] == state["flow_id"])):
+            return None
 
-        return self.get_response(request)
+        messages.add_message(request, messages.ERROR,
+                _("Your RELATE session is currently locked down "
+                "to this exam flow. Navigating to other parts of "
+                "RELATE is not currently allowed. "
+                "To exit this exam, log out."))
+        return redirect("relate-view_start_flow",
+                state["course_identifier"],
+                state["flow_id"])
 
 # }}}
 
@@ -23,6 +23,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import logging
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, ClassVar, Literal, TypeVar, cast
 
@@ -50,7 +51,6 @@ import course.utils as c_utils  # These are mocked, so import as module
 from course.constants import (
     FLOW_SESSION_EXPIRATION_MODE_CHOICES,
     GRADE_AGGREGATION_STRATEGY_CHOICES,
-    SESSION_LOCKED_TO_FLOW_PK,
     FlowPermission,
     FlowSessionExpirationMode,
     FlowSessionInteractionKind,
@@ -59,7 +59,7 @@ from course.constants import (
     is_expiration_mode_allowed,
 )
 from course.content import FlowSessionStartMode, TabDesc
-from course.exam import get_login_exam_ticket
+from course.exam import get_login_exam_ticket, lock_down_to_flow_session
 from course.models import (
     Course,
     FlowPageData,
@@ -87,6 +87,9 @@ from relate.utils import (
 )
 
 
+logger = logging.getLogger(__name__)
+
+
 # {{{ mypy
 
 if TYPE_CHECKING:
@@ -1342,7 +1345,7 @@ def lock_down_if_needed(
         ) -> None:
 
     if FlowPermission.lock_down_as_exam_session in permissions:
-        request.session[SESSION_LOCKED_TO_FLOW_PK] = flow_session.pk
+        lock_down_to_flow_session(request, flow_session)
 
 
 # {{{ view: start flow
@@ -2243,6 +2246,20 @@ def post_flow_page(
                 request.relate_impersonate_original_user
         answer_visit.save()
 
+        if answer_visit.is_submitted_answer:
+            # Only submitted answers enter the answer distribution, which
+            # computes missing normalized answers itself. Failing to cache
+            # one is not worth losing the answer over.
+            from course.analytics import cache_normalized_answer
+            try:
+                with transaction.atomic():
+                    cache_normalized_answer(
+                            fpctx.page, page_context, answer_visit)
+            except Exception:
+                logger.exception(
+                        "failed to cache normalized answer of visit %d",
+                        answer_visit.id)
+
         prev_answer_visits.insert(0, answer_visit)
 
         answer_was_graded = answer_visit.is_submitted_answer
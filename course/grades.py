@@ -23,10 +23,13 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import datetime
 import re
 from dataclasses import dataclass
 from decimal import Decimal
+from itertools import chain
 from typing import (
+    IO,
     TYPE_CHECKING,
     Any,
     cast,
@@ -34,6 +37,7 @@ from typing import (
 
 from crispy_forms.layout import Submit
 from django import forms, http
+from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import (
     ObjectDoesNotExist,
@@ -58,10 +62,12 @@ from course.models import (
     FlowSession,
     GradeChange,
     GradeStateMachine,
+    GradeSummary,
     GradingOpportunity,
     Participation,
+    rebuild_grade_summaries,
 )
-from course.utils import course_view, render_course_page
+from course.utils import EchoBuffer, course_view, render_course_page
 from course.views import get_now_or_fake_time
 from relate.utils import (
     HTML5DateTimeInput,
@@ -74,8 +80,13 @@ from relate.utils import (
 # {{{ for mypy
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    from django.db.models import QuerySet
+
     from course.content import FlowDesc
     from course.models import Course, FlowPageVisitGrade
+    from course.repo import Repo_ish, RevisionID_ish
     from course.utils import CoursePageContext
 
 # }}}
@@ -203,8 +214,12 @@ def view_grading_opportunity_list(pctx):
                 )
             .order_by("identifier"))
 
+    average_grades = get_average_grades(pctx.course)
+
     return render_course_page(pctx, "course/gradebook-opp-list.html", {
-        "grading_opps": grading_opps,
+        "grading_opps_and_averages": [
+            (opp, *average_grades.get(opp.pk, (None, 0)))
+            for opp in grading_opps],
         })
 
 # }}}
@@ -215,74 +230,114 @@ def view_grading_opportunity_list(pctx):
 @dataclass
 class GradeInfo:
     opportunity: GradingOpportunity
-    grade_state_machine: GradeStateMachine
+    grade_state_machine: GradeStateMachine | GradeSummary
 
 
-def get_grade_table(course: Course) -> tuple[
-        list[Participation], list[GradingOpportunity], list[list[GradeInfo]]]:
-
-    # NOTE: It's important that these queries are sorted consistently,
-    # also consistently with the code below.
-    grading_opps = list(GradingOpportunity.objects
+def get_gradebook_opportunities(course: Course) -> list[GradingOpportunity]:
+    return list(GradingOpportunity.objects
             .filter(
                 course=course,
                 shown_in_grade_book=True,
                 )
             .order_by("identifier"))
 
-    participations = list(Participation.objects
+
+def get_average_grades(course: Course,
+            opportunities: list[GradingOpportunity] | None = None,
+        ) -> dict[int, tuple[Decimal, int]]:
+    """Compute, in one query, the average effective grade of the
+    participations included in grade statistics for each grading
+    opportunity in *course* (or in *opportunities*).
+
+    :returns: a mapping from opportunity ID to a tuple
+        ``(average_percentage, population)``. Opportunities without any
+        grades are not included.
+    """
+    from django.db.models import Avg, Count
+
+    summaries = GradeSummary.objects.filter(
+            opportunity__course=course,
+            participation__in=(Participation.objects
+                .filter(
+                    course=course,
+                    roles__permissions__permission=(
+                        PPerm.included_in_grade_statistics))
+                .values("id")),
+            aggregate_percentage__isnull=False)
+    if opportunities is not None:
+        summaries = summaries.filter(opportunity__in=opportunities)
+
+    return {
+            opp_id: (avg_percentage, population)
+            for opp_id, avg_percentage, population in (summaries
+                .values("opportunity_id")
+                .annotate(
+                    avg_percentage=Avg("aggregate_percentage"),
+                    population=Count("id"))
+                .values_list("opportunity_id", "avg_percentage", "population"))}
+
+
+def iter_grade_table(course: Course,
+            grading_opps: list[GradingOpportunity],
+        ) -> Iterator[tuple[Participation, list[GradeInfo]]]:
+    """Yield a row of grades for each active participation in *course*,
+    in order of participation ID, with one entry for each of
+    *grading_opps*. Rows are read from the database in chunks, so
+    memory use does not grow with the number of participants.
+    """
+
+    participations = (Participation.objects
             .filter(
                 course=course,
                 status=ParticipationStatus.active)
             .order_by("id")
-            .select_related("user"))
+            .select_related("user")
+            .iterator(chunk_size=500))
 
-    grade_changes = list(GradeChange.objects
+    # NOTE: It's important that this is sorted consistently
+    # with the participations above.
+    summaries = iter(GradeSummary.objects
             .filter(
-                opportunity__course=course,
-                opportunity__shown_in_grade_book=True)
-            .order_by(
-                "participation__id",
-                "opportunity__identifier",
-                "grade_time")
-            .select_related("participation")
-            .select_related("participation__user")
-            .select_related("opportunity"))
-
-    idx = 0
+                opportunity__in=grading_opps,
+                participation__status=ParticipationStatus.active)
+            .order_by("participation_id")
+            .iterator(chunk_size=2000))
 
-    grade_table = []
+    summary = next(summaries, None)
     for participation in participations:
-        while (
-                idx < len(grade_changes)
-                and grade_changes[idx].participation.id < participation.id):
-            idx += 1
+        opp_id_to_summary: dict[int, GradeSummary] = {}
+        while (summary is not None
+                and summary.participation_id <= participation.pk):
+            if summary.participation_id == participation.pk:
+                opp_id_to_summary[summary.opportunity_id] = summary
+            summary = next(summaries, None)
 
         grade_row = []
         for opp in grading_opps:
-            while (
-                    idx < len(grade_changes)
-                    and grade_changes[idx].participation.pk == participation.pk
-                    and grade_changes[idx].opportunity.identifier < opp.identifier
-                    ):
-                idx += 1
-
-            my_grade_changes = []
-            while (
-                    idx < len(grade_changes)
-                    and grade_changes[idx].opportunity.pk == opp.pk
-                    and grade_changes[idx].participation.pk == participation.pk):
-                my_grade_changes.append(grade_changes[idx])
-                idx += 1
-
-            state_machine = GradeStateMachine()
-            state_machine.consume(my_grade_changes)
+            opp_summary = opp_id_to_summary.get(opp.pk)
+            if opp_summary is None:
+                opp_summary = GradeSummary(
+                        opportunity=opp, participation=participation)
+            else:
+                opp_summary.opportunity = opp
+                opp_summary.participation = participation
 
             grade_row.append(
                     GradeInfo(
                         opportunity=opp,
-                        grade_state_machine=state_machine))
+                        grade_state_machine=opp_summary))
+
+        yield participation, grade_row
 
+
+def get_grade_table(course: Course) -> tuple[
+        list[Participation], list[GradingOpportunity], list[list[GradeInfo]]]:
+    grading_opps = get_gradebook_opportunities(course)
+
+    participations = []
+    grade_table = []
+    for participation, grade_row in iter_grade_table(course, grading_opps):
+        participations.append(participation)
         grade_table.append(grade_row)
 
     return participations, grading_opps, grade_table
@@ -315,33 +370,31 @@ def export_gradebook_csv(pctx):
     if not pctx.has_permission(PPerm.batch_export_grade):
         raise PermissionDenied(_("may not batch-export grades"))
 
-    participations, grading_opps, grade_table = get_grade_table(pctx.course)
-
-    from io import StringIO
-    csvfile = StringIO()
+    course = pctx.course
+    grading_opps = get_gradebook_opportunities(course)
 
     import csv
-
-    fieldnames = ["user_name", "last_name", "first_name"] + [
-            gopp.identifier for gopp in grading_opps]
-
-    writer = csv.writer(csvfile)
-
-    writer.writerow(fieldnames)
-
-    for participation, grades in zip(participations, grade_table, strict=True):
-        writer.writerow([
-            participation.user.username,
-            participation.user.last_name,
-            participation.user.first_name,
-            ] + [grade_info.grade_state_machine.stringify_machine_readable_state()
-                for grade_info in grades])
-
-    response = http.HttpResponse(
-            csvfile.getvalue().encode("utf-8"),
+    writer = csv.writer(EchoBuffer())
+
+    def generate_rows() -> Iterator[str]:
+        yield writer.writerow(["user_name", "last_name", "first_name"] + [
+                gopp.identifier for gopp in grading_opps])
+
+        for participation, grades in iter_grade_table(course, grading_opps):
+            yield writer.writerow([
+                participation.user.username,
+                participation.user.last_name,
+                participation.user.first_name,
+                ] + [
+                    grade_info.grade_state_machine
+                    .stringify_machine_readable_state()  # pyright: ignore[reportAttributeAccessIssue]
+                    for grade_info in grades])
+
+    response = http.StreamingHttpResponse(
+            generate_rows(),
             content_type="text/plain; charset=utf-8")
     response["Content-Disposition"] = (
-            f'attachment; filename="grades-{pctx.course.identifier}.csv"')
+            f'attachment; filename="grades-{course.identifier}.csv"')
     return response
 
 # }}}
@@ -533,25 +586,10 @@ def view_grades_by_opportunity(
     # NOTE: It's important that these queries are sorted consistently,
     # also consistently with the code below.
 
-    participations = list(Participation.objects
-            .filter(
-                course=pctx.course,
-                status=ParticipationStatus.active)
-            .order_by("id")
-            .select_related("user"))
-
-    grade_changes = list(GradeChange.objects
-            .filter(opportunity=opportunity)
-            .order_by(
-                "participation__id",
-                "grade_time")
-            .select_related("participation")
-            .select_related("participation__user")
-            .select_related("opportunity"))
-
     if opportunity.flow_id:
         flow_sessions: list[FlowSession] | None = list(FlowSession.objects
                 .filter(
+                    course=pctx.course,
                     flow_id=opportunity.flow_id,
                     )
                 .order_by(
@@ -563,29 +601,17 @@ def view_grades_by_opportunity(
 
     view_page_grades = pctx.request.GET.get("view_page_grades") == "1"
 
-    gchng_idx = 0
     fsess_idx = 0
 
     finished_sessions = 0
     total_sessions = 0
 
+    participations = []
     grade_table: list[tuple[Participation, OpportunitySessionGradeInfo]] = []
-    for participation in participations:
-        # Advance in grade change list
-        while (
-                gchng_idx < len(grade_changes)
-                and grade_changes[gchng_idx].participation.pk < participation.pk):
-            gchng_idx += 1
-
-        my_grade_changes = []
-        while (
-                gchng_idx < len(grade_changes)
-                and grade_changes[gchng_idx].participation.pk == participation.pk):
-            my_grade_changes.append(grade_changes[gchng_idx])
-            gchng_idx += 1
-
-        state_machine = GradeStateMachine()
-        state_machine.consume(my_grade_changes)
+    for participation, (gradebook_info,) in iter_grade_table(
+            pctx.course, [opportunity]):
+        participations.append(participation)
+        state_machine = gradebook_info.grade_state_machine
 
         # Advance in flow session list
         if flow_sessions is None:
@@ -796,49 +822,8 @@ def view_reopen_session(pctx: CoursePageContext, flow_session_id: str,
 def average_grade(
             opportunity: GradingOpportunity
         ) -> tuple[float | Decimal | None, int]:
-
-    grade_changes = (GradeChange.objects
-            .filter(
-                opportunity=opportunity,
-                participation__roles__permissions__permission=(
-                    PPerm.included_in_grade_statistics))
-            .order_by(
-                "participation__id",
-                "grade_time")
-            .select_related("participation")
-            .select_related("opportunity"))
-
-    grades = []
-    my_grade_changes: list[GradeChange] = []
-
-    def finalize() -> None:
-
-        if not my_grade_changes:
-            return
-
-        state_machine = GradeStateMachine()
-        state_machine.consume(my_grade_changes)
-
-        percentage = state_machine.percentage()
-        if percentage is not None:
-            grades.append(percentage)
-
-        my_grade_changes.clear()
-
-    last_participation = None
-    for gchange in grade_changes:
-        if last_participation != gchange.participation:
-            finalize()
-            last_participation = gchange.participation
-
-        my_grade_changes.append(gchange)
-
-    finalize()
-
-    if grades:
-        return sum(grades)/len(grades), len(grades)
-    else:
-        return None, 0
+    return get_average_grades(
+            opportunity.course, [opportunity]).get(opportunity.pk, (None, 0))
 
 
 def get_single_grade_changes_and_state_machine(opportunity: GradingOpportunity,
@@ -1424,6 +1409,12 @@ def import_grades(pctx):
 
                 if is_import:
                     GradeChange.objects.bulk_create(grade_changes)
+                    # bulk_create does not send post_save.
+                    rebuild_grade_summaries(pctx.course,
+                            opportunity=form.cleaned_data["grading_opportunity"],
+                            participation_ids={
+                                gchange.participation.pk
+                                for gchange in grade_changes})
                     form_text = render_to_string(
                             "course/grade-import-preview.html", {
                                 "show_grade_changes": False,
@@ -1453,6 +1444,323 @@ def import_grades(pctx):
 
 # {{{ download all submissions
 
+# Number of submissions read (e.g. from bulk storage) ahead of the one
+# being added to a submission archive
+SUBMISSION_READ_AHEAD = 8
+
+
+class _ZipStreamBuffer:
+    """A write-only, unseekable file for :class:`zipfile.ZipFile`. The data
+    written so far is retrieved (and forgotten) with :meth:`pop`.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        result = b"".join(self._chunks)
+        self._chunks = []
+        return result
+
+
+def stream_zip(entries: Iterable[tuple[str, bytes]]) -> Iterator[bytes]:
+    """Yield a ZIP archive of *entries*, a sequence of (file name, contents)
+    tuples, in pieces as it is being built.
+    """
+    from zipfile import ZipFile
+
+    buf = _ZipStreamBuffer()
+    with ZipFile(cast("IO[bytes]", buf), "w") as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+            yield buf.pop()
+
+    yield buf.pop()
+
+
+def get_submission_visits(
+            course: Course,
+            flow_id: str,
+            group_id: str,
+            page_id: str,
+            *,
+            non_in_progress_only: bool,
+            restrict_to_rules_tag: str | None,
+        ) -> QuerySet[FlowPageVisit]:
+    visits = (FlowPageVisit.objects
+            .filter(
+                flow_session__course=course,
+                flow_session__flow_id=flow_id,
+                page_data__group_id=group_id,
+                page_data__page_id=page_id,
+                is_submitted_answer=True,
+                )
+            .order_by("visit_time"))
+
+    if non_in_progress_only:
+        visits = visits.filter(flow_session__in_progress=False)
+
+    if restrict_to_rules_tag is not None:
+        visits = visits.filter(flow_session__access_rules_tag=restrict_to_rules_tag)
+
+    return visits
+
+
+def get_submission_archive_file_name(
+        course: Course, flow_id: str, group_id: str, page_id: str) -> str:
+    return (f"submissions_{course.identifier}_"
+            f"{flow_id}_{group_id}_{page_id}_"
+            f"{now().date().strftime('%Y-%m-%d')}.zip")
+
+
+def iter_submission_files(
+            course: Course,
+            repo: Repo_ish,
+            commit_sha: RevisionID_ish,
+            flow_id: str,
+            group_id: str,
+            page_id: str,
+            visits: QuerySet[FlowPageVisit],
+            which_attempt: str,
+            include_feedback: bool,
+            progress_callback: Callable[[int, int], None] | None = None,
+        ) -> Iterator[tuple[str, bytes]]:
+    """Return an iterator over (file name, contents) tuples of the
+    submissions among *visits* (which must be ordered by visit time), one
+    per participant if *which_attempt* is ``"first"`` or ``"last"``, or
+    one per session if it is ``"all"``.
+
+    Answers are read on a thread pool, at most :data:`SUBMISSION_READ_AHEAD`
+    ahead of the one being consumed.
+
+    :arg progress_callback: if given, called with the number of processed
+        and the total number of participants (or sessions) after each one.
+    """
+    from collections import deque
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+    from course.page import PageContext
+    from course.page.base import AnswerFeedback
+    from course.utils import PageInstanceCache
+
+    page = PageInstanceCache(repo, course, flow_id).get_page(
+            group_id, page_id, commit_sha)
+
+    # For each file in the archive, the visits that may provide its
+    # contents, in order of preference. Later ones are only used if earlier
+    # ones have no answer.
+    key_to_visit_ids: dict[tuple[str, ...], list[int]] = {}
+    for visit_id, username, flow_session_id in visits.values_list(
+            "id", "flow_session__participation__user__username",
+            "flow_session_id"):
+        assert username is not None
+
+        key: tuple[str, ...]
+        if which_attempt in ["first", "last"]:
+            key = (username,)
+        elif which_attempt == "all":
+            key = (username, str(flow_session_id))
+        else:
+            raise NotImplementedError()
+
+        key_to_visit_ids.setdefault(key, []).append(visit_id)
+
+    if which_attempt != "first":
+        for visit_ids in key_to_visit_ids.values():
+            visit_ids.reverse()
+
+    def get_visits(visit_ids: list[int]) -> dict[int, FlowPageVisit]:
+        return (FlowPageVisit.objects
+                .select_related("flow_session")
+                .select_related("flow_session__participation__user")
+                .select_related("page_data")
+                .prefetch_related("grades")
+                .in_bulk(visit_ids))
+
+    def read_answer(visit: FlowPageVisit) -> tuple[str, bytes] | None:
+        return page.normalized_bytes_answer(
+                PageContext(
+                    course=course,
+                    repo=repo,
+                    commit_sha=commit_sha,
+                    flow_session=visit.flow_session),
+                visit.page_data.data,
+                visit.answer)
+
+    def get_feedback_text(visit: FlowPageVisit) -> str:
+        visit_grades = list(visit.grades.all())
+
+        feedback_lines: list[str] = []
+
+        feedback_lines.append(
+            "scores: {}".format(", ".join(
+                    str(g.correctness)
+                    for g in visit_grades)))
+
+        for i, grade in enumerate(visit_grades):
+            feedback_lines.extend(
+                        (75 * "-",
+                            "grade %i: score: %s"
+                                % (i + 1, grade.correctness)))
+            afb = AnswerFeedback.from_json(grade.feedback, None)
+            if afb is not None:
+                feedback_lines.append(afb.feedback)
+
+        return "\n".join(feedback_lines)
+
+    def iter_preferred_visits() -> Iterator[tuple[tuple[str, ...], FlowPageVisit]]:
+        keys = list(key_to_visit_ids)
+        chunk_size = 100
+        for chunk_start in range(0, len(keys), chunk_size):
+            chunk_keys = keys[chunk_start:chunk_start + chunk_size]
+            visits_by_id = get_visits(
+                    [key_to_visit_ids[key][0] for key in chunk_keys])
+            for key in chunk_keys:
+                yield key, visits_by_id[key_to_visit_ids[key][0]]
+
+    def finish_entry(
+                key: tuple[str, ...],
+                visit: FlowPageVisit,
+                bytes_answer_future: Future[tuple[str, bytes] | None],
+            ) -> Iterator[tuple[str, bytes]]:
+        bytes_answer = bytes_answer_future.result()
+
+        for fallback_visit_id in key_to_visit_ids[key][1:]:
+            if bytes_answer is not None:
+                break
+            visit = get_visits([fallback_visit_id])[fallback_visit_id]
+            bytes_answer = read_answer(visit)
+
+        if bytes_answer is None:
+            return
+
+        extension, answer_bytes = bytes_answer
+        basename = "-".join(key)
+        yield basename + extension, answer_bytes
+
+        if include_feedback:
+            yield (basename + "-feedback.txt",
+                    get_feedback_text(visit).encode("utf-8"))
+
+    def generate() -> Iterator[tuple[str, bytes]]:
+        pending: deque[tuple[
+            tuple[str, ...], FlowPageVisit,
+            Future[tuple[str, bytes] | None]]] = deque()
+
+        total = len(key_to_visit_ids)
+        done = 0
+
+        def finish_next() -> Iterator[tuple[str, bytes]]:
+            nonlocal done
+
+            yield from finish_entry(*pending.popleft())
+            done += 1
+            if progress_callback is not None:
+                progress_callback(done, total)
+
+        with ThreadPoolExecutor(max_workers=SUBMISSION_READ_AHEAD) as executor:
+            for key, visit in iter_preferred_visits():
+                pending.append((key, visit, executor.submit(read_answer, visit)))
+                if len(pending) >= SUBMISSION_READ_AHEAD:
+                    yield from finish_next()
+
+            while pending:
+                yield from finish_next()
+
+    return generate()
+
+
+# {{{ submission archives built in the background
+
+# Directory in RELATE_BULK_STORAGE
+SUBMISSION_ARCHIVE_DIR = "submission-archives"
+
+# Archives are stored as
+# SUBMISSION_ARCHIVE_DIR/<course>/<creation timestamp>-<random token>-<file name>
+SUBMISSION_ARCHIVE_NAME_RE = re.compile(
+        r"^(?P<timestamp>[0-9]+)-(?P<token>[0-9a-f]{32})-(?P<file_name>[-\w.]+)$")
+
+
+def get_submission_archive_lifetime() -> datetime.timedelta:
+    return datetime.timedelta(hours=getattr(
+            settings, "RELATE_SUBMISSION_ARCHIVE_EXPIRATION_HOURS", 24))
+
+
+def purge_expired_submission_archives(course: Course) -> None:
+    storage = settings.RELATE_BULK_STORAGE
+    course_dir = f"{SUBMISSION_ARCHIVE_DIR}/{course.identifier}"
+
+    try:
+        _dirs, file_names = storage.listdir(course_dir)
+    except FileNotFoundError:
+        return
+
+    min_timestamp = (now() - get_submission_archive_lifetime()).timestamp()
+    for file_name in file_names:
+        match = SUBMISSION_ARCHIVE_NAME_RE.match(file_name)
+        if match is not None and int(match.group("timestamp")) < min_timestamp:
+            storage.delete(f"{course_dir}/{file_name}")
+
+
+def save_submission_archive(
+        course: Course, file_name: str, content: IO[bytes]) -> str:
+    """Store *content* in :data:`RELATE_BULK_STORAGE` and remove expired
+    archives of *course*.
+
+    :returns: the name under which the archive may be downloaded
+        using :func:`download_submission_archive`.
+    """
+    from secrets import token_hex
+
+    from django.core.files import File
+
+    purge_expired_submission_archives(course)
+
+    archive_name = f"{int(now().timestamp())}-{token_hex(16)}-{file_name}"
+    assert SUBMISSION_ARCHIVE_NAME_RE.match(archive_name)
+
+    settings.RELATE_BULK_STORAGE.save(
+            f"{SUBMISSION_ARCHIVE_DIR}/{course.identifier}/{archive_name}",
+            File(content))
+
+    return archive_name
+
+
+@course_view
+def download_submission_archive(
+        pctx: CoursePageContext, archive_name: str) -> http.HttpResponse:
+    if not pctx.has_permission(PPerm.batch_download_submission):
+        raise PermissionDenied(_("may not batch-download submissions"))
+
+    match = SUBMISSION_ARCHIVE_NAME_RE.match(archive_name)
+    if match is None:
+        raise http.Http404()
+
+    if (int(match.group("timestamp"))
+            < (now() - get_submission_archive_lifetime()).timestamp()):
+        raise http.Http404()
+
+    storage = settings.RELATE_BULK_STORAGE
+    storage_name = f"{SUBMISSION_ARCHIVE_DIR}/{pctx.course.identifier}/{archive_name}"
+    if not storage.exists(storage_name):
+        raise http.Http404()
+
+    return http.FileResponse(
+            storage.open(storage_name, "rb"),
+            as_attachment=True,
+            filename=match.group("file_name"),
+            content_type="application/zip")
+
+# }}}
+
+
 class DownloadAllSubmissionsForm(StyledForm):
     def __init__(self, page_ids, session_tag_choices, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1496,6 +1804,13 @@ class DownloadAllSubmissionsForm(StyledForm):
                     "detection, then this may be used to include the reference "
                     "solution."),
                 required=False)
+        self.fields["in_background"] = forms.BooleanField(
+                required=False,
+                initial=False,
+                help_text=_("Build the archive in the background and show a "
+                    "download link once it is ready. Recommended for large "
+                    "courses."),
+                label=_("Build in background"))
 
         self.helper.add_input(
                 Submit("download", _("Download")))
@@ -1527,8 +1842,6 @@ def download_all_submissions(pctx: CoursePageContext, flow_id: str):
             for group_desc in flow_desc.groups
             for page_desc in group_desc.pages]
 
-    from course.page.base import AnswerFeedback
-
     request = pctx.request
     if request.method == "POST":
         form = DownloadAllSubmissionsForm(page_ids, session_tag_choices,
@@ -1541,116 +1854,61 @@ def download_all_submissions(pctx: CoursePageContext, flow_id: str):
             group_id = form.cleaned_data["page_id"][:slash_index]
             page_id = form.cleaned_data["page_id"][slash_index+1:]
 
-            from course.utils import PageInstanceCache
-            page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
-
-            visits = (FlowPageVisit.objects
-                    .filter(
-                        flow_session__course=pctx.course,
-                        flow_session__flow_id=flow_id,
-                        page_data__group_id=group_id,
-                        page_data__page_id=page_id,
-                        is_submitted_answer=True,
-                        )
-                    .select_related("flow_session")
-                    .select_related("flow_session__participation__user")
-                    .select_related("page_data")
-
-                    # We overwrite earlier submissions with later ones
-                    # in a dictionary below.
-                    .order_by("visit_time"))
-
-            if form.cleaned_data["non_in_progress_only"]:
-                visits = visits.filter(flow_session__in_progress=False)
-
-            if form.cleaned_data["restrict_to_rules_tag"] != ALL_SESSION_TAG:
-                visits = (visits
-                        .filter(
-                            flow_session__access_rules_tag=(
-                                form.cleaned_data["restrict_to_rules_tag"])))
-
-            submissions: dict[
-                    tuple[str, ...],
-                    tuple[tuple[str, bytes], list[FlowPageVisitGrade]]] = {}
-
-            for visit in visits:
-                page = page_cache.get_page(group_id, page_id,
-                        pctx.course_commit_sha)
-
-                from course.page import PageContext
-                grading_page_context = PageContext(
-                        course=pctx.course,
-                        repo=pctx.repo,
-                        commit_sha=pctx.course_commit_sha,
-                        flow_session=visit.flow_session)
-
-                bytes_answer = page.normalized_bytes_answer(
-                        grading_page_context, visit.page_data.data,
-                        visit.answer)
-
-                assert visit.flow_session.participation is not None
-
-                key: tuple[str, ...]
-                if which_attempt in ["first", "last"]:
-                    key = (visit.flow_session.participation.user.username,)
-                elif which_attempt == "all":
-                    key = (visit.flow_session.participation.user.username,
-                            str(visit.flow_session.id))
-                else:
-                    raise NotImplementedError()
-
-                if bytes_answer is not None:
-                    if (which_attempt == "first"
-                            and key in submissions):
-                        # Already there, disregard further ones
-                        continue
-
-                    submissions[key] = (
-                            bytes_answer, list(visit.grades.all()))
-
-            from io import BytesIO
-            from zipfile import ZipFile
-            bio = BytesIO()
-            with ZipFile(bio, "w") as subm_zip:
-                for zip_key, ((extension, answer_bytes), visit_grades) in \
-                        submissions.items():
-                    basename = "-".join(zip_key)
-                    subm_zip.writestr(
-                            basename + extension,
-                            answer_bytes)
-
-                    if form.cleaned_data["include_feedback"]:
-                        feedback_lines: list[str] = []
-
-                        feedback_lines.append(
-                            "scores: {}".format(", ".join(
-                                    str(g.correctness)
-                                    for g in visit_grades)))
-
-                        for i, grade in enumerate(visit_grades):
-                            feedback_lines.extend(
-                                        (75 * "-",
-                                            "grade %i: score: %s"
-                                                % (i + 1, grade.correctness)))
-                            afb = AnswerFeedback.from_json(grade.feedback, None)
-                            if afb is not None:
-                                feedback_lines.append(afb.feedback)
-
-                        subm_zip.writestr(
-                                basename + "-feedback.txt",
-                                "\n".join(feedback_lines))
-
-                extra_file = request.FILES.get("extra_file")
-                if extra_file is not None and extra_file.name is not None:
-                    subm_zip.writestr(extra_file.name, extra_file.read())
+            restrict_to_rules_tag = form.cleaned_data["restrict_to_rules_tag"]
+            if restrict_to_rules_tag == ALL_SESSION_TAG:
+                restrict_to_rules_tag = None
 
-            response = http.HttpResponse(
-                    bio.getvalue(),
+            extra_file = request.FILES.get("extra_file")
+
+            if form.cleaned_data["in_background"]:
+                extra_file_storage_name = None
+                if extra_file is not None and extra_file.name is not None:
+                    extra_file_storage_name = settings.RELATE_BULK_STORAGE.save(
+                            f"{SUBMISSION_ARCHIVE_DIR}/uploads/"
+                            f"{pctx.course.identifier}/{extra_file.name}",
+                            extra_file)
+
+                from course.repo import serialize_revision
+                from course.tasks import build_submission_archive
+                async_res = build_submission_archive.delay(
+                        pctx.course.id,
+                        serialize_revision(pctx.course_commit_sha),
+                        flow_id, group_id, page_id,
+                        which_attempt=which_attempt,
+                        non_in_progress_only=(
+                            form.cleaned_data["non_in_progress_only"]),
+                        restrict_to_rules_tag=restrict_to_rules_tag,
+                        include_feedback=form.cleaned_data["include_feedback"],
+                        extra_file_name=(
+                            extra_file.name if extra_file is not None else None),
+                        extra_file_storage_name=extra_file_storage_name)
+
+                return redirect("relate-monitor_task", async_res.id)
+
+            zip_entries = iter_submission_files(
+                    pctx.course, pctx.repo, pctx.course_commit_sha,
+                    flow_id, group_id, page_id,
+                    get_submission_visits(
+                        pctx.course, flow_id, group_id, page_id,
+                        non_in_progress_only=(
+                            form.cleaned_data["non_in_progress_only"]),
+                        restrict_to_rules_tag=restrict_to_rules_tag),
+                    which_attempt=which_attempt,
+                    include_feedback=form.cleaned_data["include_feedback"])
+
+            if extra_file is not None and extra_file.name is not None:
+                # Read now: uploaded files are closed once the request
+                # is finished, which may happen before the archive is.
+                zip_entries = chain(
+                        zip_entries, [(extra_file.name, extra_file.read())])
+
+            file_name = get_submission_archive_file_name(
+                    pctx.course, flow_id, group_id, page_id)
+            response = http.StreamingHttpResponse(
+                    stream_zip(zip_entries),
                     content_type="application/zip")
             response["Content-Disposition"] = (
-                    f'attachment; filename="submissions_{pctx.course.identifier}_'
-                    f'{flow_id}_{group_id}_{page_id}_'
-                    f'{now().date().strftime("%Y-%m-%d")}.zip"')
+                    f'attachment; filename="{file_name}"')
             return response
 
     else:
@@ -26,7 +26,8 @@ THE SOFTWARE.
 
 from typing import TYPE_CHECKING, Any, cast
 
-from django import http
+from crispy_forms.layout import Submit
+from django import forms, http
 from django.contrib import messages
 from django.core.exceptions import (
     ObjectDoesNotExist,
@@ -52,6 +53,7 @@ from course.models import (
 from course.page import InvalidPageData
 from course.repo import serialize_revision
 from course.utils import (
+    EchoBuffer,
     FlowPageContext,
     course_view,
     get_session_grading_mode,
@@ -59,6 +61,8 @@ from course.utils import (
 )
 from course.views import get_now_or_fake_time
 from relate.utils import (
+    HTML5DateTimeInput,
+    StyledForm,
     StyledFormBase,
     retry_transaction_decorator,
 )
@@ -68,10 +72,11 @@ from relate.utils import (
 
 if TYPE_CHECKING:
     import datetime
+    from collections.abc import Iterator
 
     from django.db.models import query
 
-    from course.models import GradingOpportunity
+    from course.models import Course, GradingOpportunity
     from course.page.base import AnswerData, GradeData
     from course.utils import CoursePageContext
 
@@ -437,27 +442,125 @@ def _save_grade(
 
 # {{{ grader statistics
 
-@course_view
-def show_grader_statistics(pctx, flow_id):
-    if not pctx.has_permission(PPerm.view_grader_stats):
-        raise PermissionDenied(_("may not view grader stats"))
+class GraderStatisticsFilterForm(StyledForm):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.helper.form_method = "GET"
+
+        self.fields["start_time"] = forms.DateTimeField(
+                label=_("Graded after"),
+                widget=HTML5DateTimeInput(),
+                required=False)
+        self.fields["end_time"] = forms.DateTimeField(
+                label=_("Graded before"),
+                widget=HTML5DateTimeInput(),
+                required=False)
+
+        self.helper.add_input(Submit("filter", _("Filter")))
+        self.helper.add_input(
+                Submit("export_csv", _("Export CSV"),
+                    css_class="btn-secondary"))
+
+
+def get_grader_statistics(
+        course: Course,
+        flow_id: str,
+        start_time: datetime.datetime | None = None,
+        end_time: datetime.datetime | None = None,
+        ) -> query.QuerySet[Any]:
+    """Return a query set of tuples ``(page_ordinal, group_id, page_id,
+    grader_id, count)``, counting for each page and grader the visits whose
+    most recent human grade was given by that grader. Only visits whose
+    most recent human grade falls within *start_time* (inclusive) and
+    *end_time* (exclusive) are counted.
+    """
+    from django.db.models import Count, F, Window
+    from django.db.models.functions import RowNumber
 
-    grades = (FlowPageVisitGrade.objects
+    latest_grades = (FlowPageVisitGrade.objects
             .filter(
-                visit__flow_session__course=pctx.course,
+                visit__flow_session__course=course,
                 visit__flow_session__flow_id=flow_id,
 
                 # There are just way too many autograder grades, which makes this
                 # report super slow.
                 grader__isnull=False)
+            .annotate(grade_rank=Window(
+                RowNumber(),
+                partition_by=F("visit_id"),
+                order_by=[F("grade_time").desc(), F("id").desc()]))
+            .filter(grade_rank=1))
+
+    grades = FlowPageVisitGrade.objects.filter(id__in=latest_grades.values("id"))
+    if start_time is not None:
+        grades = grades.filter(grade_time__gte=start_time)
+    if end_time is not None:
+        grades = grades.filter(grade_time__lt=end_time)
+
+    return (grades
+            .values_list(
+                "visit__page_data__page_ordinal",
+                "visit__page_data__group_id",
+                "visit__page_data__page_id",
+                "grader_id")
+            .annotate(count=Count("id"))
             .order_by(
-                "visit__id",
-                "grade_time")
-            .select_related("visit")
-            .select_related("grader")
-            .select_related("visit__page_data"))
+                "visit__page_data__page_ordinal",
+                "visit__page_data__group_id",
+                "visit__page_data__page_id",
+                "grader_id"))
+
+
+def _export_grader_statistics_csv(
+        pctx: CoursePageContext, flow_id: str,
+        stats: query.QuerySet[Any]) -> http.StreamingHttpResponse:
+    import csv
 
-    graders = set()
+    from django.contrib.auth import get_user_model
+    writer = csv.writer(EchoBuffer())
+
+    def generate_rows() -> Iterator[str]:
+        yield writer.writerow([
+            "page_ordinal", "group_id", "page_id",
+            "grader_username", "grader_full_name", "count"])
+
+        graders: dict[int, Any] = {}
+        for page_ordinal, group_id, page_id, grader_id, count in stats.iterator():
+            if grader_id not in graders:
+                graders[grader_id] = get_user_model().objects.get(id=grader_id)
+            grader = graders[grader_id]
+
+            yield writer.writerow([
+                page_ordinal, group_id, page_id,
+                grader.username, grader.get_full_name(), count])
+
+    response = http.StreamingHttpResponse(
+            generate_rows(),
+            content_type="text/plain; charset=utf-8")
+    response["Content-Disposition"] = (
+            "attachment; "
+            f'filename="grader-statistics-{pctx.course.identifier}-{flow_id}.csv"')
+    return response
+
+
+@course_view
+def show_grader_statistics(pctx, flow_id):
+    if not pctx.has_permission(PPerm.view_grader_stats):
+        raise PermissionDenied(_("may not view grader stats"))
+
+    request = pctx.request
+
+    start_time = end_time = None
+    form = GraderStatisticsFilterForm(request.GET or None)
+    if form.is_valid():
+        start_time = form.cleaned_data["start_time"]
+        end_time = form.cleaned_data["end_time"]
+
+    stats = get_grader_statistics(pctx.course, flow_id, start_time, end_time)
+
+    if "export_csv" in request.GET and form.is_valid():
+        return _export_grader_statistics_csv(pctx, flow_id, stats)
 
     # tuples: (page_ordinal, id)
     pages = set()
@@ -466,38 +569,25 @@ def show_grader_statistics(pctx, flow_id):
     grader_counts = {}
     page_counts = {}
 
-    def commit_grade_info(grade):
-        grader = grade.grader
-        page = (grade.visit.page_data.page_ordinal,
-                grade.visit.page_data.group_id + "/" + grade.visit.page_data.page_id)
-
-        graders.add(grader)
+    for page_ordinal, group_id, page_id, grader_id, count in stats:
+        page = (page_ordinal, group_id + "/" + page_id)
         pages.add(page)
 
-        key = (page, grade.grader)
-        counts[key] = counts.get(key, 0) + 1
-
-        grader_counts[grader] = grader_counts.get(grader, 0) + 1
-        page_counts[page] = page_counts.get(page, 0) + 1
-
-    last_grade = None
-
-    for grade in grades.iterator():
-        if last_grade is not None and last_grade.visit != grade.visit:
-            commit_grade_info(last_grade)
-
-        last_grade = grade
+        key = (page, grader_id)
+        counts[key] = counts.get(key, 0) + count
 
-    if last_grade is not None:
-        commit_grade_info(last_grade)
+        grader_counts[grader_id] = grader_counts.get(grader_id, 0) + count
+        page_counts[page] = page_counts.get(page, 0) + count
 
-    graders = sorted(graders,
-            key=lambda grader: grader.last_name if grader is not None else None)
+    from django.contrib.auth import get_user_model
+    graders = sorted(
+            get_user_model().objects.filter(id__in=grader_counts),
+            key=lambda grader: grader.last_name)
     pages = sorted(pages)
 
     stats_table = [
             [
-                counts.get((page, grader), 0)
+                counts.get((page, grader.id), 0)
                 for grader in graders
                 ]
             for page in pages
@@ -507,7 +597,7 @@ def show_grader_statistics(pctx, flow_id):
             for page in pages
             ]
     grader_counts = [
-            grader_counts.get(grader, 0)
+            grader_counts.get(grader.id, 0)
             for grader in graders
             ]
 
@@ -516,6 +606,7 @@ def show_grader_statistics(pctx, flow_id):
             "course/grading-statistics.html",
             {
                 "flow_id": flow_id,
+                "form": form if form.is_bound else GraderStatisticsFilterForm(),
                 "pages": pages,
                 "graders": graders,
                 "pages_stats_counts":
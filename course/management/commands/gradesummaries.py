@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from course.models import (
+    Course,
+    find_grade_summary_inconsistencies,
+    rebuild_grade_summaries,
+)
+
+
+class Command(BaseCommand):
+    help = (
+            "Checks or rebuilds the grade summaries from which the grade book "
+            "is rendered by replaying the full grade history.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["check", "rebuild"])
+        parser.add_argument("course_identifiers", nargs="*",
+                metavar="COURSE_IDENTIFIER",
+                help="Courses to process. Default: all courses.")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by("identifier")
+        if options["course_identifiers"]:
+            courses = courses.filter(identifier__in=options["course_identifiers"])
+
+        total_problems = 0
+        for course in courses:
+            if options["action"] == "rebuild":
+                count = rebuild_grade_summaries(course)
+                self.stdout.write(
+                        f"{course.identifier}: {count} grade summaries written")
+            else:
+                problems = find_grade_summary_inconsistencies(course)
+                for problem in problems:
+                    self.stdout.write(f"{course.identifier}: {problem}")
+                self.stdout.write(
+                        f"{course.identifier}: {len(problems)} inconsistencies")
+                total_problems += len(problems)
+
+        if total_problems:
+            raise CommandError(
+                    f"{total_problems} inconsistencies found, "
+                    "run 'gradesummaries rebuild' to fix")
+
+# vim: foldmethod=marker
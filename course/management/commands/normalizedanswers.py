@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from course.analytics import cache_normalized_answers
+from course.content import get_course_repo
+from course.models import Course, FlowPageVisit
+from course.repo import deserialize_revision
+
+
+class Command(BaseCommand):
+    help = (
+            "Fills the cache of normalized answers used by page analytics "
+            "for submitted answers that have no cached normalized answer at "
+            "the course's active revision.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_identifiers", nargs="*",
+                metavar="COURSE_IDENTIFIER",
+                help="Courses to process. Default: all courses.")
+        parser.add_argument("--flow-id", metavar="FLOW_ID",
+                help="Only process answers to this flow.")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by("identifier")
+        if options["course_identifiers"]:
+            courses = courses.filter(identifier__in=options["course_identifiers"])
+
+        for course in courses:
+            visits = FlowPageVisit.objects.filter(
+                    flow_session__course=course,
+                    is_submitted_answer=True)
+            if options["flow_id"]:
+                visits = visits.filter(flow_session__flow_id=options["flow_id"])
+
+            with get_course_repo(course) as repo:
+                stored_count, skipped_count = cache_normalized_answers(
+                        course, repo,
+                        deserialize_revision(course.active_git_commit_sha),
+                        visits)
+
+            self.stdout.write(
+                    f"{course.identifier}: {stored_count} normalized answers "
+                    f"written, {skipped_count} skipped (page not found)")
+
+# vim: foldmethod=marker
@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-19 09:02
+
+import django.db.models.deletion
+import django.utils.timezone
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0123_delete_flowaccessexception'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeRunRecord',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Time')),
+                ('flow_id', models.CharField(blank=True, help_text='Blank for runs from the page sandbox', max_length=200, null=True, verbose_name='Flow ID')),
+                ('page_id', models.CharField(max_length=200, verbose_name='Page ID')),
+                ('backend', models.CharField(max_length=200, verbose_name='Backend')),
+                ('image', models.CharField(blank=True, max_length=200, null=True, verbose_name='Image')),
+                ('exec_host', models.CharField(blank=True, max_length=200, null=True, verbose_name='Execution host')),
+                ('result', models.CharField(max_length=50, verbose_name='Result')),
+                ('retry_count', models.PositiveIntegerField(default=0, verbose_name='Retry count')),
+                ('total_time', models.FloatField(help_text='In seconds', verbose_name='Total time')),
+                ('phase_timings', jsonfield.fields.JSONField(blank=True, default=dict, help_text='A mapping from phase names to seconds', verbose_name='Phase timings')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.course', verbose_name='Course')),
+            ],
+            options={
+                'verbose_name': 'Code run record',
+                'verbose_name_plural': 'Code run records',
+                'ordering': ('course', '-time'),
+                'indexes': [models.Index(fields=['course', 'flow_id', 'time'], name='course_code_course__88b84b_idx')],
+            },
+        ),
+    ]
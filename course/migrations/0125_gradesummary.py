@@ -0,0 +1,41 @@
+# Generated by Django 6.1.2 on 2026-10-19 09:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+import course.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0124_coderunrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeSummary',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('state', models.CharField(blank=True, choices=[('grading_started', 'Grading started'), ('graded', 'Graded'), ('retrieved', 'Retrieved'), ('unavailable', 'Unavailable'), ('extension', 'Extension'), ('report_sent', 'Report sent'), ('do_over', 'Do-over'), ('exempt', 'Exempt')], max_length=50, null=True, verbose_name='State')),
+                ('aggregate_percentage', models.DecimalField(blank=True, decimal_places=10, max_digits=24, null=True, verbose_name='Aggregate percentage')),
+                ('valid_grade_count', models.PositiveIntegerField(default=0, verbose_name='Number of valid grades')),
+                ('due_time', models.DateTimeField(blank=True, null=True, verbose_name='Due time')),
+                ('last_graded_time', models.DateTimeField(blank=True, null=True, verbose_name='Last graded time')),
+                ('last_report_time', models.DateTimeField(blank=True, null=True, verbose_name='Last report time')),
+                ('grade_change_count', models.PositiveIntegerField(default=0, verbose_name='Number of grade changes')),
+                ('error', models.TextField(blank=True, help_text='Set if the grade history could not be processed', null=True, verbose_name='Error')),
+                ('update_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Update time')),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.gradingopportunity', verbose_name='Grading opportunity')),
+                ('participation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.participation', verbose_name='Participation')),
+            ],
+            options={
+                'verbose_name': 'Grade summary',
+                'verbose_name_plural': 'Grade summaries',
+                'ordering': ('opportunity', 'participation'),
+                'unique_together': {('opportunity', 'participation')},
+            },
+            bases=(course.models.GradeStateDescriptionMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-19 09:45
+
+import django.db.models.deletion
+import django.utils.timezone
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0125_gradesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowAnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flow_id', models.CharField(max_length=200, verbose_name='Flow ID')),
+                ('restrict_to_first_attempt', models.BooleanField(default=False, verbose_name='Restrict to first attempt')),
+                ('commit_sha', models.CharField(help_text='The course content revision used to describe pages', max_length=200, verbose_name='Commit SHA')),
+                ('visit_watermark', models.BigIntegerField(default=0, help_text='Largest flow page visit ID included', verbose_name='Visit watermark')),
+                ('grade_watermark', models.BigIntegerField(default=0, help_text='Largest flow page visit grade ID included', verbose_name='Grade watermark')),
+                ('quartile_digest', models.CharField(blank=True, max_length=64, verbose_name='Quartile digest')),
+                ('creation_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Creation time')),
+                ('refresh_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Refresh time')),
+                ('data', jsonfield.fields.JSONField(blank=True, default=dict, verbose_name='Data')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.course', verbose_name='Course')),
+            ],
+            options={
+                'verbose_name': 'Flow analytics snapshot',
+                'verbose_name_plural': 'Flow analytics snapshots',
+                'unique_together': {('course', 'flow_id', 'restrict_to_first_attempt')},
+            },
+        ),
+    ]
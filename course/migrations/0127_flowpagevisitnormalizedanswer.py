@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-19 09:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0126_flowanalyticssnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowPageVisitNormalizedAnswer',
+            fields=[
+                ('visit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='normalized_answer_cache', serialize=False, to='course.flowpagevisit', verbose_name='Visit')),
+                ('commit_sha', models.CharField(help_text='The course content revision used to normalize the answer', max_length=200, verbose_name='Commit SHA')),
+                ('normalized_answer', models.TextField(blank=True, help_text='HTML. Empty if the page did not provide a normalized answer.', null=True, verbose_name='Normalized answer')),
+            ],
+            options={
+                'verbose_name': 'Flow page visit normalized answer',
+                'verbose_name_plural': 'Flow page visit normalized answers',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-19 10:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0127_flowpagevisitnormalizedanswer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flowsession',
+            index=models.Index(fields=['participation', 'flow_id', 'in_progress'], name='course_flow_partici_ff4d6d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participation',
+            index=models.Index(fields=['course', 'status'], name='course_part_course__b02a45_idx'),
+        ),
+    ]
@@ -27,13 +27,17 @@ THE SOFTWARE.
 from typing import (
     TYPE_CHECKING,
     Any,
+    ClassVar,
+    Protocol,
+    TypeVar,
+    cast,
 )
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.timezone import now
@@ -64,14 +68,18 @@ from course.content import (
     grading_rule_ta,
     start_rule_ta,
 )
-from relate.utils import string_concat
+from relate.utils import (
+    bump_cache_version_on_commit,
+    get_cache_version,
+    string_concat,
+)
 
 
 # {{{ mypy
 
 if TYPE_CHECKING:
     import datetime
-    from collections.abc import Iterable
+    from collections.abc import Callable, Iterable, Iterator
     from decimal import Decimal
 
     from course.content import FlowDesc
@@ -581,6 +589,9 @@ class Participation(models.Model):
         verbose_name_plural = _("Participations")
         unique_together = (("user", "course"),)
         ordering = ("course", "user")
+        indexes = [
+                models.Index(fields=["course", "status"]),
+                ]
 
     def get_role_desc(self):
         return ", ".join(role.name for role in self.roles.all())
@@ -589,11 +600,7 @@ class Participation(models.Model):
 
     _permissions_cache: frozenset[tuple[str, str | None]] | None = None
 
-    def permissions(self) -> frozenset[tuple[str, str | None]]:
-
-        if self._permissions_cache is not None:
-            return self._permissions_cache
-
+    def _get_permissions_uncached(self) -> frozenset[tuple[str, str | None]]:
         perm = (
                 list(
                     ParticipationRolePermission.objects.filter(
@@ -605,10 +612,23 @@ class Participation(models.Model):
                         participation=self)
                     .values_list("permission", "argument")))
 
-        fset_perm = frozenset(
+        return frozenset(
                 (permission, argument) if argument else (permission, None)
                 for permission, argument in perm)
 
+    def permissions(self) -> frozenset[tuple[str, str | None]]:
+
+        if self._permissions_cache is not None:
+            return self._permissions_cache
+
+        if self.pk is None:
+            fset_perm = self._get_permissions_uncached()
+        else:
+            fset_perm = get_cached_permission_data(
+                    self.course_id,  # pyright: ignore[reportAttributeAccessIssue]
+                    f"participation-permissions:{self.pk}",
+                    self._get_permissions_uncached)
+
         self._permissions_cache = fset_perm
         return fset_perm
 
@@ -631,6 +651,95 @@ class ParticipationPermission(ParticipationPermissionBase):
         unique_together = (("participation", "permission", "argument"),)
 
 
+# {{{ permission cache
+
+# Role identifiers and permissions are cached per course across requests and
+# processes, under a per-course version that is bumped whenever a
+# participation, role or permission of the course changes.
+#
+# Cached values also expire after this many seconds, which bounds how long
+# other processes may see outdated permissions if the default cache is not
+# shared between processes (e.g. the local-memory cache).
+PERMISSION_CACHE_MAX_AGE = 60
+
+T = TypeVar("T")
+
+
+def _get_permission_cache_version_key(course_id: int) -> str:
+    return f"relate-permissions-version:{course_id}"
+
+
+def get_cached_permission_data(
+        course_id: int, name: str, compute: Callable[[], T]) -> T:
+    """Return the value cached under *name* for the course with *course_id*
+    at its current permission cache version, computing and storing it with
+    *compute* if needed.
+    """
+    version = get_cache_version(_get_permission_cache_version_key(course_id))
+    if version is None:
+        return compute()
+
+    from django.core.cache import caches
+    def_cache = caches["default"]
+
+    key = f"relate-permissions:{course_id}:{version}:{name}"
+    result = def_cache.get(key)
+    if result is None:
+        result = compute()
+        def_cache.set(key, result, PERMISSION_CACHE_MAX_AGE)
+
+    return result
+
+
+def invalidate_permission_cache(course_id: int) -> None:
+    """Discard cached permission data of the course with *course_id*. This
+    happens automatically when participations, roles or permissions are
+    saved or deleted, but not for bulk updates.
+    """
+    bump_cache_version_on_commit(_get_permission_cache_version_key(course_id))
+
+
+@receiver(post_save, sender=Participation,
+        dispatch_uid="invalidate_permissions_participation_saved")
+@receiver(post_delete, sender=Participation,
+        dispatch_uid="invalidate_permissions_participation_deleted")
+@receiver(post_save, sender=ParticipationRole,
+        dispatch_uid="invalidate_permissions_role_saved")
+@receiver(post_delete, sender=ParticipationRole,
+        dispatch_uid="invalidate_permissions_role_deleted")
+def _invalidate_permissions_for_course_object(sender, instance, **kwargs):
+    invalidate_permission_cache(instance.course_id)
+
+
+@receiver(post_save, sender=ParticipationRolePermission,
+        dispatch_uid="invalidate_permissions_role_permission_saved")
+@receiver(post_delete, sender=ParticipationRolePermission,
+        dispatch_uid="invalidate_permissions_role_permission_deleted")
+def _invalidate_permissions_for_role_permission(sender, instance, **kwargs):
+    invalidate_permission_cache(instance.role.course_id)
+
+
+@receiver(post_save, sender=ParticipationPermission,
+        dispatch_uid="invalidate_permissions_participation_permission_saved")
+@receiver(post_delete, sender=ParticipationPermission,
+        dispatch_uid="invalidate_permissions_participation_permission_deleted")
+def _invalidate_permissions_for_participation_permission(
+        sender, instance, **kwargs):
+    invalidate_permission_cache(instance.participation.course_id)
+
+
+@receiver(m2m_changed, sender=Participation.roles.through,
+        dispatch_uid="invalidate_permissions_participation_roles_changed")
+def _invalidate_permissions_for_participation_roles(
+        sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        # instance is a Participation or a ParticipationRole, depending on
+        # the side from which the relation was changed.
+        invalidate_permission_cache(instance.course_id)
+
+# }}}
+
+
 class ParticipationPreapproval(models.Model):
     id = models.BigAutoField(primary_key=True)
 
@@ -849,6 +958,25 @@ class AuthenticationToken(models.Model):
         verbose_name_plural = _("Authentication tokens")
         ordering = ("participation", "creation_time")
 
+
+@receiver(post_save, sender=AuthenticationToken,
+        dispatch_uid="forget_verified_token_on_save")
+def _forget_verified_token_on_save(sender, instance, created, raw, using,
+        update_fields, **kwargs):
+    # Recording a use of the token does not affect its validity.
+    if update_fields is not None and set(update_fields) <= {"last_use_time"}:
+        return
+
+    from course.auth import forget_verified_token
+    forget_verified_token(instance.id)
+
+
+@receiver(post_delete, sender=AuthenticationToken,
+        dispatch_uid="forget_verified_token_on_delete")
+def _forget_verified_token_on_delete(sender, instance, using, **kwargs):
+    from course.auth import forget_verified_token
+    forget_verified_token(instance.id)
+
 # }}}
 
 
@@ -953,6 +1081,10 @@ class FlowSession(models.Model):
         verbose_name = _("Flow session")
         verbose_name_plural = _("Flow sessions")
         ordering = ("course", "-start_time")
+        indexes = [
+                # for the EXISTS subqueries of participation queries
+                models.Index(fields=["participation", "flow_id", "in_progress"]),
+                ]
 
     @override
     def __str__(self) -> str:
@@ -1246,6 +1378,32 @@ class FlowPageVisitGrade(models.Model):
         return _("grade of %(visit)s: %(percentage)s") % {
                 "visit": self.visit, "percentage": self.percentage()}
 
+
+class FlowPageVisitNormalizedAnswer(models.Model):
+    """The :meth:`course.page.base.PageBase.normalized_answer` of a visit,
+    cached for analytics.
+    """
+
+    visit = models.OneToOneField(FlowPageVisit, primary_key=True,
+            related_name="normalized_answer_cache",
+            verbose_name=_("Visit"), on_delete=models.CASCADE)
+    commit_sha = models.CharField(max_length=200,
+            verbose_name=_("Commit SHA"),
+            help_text=_("The course content revision used to normalize "
+                "the answer"))
+    normalized_answer = models.TextField(null=True, blank=True,
+            verbose_name=_("Normalized answer"),
+            help_text=_("HTML. Empty if the page did not provide a "
+                "normalized answer."))
+
+    class Meta:
+        verbose_name = _("Flow page visit normalized answer")
+        verbose_name_plural = _("Flow page visit normalized answers")
+
+    @override
+    def __str__(self) -> str:
+        return _("normalized answer of %(visit)s") % {"visit": self.visit}
+
 # }}}
 
 
@@ -1639,9 +1797,74 @@ class GradeChange(models.Model):
 
 # {{{ grade state machine
 
-class GradeStateMachine:
+class GradeStateDescription(Protocol):
+    """What :class:`GradeStateDescriptionMixin` needs from the classes
+    it is mixed into.
+    """
+
+    state: str | None
+    # describes why the grade history could not be processed, if it could not
+    error: str | None
+
+    def percentage(self) -> float | Decimal | None: ...
+
+    def valid_percentage_count(self) -> int: ...
+
+
+class GradeStateDescriptionMixin:
+    """Textual descriptions of an aggregated grade, shared by
+    :class:`GradeStateMachine` and :class:`GradeSummary`, both of which
+    implement :class:`GradeStateDescription`.
+    """
+
+    def stringify_state(self: GradeStateDescription):
+        if self.error:
+            return _("(error)")
+        elif self.state is None:
+            return "- ∅ -"
+        elif self.state == GradeStateChangeType.exempt:
+            return _("(exempt)")
+        elif self.state == GradeStateChangeType.graded:
+            if self.valid_percentage_count():
+                result = f"{self.percentage():.1f}%"
+                if self.valid_percentage_count() > 1:
+                    result += " (/%d)" % self.valid_percentage_count()
+                return result
+            else:
+                return "- ∅ -"
+        else:
+            return _("(other state)")
+
+    def stringify_machine_readable_state(self: GradeStateDescription):
+        if self.error:
+            return "ERROR"
+        elif self.state is None:
+            return "NONE"
+        elif self.state == GradeStateChangeType.exempt:
+            return "EXEMPT"
+        elif self.state == GradeStateChangeType.graded:
+            if self.valid_percentage_count():
+                return f"{self.percentage():.3f}"
+            else:
+                return "NONE"
+        else:
+            return "OTHER_STATE"
+
+    def stringify_percentage(self: GradeStateDescription):
+        if self.state == GradeStateChangeType.graded:
+            if self.valid_percentage_count():
+                return f"{self.percentage():.1f}"
+            else:
+                return ""
+        else:
+            return ""
+
+
+class GradeStateMachine(GradeStateDescriptionMixin):
     opportunity: GradingOpportunity | None
     state: str | None
+    # inconsistent grade histories raise instead
+    error: str | None = None
     due_time: datetime.datetime | None
     last_graded_time: datetime.datetime | None
     last_report_time: datetime.datetime | None
@@ -1758,6 +1981,9 @@ class GradeStateMachine:
 
         return self
 
+    def valid_percentage_count(self) -> int:
+        return len(self.valid_percentages)
+
     def percentage(self) -> float | Decimal | None:
         """
         :return: a percentage of achieved points, or *None*
@@ -1781,43 +2007,304 @@ class GradeStateMachine:
             raise ValueError(
                     _("invalid grade aggregation strategy '%s'") % strategy)
 
-    def stringify_state(self):
-        if self.state is None:
-            return "- ∅ -"
-        elif self.state == GradeStateChangeType.exempt:
-            return _("(exempt)")
-        elif self.state == GradeStateChangeType.graded:
-            if self.valid_percentages:
-                result = f"{self.percentage():.1f}%"
-                if len(self.valid_percentages) > 1:
-                    result += " (/%d)" % len(self.valid_percentages)
-                return result
-            else:
-                return "- ∅ -"
-        else:
-            return _("(other state)")
+# }}}
 
-    def stringify_machine_readable_state(self):
-        if self.state is None:
-            return "NONE"
-        elif self.state == GradeStateChangeType.exempt:
-            return "EXEMPT"
-        elif self.state == GradeStateChangeType.graded:
-            if self.valid_percentages:
-                return f"{self.percentage():.3f}"
-            else:
-                return "NONE"
-        else:
-            return "OTHER_STATE"
 
-    def stringify_percentage(self):
-        if self.state == GradeStateChangeType.graded:
-            if self.valid_percentages:
-                return f"{self.percentage():.1f}"
-            else:
-                return ""
+# {{{ grade summary
+
+class GradeSummary(GradeStateDescriptionMixin, models.Model):
+    """The result of running :class:`GradeStateMachine` over all
+    :class:`GradeChange` instances of one participation and one grading
+    opportunity. Kept up to date by :func:`update_grade_summary`
+    whenever a grade change is saved or deleted, so that the grade book
+    does not need to replay the grade history.
+
+    Only exists for participation/opportunity pairs with at least one
+    grade change.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    opportunity = models.ForeignKey(GradingOpportunity,
+            verbose_name=_("Grading opportunity"), on_delete=models.CASCADE)
+    participation = models.ForeignKey(Participation,
+            verbose_name=_("Participation"), on_delete=models.CASCADE)
+
+    state = models.CharField(max_length=50, null=True, blank=True,
+            choices=GRADE_STATE_CHANGE_CHOICES,
+            verbose_name=_("State"))
+    aggregate_percentage = models.DecimalField(
+            max_digits=24, decimal_places=10, null=True, blank=True,
+            verbose_name=_("Aggregate percentage"))
+    valid_grade_count = models.PositiveIntegerField(default=0,
+            verbose_name=_("Number of valid grades"))
+
+    due_time = models.DateTimeField(null=True, blank=True,
+            verbose_name=_("Due time"))
+    last_graded_time = models.DateTimeField(null=True, blank=True,
+            verbose_name=_("Last graded time"))
+    last_report_time = models.DateTimeField(null=True, blank=True,
+            verbose_name=_("Last report time"))
+
+    grade_change_count = models.PositiveIntegerField(default=0,
+            verbose_name=_("Number of grade changes"))
+    error = models.TextField(null=True, blank=True,
+            verbose_name=_("Error"),
+            help_text=_("Set if the grade history could not be "
+                "processed"))
+
+    update_time = models.DateTimeField(default=now,
+            verbose_name=_("Update time"))
+
+    class Meta:
+        verbose_name = _("Grade summary")
+        verbose_name_plural = _("Grade summaries")
+        ordering = ("opportunity", "participation")
+        unique_together = (("opportunity", "participation"),)
+
+    @override
+    def __str__(self) -> str:
+        return _("%(participation)s on %(opportunity_id)s: %(state)s") % {
+                "participation": self.participation,
+                "opportunity_id": self.opportunity.identifier,
+                "state": self.stringify_state(),  # pyright: ignore[reportAttributeAccessIssue]
+                }
+
+    def valid_percentage_count(self) -> int:
+        return self.valid_grade_count
+
+    def percentage(self) -> Decimal | None:
+        return self.aggregate_percentage
+
+    def set_from_grade_changes(self, grade_changes: list[GradeChange]) -> None:
+        """Replay *grade_changes* (which must be ordered by
+        :attr:`GradeChange.grade_time`) and store the resulting state.
+        """
+        self.grade_change_count = len(grade_changes)
+        self.update_time = now()
+
+        try:
+            machine = GradeStateMachine().consume(grade_changes)
+            percentage = machine.percentage()
+        except (ValueError, AssertionError) as e:
+            # Inconsistent histories (such as a grade after an exemption or
+            # a non-attempt grade without points) must not prevent the
+            # grade change from being saved.
+            self.state = None
+            self.aggregate_percentage = None
+            self.valid_grade_count = 0
+            self.due_time = self.last_graded_time = self.last_report_time = None
+            self.error = str(e) or type(e).__name__
+            return
+
+        self.state = machine.state
+        self.aggregate_percentage = (
+                None if percentage is None
+                else quantize_grade_percentage(percentage))
+        self.valid_grade_count = machine.valid_percentage_count()
+        self.due_time = machine.due_time
+        self.last_graded_time = machine.last_graded_time
+        self.last_report_time = machine.last_report_time
+        self.error = None
+
+
+def quantize_grade_percentage(percentage: float | Decimal) -> Decimal:
+    from decimal import Decimal
+    return Decimal(percentage).quantize(Decimal("1e-10"))
+
+
+def update_grade_summary(opportunity: GradingOpportunity,
+        participation: Participation) -> None:
+    """Bring the :class:`GradeSummary` for *opportunity* and *participation*
+    in line with their grade history.
+    """
+    from django.db import transaction
+
+    with transaction.atomic():
+        # The row lock serializes concurrent updates of the same summary,
+        # so that the grade changes read below include those committed by
+        # whoever held the lock before us.
+        summary, _created = (GradeSummary.objects
+                .select_for_update()
+                .get_or_create(opportunity=opportunity,
+                    participation=participation))
+
+        grade_changes = list(GradeChange.objects
+                .filter(opportunity=opportunity, participation=participation)
+                .order_by("grade_time"))
+
+        if not grade_changes:
+            summary.delete()
+            return
+
+        for gchange in grade_changes:
+            gchange.opportunity = opportunity
+
+        summary.set_from_grade_changes(grade_changes)
+        summary.save()
+
+
+class GradeChangeRecord:
+    """A lightweight stand-in for :class:`GradeChange`, built from a row of
+    :meth:`~django.db.models.query.QuerySet.values_list`, with just the part
+    of its interface that :class:`GradeStateMachine` uses.
+    """
+
+    __slots__ = (
+            "attempt_id", "due_time", "grade_time", "is_superseded",
+            "max_points", "opportunity", "points", "state")
+
+    # must match the order of arguments to __init__ after *opportunity*
+    fields: ClassVar[tuple[str, ...]] = (
+            "state", "attempt_id", "points", "max_points",
+            "grade_time", "due_time")
+
+    def __init__(self, opportunity: GradingOpportunity,
+            state: str, attempt_id: str | None,
+            points: Decimal | None, max_points: Decimal | None,
+            grade_time: datetime.datetime,
+            due_time: datetime.datetime | None) -> None:
+        self.opportunity = opportunity
+        self.state = state
+        self.attempt_id = attempt_id
+        self.points = points
+        self.max_points = max_points
+        self.grade_time = grade_time
+        self.due_time = due_time
+        self.is_superseded = False
+
+    def percentage(self) -> Decimal | None:
+        if (self.max_points is not None
+                and self.points is not None
+                and self.max_points != 0):
+            return 100*self.points/self.max_points
         else:
-            return ""
+            return None
+
+
+def iter_grade_summaries(course: Course,
+            opportunity: GradingOpportunity | None = None,
+            participation_ids: Iterable[int] | None = None,
+        ) -> Iterator[GradeSummary]:
+    """Compute the (unsaved) :class:`GradeSummary` of every
+    participation/opportunity pair in *course* that has grade changes,
+    optionally restricted to one *opportunity* and/or a set of
+    participations.
+
+    The grade history is read in a single pass over rows ordered by
+    opportunity and participation, without instantiating
+    :class:`GradeChange` objects, so that memory use is bounded by the
+    history of one pair.
+    """
+    from itertools import groupby
+    from operator import itemgetter
+
+    if opportunity is not None:
+        opportunities = {opportunity.pk: opportunity}
+    else:
+        opportunities = GradingOpportunity.objects.filter(course=course).in_bulk()
+
+    rows = (GradeChange.objects
+            .filter(opportunity__course=course)
+            .order_by("opportunity_id", "participation_id", "grade_time", "id"))
+    if opportunity is not None:
+        rows = rows.filter(opportunity=opportunity)
+    if participation_ids is not None:
+        rows = rows.filter(participation__in=list(participation_ids))
+
+    for (opp_id, participation_id), pair_rows in groupby(
+            (rows
+                .values_list(
+                    "opportunity_id", "participation_id",
+                    *GradeChangeRecord.fields)
+                .iterator(chunk_size=2000)),
+            key=itemgetter(0, 1)):
+        opp = opportunities[opp_id]
+        summary = GradeSummary(
+                opportunity=opp, participation_id=participation_id)
+        summary.set_from_grade_changes(cast("list[GradeChange]", [
+                GradeChangeRecord(opp, *row[2:]) for row in pair_rows]))
+        yield summary
+
+
+def rebuild_grade_summaries(course: Course,
+            opportunity: GradingOpportunity | None = None,
+            participation_ids: Iterable[int] | None = None,
+        ) -> int:
+    """Recompute all :class:`GradeSummary` instances in *course* from
+    scratch, optionally restricted to one *opportunity* and/or a set of
+    participations.
+
+    :returns: the number of summaries written.
+    """
+    from itertools import islice
+
+    from django.db import transaction
+
+    if participation_ids is not None:
+        participation_ids = list(participation_ids)
+
+    count = 0
+    with transaction.atomic():
+        summaries = GradeSummary.objects.filter(opportunity__course=course)
+        if opportunity is not None:
+            summaries = summaries.filter(opportunity=opportunity)
+        if participation_ids is not None:
+            summaries = summaries.filter(participation__in=participation_ids)
+        summaries.delete()
+
+        new_summaries = iter_grade_summaries(
+                course, opportunity, participation_ids)
+        while batch := list(islice(new_summaries, 1000)):
+            GradeSummary.objects.bulk_create(batch)
+            count += len(batch)
+
+    return count
+
+
+def find_grade_summary_inconsistencies(course: Course) -> list[str]:
+    """Replay the full grade history of *course* and compare the result
+    with the stored :class:`GradeSummary` instances.
+
+    :returns: a list of human-readable descriptions of differences.
+    """
+    expected = {
+            (summary.opportunity_id, summary.participation_id): summary
+            for summary in iter_grade_summaries(course)}
+
+    compared_fields = [
+            "state", "aggregate_percentage", "valid_grade_count",
+            "due_time", "last_graded_time", "last_report_time",
+            "grade_change_count", "error"]
+
+    problems = []
+    for stored in (GradeSummary.objects
+            .filter(opportunity__course=course)
+            .order_by("opportunity", "participation")):
+        key = (stored.opportunity_id, stored.participation_id)
+        exp = expected.pop(key, None)
+        if exp is None:
+            problems.append(
+                    f"opportunity {key[0]}, participation {key[1]}: "
+                    "summary exists without grade changes")
+            continue
+
+        for field in compared_fields:
+            stored_value = getattr(stored, field)
+            expected_value = getattr(exp, field)
+            if stored_value != expected_value:
+                problems.append(
+                        f"opportunity {key[0]}, participation {key[1]}: "
+                        f"{field} is {stored_value!r}, "
+                        f"expected {expected_value!r}")
+
+    for opp_id, participation_id in sorted(expected):
+        problems.append(
+                f"opportunity {opp_id}, participation {participation_id}: "
+                "summary missing")
+
+    return problems
+
 # }}}
 
 
@@ -1991,4 +2478,110 @@ class ExamTicket(models.Model):
 
 # }}}
 
+
+# {{{ code run statistics
+
+class CodeRunRecord(models.Model):
+    """Timing and outcome of one (possibly retried) run of a code question,
+    see :class:`course.page.code_runner.CodeRunStats`.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    time = models.DateTimeField(default=now, db_index=True,
+            verbose_name=_("Time"))
+    course = models.ForeignKey(Course,
+            verbose_name=_("Course"), on_delete=models.CASCADE)
+    flow_id = models.CharField(max_length=200, null=True, blank=True,
+            verbose_name=_("Flow ID"),
+            help_text=_("Blank for runs from the page sandbox"))
+    page_id = models.CharField(max_length=200,
+            verbose_name=_("Page ID"))
+
+    backend = models.CharField(max_length=200,
+            verbose_name=_("Backend"))
+    image = models.CharField(max_length=200, null=True, blank=True,
+            verbose_name=_("Image"))
+    exec_host = models.CharField(max_length=200, null=True, blank=True,
+            verbose_name=_("Execution host"))
+    result = models.CharField(max_length=50,
+            verbose_name=_("Result"))
+    retry_count = models.PositiveIntegerField(default=0,
+            verbose_name=_("Retry count"))
+
+    total_time = models.FloatField(
+            verbose_name=_("Total time"),
+            help_text=_("In seconds"))
+    phase_timings = JSONField(default=dict, blank=True,
+            verbose_name=_("Phase timings"),
+            help_text=_("A mapping from phase names to seconds"))
+
+    class Meta:
+        verbose_name = _("Code run record")
+        verbose_name_plural = _("Code run records")
+        ordering = ("course", "-time")
+        indexes = [
+                models.Index(fields=["course", "flow_id", "time"]),
+                ]
+
+    @override
+    def __str__(self) -> str:
+        return _("Code run of '%(page_id)s' in %(course)s at %(time)s") % {
+                "page_id": self.page_id,
+                "course": self.course,
+                "time": self.time,
+                }
+
+# }}}
+
+
+# {{{ analytics snapshots
+
+class FlowAnalyticsSnapshot(models.Model):
+    """Precomputed flow analytics (see :mod:`course.analytics`), refreshed
+    incrementally from visits and grades beyond the stored watermarks.
+    """
+
+    course = models.ForeignKey(Course,
+            verbose_name=_("Course"), on_delete=models.CASCADE)
+    flow_id = models.CharField(max_length=200,
+            verbose_name=_("Flow ID"))
+    restrict_to_first_attempt = models.BooleanField(default=False,
+            verbose_name=_("Restrict to first attempt"))
+    commit_sha = models.CharField(max_length=200,
+            verbose_name=_("Commit SHA"),
+            help_text=_("The course content revision used to describe pages"))
+
+    visit_watermark = models.BigIntegerField(default=0,
+            verbose_name=_("Visit watermark"),
+            help_text=_("Largest flow page visit ID included"))
+    grade_watermark = models.BigIntegerField(default=0,
+            verbose_name=_("Grade watermark"),
+            help_text=_("Largest flow page visit grade ID included"))
+    quartile_digest = models.CharField(max_length=64, blank=True,
+            verbose_name=_("Quartile digest"))
+
+    creation_time = models.DateTimeField(default=now,
+            verbose_name=_("Creation time"))
+    refresh_time = models.DateTimeField(default=now,
+            verbose_name=_("Refresh time"))
+
+    data = JSONField(default=dict, blank=True,
+            verbose_name=_("Data"))
+
+    class Meta:
+        verbose_name = _("Flow analytics snapshot")
+        verbose_name_plural = _("Flow analytics snapshots")
+        unique_together = (("course", "flow_id", "restrict_to_first_attempt"),)
+
+    @override
+    def __str__(self) -> str:
+        return _("Analytics of '%(flow_id)s' in %(course)s as of %(time)s") % {
+                "flow_id": self.flow_id,
+                "course": self.course,
+                "time": self.refresh_time,
+                }
+
+# }}}
+
 # vim: foldmethod=marker
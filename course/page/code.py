@@ -23,6 +23,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import logging
 import os
 from abc import ABC, abstractmethod
 from typing import (
@@ -65,11 +66,21 @@ from course.page.base import (
     markup_to_html,
 )
 from course.page.code_run_backend import RunRequest, RunResponse
+from course.page.code_runner import (
+    CodeRunnerBackend,
+    CodeRunnerBusyError,
+    CodeRunStats,
+    admit_code_run,
+    get_code_runner_backend,
+)
 from course.repo import FileSystemFakeRepo, get_repo_blob
 from course.validation import IdentifierStr, Markup, RepoPathStr, get_validation_context
 from relate.utils import StyledVerticalForm, string_concat
 
 
+logger = logging.getLogger(__name__)
+
+
 # DEBUGGING SWITCH:
 # True for 'spawn containers' (normal operation)
 # False for 'just connect to localhost:CODE_QUESTION_CONTAINER_PORT' as runcode'
@@ -201,15 +212,72 @@ class CodeForm(StyledVerticalForm):
 CODE_QUESTION_CONTAINER_PORT = 9941
 DOCKER_TIMEOUT = 15
 
+# Delays (in seconds) for exponential backoff while waiting for
+# the container to respond to pings
+PING_INITIAL_DELAY = 0.005
+PING_MAX_DELAY = 0.5
+
 
 class InvalidPingResponse(RuntimeError):
     pass
 
 
+def wait_for_container_listening(container: Any, deadline: float) -> bool:
+    """Follow the log of *container* until :file:`runcode` reports that it
+    is listening for requests. (Current versions of :file:`runcode` print
+    this message once the server socket is bound, older ones just before.)
+
+    :returns: *True* if the message was seen before *deadline*.
+    """
+    import threading
+    from contextlib import suppress
+    from time import time
+
+    try:
+        stream = container.logs(
+                stream=True, follow=True, stdout=False, stderr=True)
+    except Exception:
+        # e.g. a read timeout talking to the Docker daemon. Callers fall
+        # back to pinging, which enforces the deadline.
+        return False
+
+    seen = threading.Event()
+    finished = threading.Event()
+
+    def follow_log() -> None:
+        tail = b""
+        # Errors include the stream being closed below.
+        try:
+            with suppress(Exception):
+                for chunk in stream:
+                    # keep enough for the message to straddle chunks
+                    tail = tail[-64:] + chunk
+                    if b"LISTENING ON" in tail:
+                        seen.set()
+                        return
+        finally:
+            finished.set()
+
+    # Reading the log blocks until the container writes to it, so follow it
+    # on a separate thread to be able to give up at the deadline.
+    follower = threading.Thread(target=follow_log, daemon=True)
+    follower.start()
+    try:
+        finished.wait(max(0, deadline - time()))
+        return seen.is_set()
+    finally:
+        # Ends a read that is still blocked, and with it the thread.
+        close = getattr(stream, "close", None)
+        if close is not None:
+            with suppress(Exception):
+                close()
+
+
 def request_run(
             run_req: RunRequest,
             run_timeout: float,
-            image: str | None = None
+            image: str | None = None,
+            stats: CodeRunStats | None = None,
         ) -> RunResponse:
     import errno
     import http.client as http_client
@@ -235,6 +303,9 @@ def request_run(
     if image is None:
         image = not_none(settings.RELATE_DOCKER_RUNPY_IMAGE)
 
+    if stats is None:
+        stats = CodeRunStats()
+
     if SPAWN_CONTAINERS:
         docker_url = getattr(settings, "RELATE_DOCKER_URL",
                 "unix://var/run/docker.sock")
@@ -247,18 +318,19 @@ def request_run(
                 version="1.24")
 
         mem_limit = 384*10**6
-        container = docker_cnx.containers.create(
-                image=image,
-                command=[
-                    command_path,
-                    "-1"],
-                mem_limit=mem_limit,
-                memswap_limit=mem_limit,
-                publish_all_ports=True,
-                detach=True,
-                # Do not enable: matplotlib stops working if enabled.
-                # read_only=True,
-                user=user)
+        with stats.time_phase("container_create"):
+            container = docker_cnx.containers.create(
+                    image=image,
+                    command=[
+                        command_path,
+                        "-1"],
+                    mem_limit=mem_limit,
+                    memswap_limit=mem_limit,
+                    publish_all_ports=True,
+                    detach=True,
+                    # Do not enable: matplotlib stops working if enabled.
+                    # read_only=True,
+                    user=user)
 
     else:
         container = None
@@ -269,8 +341,9 @@ def request_run(
         # FIXME: Prohibit networking
 
         if container is not None:
-            container.start()
-            container_props = docker_cnx.api.inspect_container(container.id)
+            with stats.time_phase("container_start"):
+                container.start()
+                container_props = docker_cnx.api.inspect_container(container.id)
 
             port_infos = (container_props
                 ["NetworkSettings"]["Ports"]
@@ -289,16 +362,23 @@ def request_run(
         else:
             port = CODE_QUESTION_CONTAINER_PORT
 
+        import random
         from time import sleep, time
         start_time = time()
 
-        # {{{ ping until response received
+        # {{{ wait for container to become ready
 
         from traceback import format_exc
 
+        ping_delay = PING_INITIAL_DELAY
+
         def check_timeout():
+            nonlocal ping_delay
+
             if time() - start_time < DOCKER_TIMEOUT:
-                sleep(0.1)
+                # exponential backoff with jitter
+                sleep(ping_delay * (0.5 + random.random()))
+                ping_delay = min(2*ping_delay, PING_MAX_DELAY)
                 # and retry
             else:
                 return RunResponse(
@@ -312,33 +392,43 @@ def request_run(
             # for compatibility with podman
             connect_host_ip = "localhost"
 
-        while True:
-            try:
-                connection = http_client.HTTPConnection(connect_host_ip, port)
+        # This connection is kept open (if the server supports it) and reused
+        # for the POST below.
+        connection = http_client.HTTPConnection(connect_host_ip, port,
+                timeout=DOCKER_TIMEOUT)
 
-                connection.request("GET", "/ping")
+        with stats.time_phase("ping_wait"):
+            if container is not None:
+                wait_for_container_listening(
+                        container, start_time + DOCKER_TIMEOUT)
 
-                response = connection.getresponse()
-                response_data = response.read().decode()
+            while True:
+                try:
+                    connection.request("GET", "/ping")
 
-                if response_data != "OK":
-                    raise InvalidPingResponse()
+                    response = connection.getresponse()
+                    response_data = response.read().decode()
 
-                break
+                    if response_data != "OK":
+                        raise InvalidPingResponse()
 
-            except (http_client.BadStatusLine, InvalidPingResponse):
-                ct_res = check_timeout()
-                if ct_res is not None:
-                    return ct_res
+                    break
 
-            except OSError as e:
-                if e.errno in [errno.ECONNRESET, errno.ECONNREFUSED]:
+                except (http_client.BadStatusLine, InvalidPingResponse):
+                    connection.close()
                     ct_res = check_timeout()
                     if ct_res is not None:
                         return ct_res
 
-                else:
-                    raise
+                except OSError as e:
+                    connection.close()
+                    if e.errno in [errno.ECONNRESET, errno.ECONNREFUSED]:
+                        ct_res = check_timeout()
+                        if ct_res is not None:
+                            return ct_res
+
+                    else:
+                        raise
 
         # }}}
 
@@ -346,8 +436,9 @@ def request_run(
 
         try:
             # Add a second to accommodate 'wire' delays
-            connection = http_client.HTTPConnection(connect_host_ip, port,
-                    timeout=1 + run_timeout)
+            connection.timeout = 1 + run_timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(connection.timeout)
 
             headers = {"Content-type": "application/json"}
 
@@ -357,12 +448,14 @@ def request_run(
             start_time = time()
 
             debug_print("BEFPOST")
-            connection.request("POST", "/run-python", json_run_req, headers)
+            with stats.time_phase("post"):
+                connection.request("POST", "/run-python", json_run_req, headers)
             debug_print("AFTPOST")
 
-            http_response = connection.getresponse()
-            debug_print("GETR")
-            response_data = http_response.read().decode("utf-8")
+            with stats.time_phase("execution"):
+                http_response = connection.getresponse()
+                debug_print("GETR")
+                response_data = http_response.read().decode("utf-8")
             debug_print("READR")
 
             end_time = time()
@@ -382,6 +475,9 @@ def request_run(
                     result="timeout",
                     exec_host=connect_host_ip,
                     )
+        finally:
+            connection.close()
+
     finally:
         if container is not None:
             debug_print(f"-----------BEGIN DOCKER LOGS for {container.id}")
@@ -389,7 +485,8 @@ def request_run(
             debug_print(f"-----------END DOCKER LOGS for {container.id}")
 
             try:
-                container.remove(force=True)
+                with stats.time_phase("container_remove"):
+                    container.remove(force=True)
             except DockerAPIError:
                 # Oh well. No need to bother the students with this nonsense.
                 pass
@@ -426,21 +523,89 @@ def is_nuisance_failure(result: RunResponse):
     return False
 
 
+class DockerRunnerBackend(CodeRunnerBackend):
+    """Runs code in a freshly spawned container for each request,
+    see :func:`request_run`. This is the default.
+    """
+
+    @override
+    def run(self,
+                run_req: RunRequest,
+                run_timeout: float,
+                image: str | None = None,
+                stats: CodeRunStats | None = None,
+            ) -> RunResponse:
+        return request_run(run_req, run_timeout, image=image, stats=stats)
+
+    @override
+    def get_host_key(self) -> str:
+        from django.conf import settings
+        return getattr(settings, "RELATE_DOCKER_URL",
+                "unix://var/run/docker.sock")
+
+
 def request_run_with_retries(
             run_req: RunRequest,
             run_timeout: float,
             image: str | None = None,
-            retry_count: int = 3):
+            retry_count: int = 3,
+            backend: CodeRunnerBackend | None = None,
+            stats: CodeRunStats | None = None):
+    if backend is None:
+        backend = get_code_runner_backend()
+
     while True:
-        result = request_run(run_req, run_timeout, image=image)
+        result = backend.run(run_req, run_timeout, image=image, stats=stats)
 
         if retry_count and is_nuisance_failure(result):
             retry_count -= 1
+            if stats is not None:
+                stats.retry_count += 1
             continue
 
         return result
 
 
+def record_code_run(
+            page_context: PageContext,
+            page_id: str,
+            backend: CodeRunnerBackend,
+            image: str | None,
+            result: str,
+            exec_host: str | None,
+            stats: CodeRunStats,
+        ) -> None:
+    from course.models import CodeRunRecord
+
+    if image is None:
+        from django.conf import settings
+        image = settings.RELATE_DOCKER_RUNPY_IMAGE
+
+    from django.db import transaction
+
+    try:
+        # Use a savepoint so that a failure here does not break an
+        # enclosing transaction.
+        with transaction.atomic():
+            CodeRunRecord.objects.create(
+                    course=page_context.course,
+                    flow_id=(
+                        page_context.flow_session.flow_id
+                        if page_context.flow_session is not None
+                        else None),
+                    page_id=page_id,
+                    backend=type(backend).__name__,
+                    image=image,
+                    exec_host=exec_host,
+                    result=result,
+                    retry_count=stats.retry_count,
+                    total_time=stats.total_time(),
+                    phase_timings=stats.phase_timings)
+    except Exception:
+        # Statistics are not worth failing a grading operation over.
+        logger.exception("failed to record code run for page '%s'", page_id)
+
+
 class CodeQuestion(PageBaseWithTitle, PageBaseWithValue, ABC):
     """
     An auto-graded question allowing an answer consisting of code.
@@ -815,10 +980,31 @@ class CodeQuestion(PageBaseWithTitle, PageBaseWithValue, ABC):
                 }
             )
 
+        stats = CodeRunStats()
+        backend = None
         try:
-            response_dict = request_run_with_retries(run_req,
-                    run_timeout=self.timeout,
-                    image=self.docker_image)
+            backend = get_code_runner_backend(trusted=page_context.in_sandbox)
+            with admit_code_run(backend, self.docker_image,
+                    page_context.course.identifier,
+                    # allow for the retries in request_run_with_retries
+                    lease_time=4*(self.timeout + 2*DOCKER_TIMEOUT),
+                    stats=stats):
+                response_dict = request_run_with_retries(run_req,
+                        run_timeout=self.timeout,
+                        image=self.docker_image,
+                        backend=backend,
+                        stats=stats)
+        except CodeRunnerBusyError:
+            assert backend is not None
+            record_code_run(page_context, self.id, backend, self.docker_image,
+                    "busy", None, stats)
+
+            return AnswerFeedback(correctness=None,
+                    feedback="<p>{}</p>".format(_(
+                        "The automatic grader is too busy to run your code "
+                        "right now. Your answer has been saved, but it has "
+                        "not been graded yet.")))
+
         except Exception:
             from traceback import format_exc
             response_dict = {
@@ -836,6 +1022,10 @@ class CodeQuestion(PageBaseWithTitle, PageBaseWithValue, ABC):
                             result="setup_error",
                             message=f"{type(e).__name__}: {e!s}")
 
+        if backend is not None:
+            record_code_run(page_context, self.id, backend, self.docker_image,
+                    response.result, response.exec_host, stats)
+
         correctness = response.points
         feedback_bits: list[str] = []
         bulk_feedback_bits: list[str] = []
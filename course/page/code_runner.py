@@ -0,0 +1,619 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2026 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import signal
+import sys
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from queue import Empty
+from typing import TYPE_CHECKING, Any
+
+from typing_extensions import override
+
+from course.page.code_run_backend import RunRequest, RunResponse
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Sequence
+
+
+__doc__ = """
+.. autoclass:: CodeRunStats
+.. autoclass:: CodeRunnerBackend
+.. autoclass:: LocalProcessPoolBackend
+.. autofunction:: get_code_runner_backend
+
+.. autoexception:: CodeRunnerBusyError
+.. autoclass:: AdmissionController
+.. autofunction:: admit_code_run
+"""
+
+
+OUTPUT_LENGTH_LIMIT = 16*1024
+
+
+# {{{ timing
+
+CODE_RUN_PHASES = (
+        "admission_wait",
+        "worker_wait",
+        "container_create",
+        "container_start",
+        "ping_wait",
+        "post",
+        "execution",
+        "container_remove",
+        )
+
+
+@dataclass
+class CodeRunStats:
+    """Collects wall-clock time (in seconds) spent in each phase of a code
+    run, summed across retries.
+
+    .. attribute:: phase_timings
+
+        A mapping from names in :data:`CODE_RUN_PHASES` to seconds.
+
+    .. attribute:: retry_count
+
+    .. automethod:: time_phase
+    """
+
+    phase_timings: dict[str, float] = field(default_factory=dict)
+    retry_count: int = 0
+
+    @contextmanager
+    def time_phase(self, phase: str) -> Iterator[None]:
+        assert phase in CODE_RUN_PHASES
+
+        from time import monotonic
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.phase_timings[phase] = (
+                    self.phase_timings.get(phase, 0)
+                    + monotonic() - start)
+
+    def total_time(self) -> float:
+        return sum(self.phase_timings.values())
+
+# }}}
+
+
+# {{{ backend interface
+
+class CodeRunnerBackend(ABC):
+    """Executes a :class:`~course.page.code_run_backend.RunRequest` somewhere
+    and reports back a :class:`~course.page.code_run_backend.RunResponse`.
+
+    .. automethod:: run
+    """
+
+    @abstractmethod
+    def run(self,
+                run_req: RunRequest,
+                run_timeout: float,
+                image: str | None = None,
+                stats: CodeRunStats | None = None,
+            ) -> RunResponse:
+        """
+        :arg image: the container image requested by the page. Backends
+            that do not use containers may ignore this.
+        :arg stats: if given, a :class:`CodeRunStats` into which the time
+            spent in each phase of the run is recorded.
+        """
+
+    def get_host_key(self) -> str:
+        """Return an identifier for the machine on which code is run,
+        for the purposes of :class:`AdmissionController`.
+        """
+        import socket
+        return socket.gethostname()
+
+# }}}
+
+
+# {{{ local process pool
+
+def truncate_if_long(s: str) -> str:
+    if len(s) > OUTPUT_LENGTH_LIMIT:
+        s = (s[:OUTPUT_LENGTH_LIMIT//2]
+                + "\n[... TOO MUCH OUTPUT, SKIPPING ...]\n"
+                + s[-OUTPUT_LENGTH_LIMIT//2:])
+    return s
+
+
+def _get_address_space_size() -> int | None:
+    from pathlib import Path
+    try:
+        vm_pages = int(Path("/proc/self/statm").read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return vm_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _init_pool_worker(
+            mem_limit: int | None,
+            preload_modules: Sequence[str]) -> None:
+    import resource
+
+    os.environ["MPLBACKEND"] = "Agg"
+
+    from importlib import import_module
+    for mod_name in preload_modules:
+        import_module(mod_name)
+
+    if mem_limit is not None:
+        # The worker is forked from a (large) web process, so an absolute
+        # limit on the address space would be meaningless. Limit growth
+        # beyond what is already mapped instead.
+        as_size = _get_address_space_size()
+        if as_size is not None:
+            _soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            new_soft = as_size + mem_limit
+            if hard != resource.RLIM_INFINITY:
+                new_soft = min(new_soft, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (new_soft, hard))
+
+
+def _handle_run_request(request: tuple[str, float]) -> str:
+    import io
+    import resource
+
+    from course.page.code_run_backend import package_exception, run_code
+
+    run_req_json, run_timeout = request
+
+    # RLIMIT_CPU counts the lifetime CPU usage of the process, so
+    # stack the allowance for this run onto what has been used so far.
+    # Exceeding it raises SIGXCPU, which terminates the worker.
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    cpu_limit = int(usage.ru_utime + usage.ru_stime + run_timeout) + 1
+    if hard != resource.RLIM_INFINITY:
+        cpu_limit = min(cpu_limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, hard))
+
+    prev_stdin = sys.stdin
+    prev_stdout = sys.stdout
+    prev_stderr = sys.stderr
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+
+    try:
+        sys.stdin = None  # type: ignore[assignment]
+        sys.stdout = stdout
+        sys.stderr = stderr
+
+        response = run_code(RunRequest.model_validate_json(run_req_json))
+        del run_req_json
+
+        response.stdout = truncate_if_long(stdout.getvalue())
+        response.stderr = truncate_if_long(stderr.getvalue())
+    except Exception:
+        response = package_exception("uncaught_error")
+    finally:
+        sys.stdin = prev_stdin
+        sys.stdout = prev_stdout
+        sys.stderr = prev_stderr
+
+    if "matplotlib.pyplot" in sys.modules:
+        import matplotlib.pyplot as pt
+        pt.close("all")
+
+    return response.model_dump_json()
+
+
+class LocalProcessPoolBackend(CodeRunnerBackend):
+    """Runs code in a warm pool of worker processes forked from the current
+    process, using :func:`course.page.code_run_backend.run_code` directly,
+    without involving a container engine.
+
+    The workers share the memory image (including settings and secrets) of
+    the process they were forked from. This backend is therefore only
+    appropriate for trusted code, e.g. in the page sandbox, for
+    ``relate test-code``-style checks, or in continuous integration.
+    Requires a POSIX system.
+
+    :arg pool_size: the number of worker processes kept ready.
+    :arg mem_limit: the number of bytes by which a worker's address space
+        may grow, or *None* for no limit.
+    :arg max_runs_per_worker: number of runs after which a worker is
+        replaced by a fresh one, to bound state leaking between runs.
+    :arg acquire_timeout: the number of seconds to wait for a free worker.
+    :arg preload_modules: names of modules to import in each worker before
+        it starts accepting work, e.g. ``["numpy"]``.
+    """
+
+    def __init__(self,
+                pool_size: int = 2,
+                mem_limit: int | None = 384*10**6,
+                max_runs_per_worker: int = 50,
+                acquire_timeout: float = 15,
+                preload_modules: Sequence[str] = (),
+            ) -> None:
+        if pool_size < 1:
+            raise ValueError("pool_size must be positive")
+
+        if not hasattr(os, "fork"):
+            from django.core.exceptions import ImproperlyConfigured
+            raise ImproperlyConfigured(
+                    "LocalProcessPoolBackend requires a POSIX system "
+                    "that supports fork(), which this one does not. "
+                    "Configure a different RELATE_CODE_RUNNER_BACKEND.")
+
+        self.pool_size = pool_size
+        self.mem_limit = mem_limit
+        self.max_runs_per_worker = max_runs_per_worker
+        self.acquire_timeout = acquire_timeout
+        self.preload_modules = tuple(preload_modules)
+
+        import multiprocessing
+        from functools import partial
+
+        from relate.utils import WorkerPool, WorkerProcess
+
+        self._pool = WorkerPool(
+                partial(WorkerProcess, multiprocessing.get_context("fork"),
+                    _handle_run_request,
+                    _init_pool_worker, (mem_limit, self.preload_modules)),
+                size=pool_size,
+                max_uses=max_runs_per_worker)
+
+    def warm_up(self) -> None:
+        """Start all workers in the pool ahead of the first run."""
+        self._pool.warm_up()
+
+    def shutdown(self) -> None:
+        """Terminate all idle workers."""
+        self._pool.shutdown()
+
+    @override
+    def run(self,
+                run_req: RunRequest,
+                run_timeout: float,
+                image: str | None = None,
+                stats: CodeRunStats | None = None,
+            ) -> RunResponse:
+        from relate.utils import TIMED_OUT
+
+        if stats is None:
+            stats = CodeRunStats()
+
+        try:
+            with stats.time_phase("worker_wait"):
+                worker = self._pool.acquire(timeout=self.acquire_timeout)
+        except Empty:
+            return RunResponse(
+                    result="uncaught_error",
+                    message="Timeout waiting for a code execution worker.",
+                    exec_host="localhost")
+
+        try:
+            with stats.time_phase("execution"):
+                # Add a second to accommodate transfer delays
+                response_json = worker.request(
+                        (run_req.model_dump_json(), run_timeout),
+                        1 + run_timeout)
+        except EOFError:
+            # Most likely killed by SIGXCPU after exceeding the CPU limit.
+            worker.process.join(1)
+            if worker.process.exitcode == -signal.SIGXCPU:
+                return RunResponse(result="timeout", exec_host="localhost")
+
+            return RunResponse(
+                    result="uncaught_error",
+                    message="Code execution worker exited unexpectedly "
+                        f"(exit code {worker.process.exitcode}).",
+                    exec_host="localhost")
+        finally:
+            self._pool.release(worker)
+
+        if response_json is TIMED_OUT:
+            return RunResponse(result="timeout", exec_host="localhost")
+
+        response = RunResponse.model_validate_json(response_json)
+        response.exec_host = "localhost"
+        return response
+
+# }}}
+
+
+# {{{ backend lookup
+
+DEFAULT_CODE_RUNNER_BACKEND: dict[str, Any] = {
+    "backend": "course.page.code.DockerRunnerBackend",
+    }
+
+_BACKEND_INSTANCES: dict[str, CodeRunnerBackend] = {}
+_BACKEND_INSTANCES_LOCK = threading.Lock()
+
+
+def get_code_runner_backend(trusted: bool = False) -> CodeRunnerBackend:
+    """Return the (process-wide, shared) backend instance configured by
+    ``RELATE_CODE_RUNNER_BACKEND`` in the settings. If *trusted* is
+    *True* and ``RELATE_TRUSTED_CODE_RUNNER_BACKEND`` is configured,
+    that one is used instead.
+    """
+    from django.conf import settings
+
+    config = None
+    if trusted:
+        config = getattr(settings, "RELATE_TRUSTED_CODE_RUNNER_BACKEND", None)
+    if config is None:
+        config = getattr(settings, "RELATE_CODE_RUNNER_BACKEND", None)
+    if config is None:
+        config = DEFAULT_CODE_RUNNER_BACKEND
+
+    key = repr(sorted(config.items()))
+
+    with _BACKEND_INSTANCES_LOCK:
+        try:
+            return _BACKEND_INSTANCES[key]
+        except KeyError:
+            pass
+
+        from django.utils.module_loading import import_string
+        backend_class = import_string(config["backend"])
+        backend = backend_class(**config.get("options", {}))
+        if not isinstance(backend, CodeRunnerBackend):
+            raise TypeError(
+                f"code runner backend '{config['backend']}' is not "
+                "a subclass of CodeRunnerBackend")
+
+        _BACKEND_INSTANCES[key] = backend
+        return backend
+
+# }}}
+
+
+# {{{ admission control
+
+class CodeRunnerBusyError(RuntimeError):
+    """Raised by :meth:`AdmissionController.admit` if no slot to run code
+    became available within the allowed waiting time.
+    """
+
+
+def _pick_next_waiter(state: dict[str, dict[str, list[Any]]]) -> str | None:
+    """Among the waiting tickets in *state*, return the one to be admitted
+    next: the earliest-enqueued ticket among those from the course(s) holding
+    the fewest running slots. This keeps one course with a burst of
+    submissions (e.g. during an exam) from starving everybody else.
+    """
+    if not state["waiting"]:
+        return None
+
+    from collections import Counter
+    running_by_course = Counter(
+            course for course, _expires in state["running"].values())
+
+    return min(
+            state["waiting"],
+            key=lambda token: (
+                running_by_course[state["waiting"][token][0]],
+                state["waiting"][token][1]))
+
+
+class AdmissionController:
+    """Limits the number of code runs in flight per execution host and
+    image, across all processes sharing the Django cache given by
+    *cache_alias*. (With a process-local cache, such as the default
+    ``LocMemCache``, the limit only applies per process.)
+
+    Among runs waiting for a slot, those from the course(s) currently
+    holding the fewest slots go first, and first-come-first-served
+    otherwise. A run that has waited for more than
+    *max_wait* seconds gives up with :exc:`CodeRunnerBusyError`.
+
+    :arg max_concurrent_runs: the default number of concurrent runs per
+        (host, image) combination.
+    :arg max_concurrent_runs_by_image: a mapping from image names to
+        limits, overriding *max_concurrent_runs*.
+
+    .. automethod:: admit
+    """
+
+    def __init__(self,
+                max_concurrent_runs: int = 8,
+                max_concurrent_runs_by_image: dict[str, int] | None = None,
+                max_wait: float = 30,
+                poll_interval: float = 0.2,
+                cache_alias: str = "default",
+            ) -> None:
+        self.max_concurrent_runs = max_concurrent_runs
+        self.max_concurrent_runs_by_image = max_concurrent_runs_by_image or {}
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.cache_alias = cache_alias
+
+    def _get_cache(self):
+        from django.core.cache import caches
+        return caches[self.cache_alias]
+
+    @contextmanager
+    def _locked(self, key: str) -> Iterator[None]:
+        import random
+        from time import sleep
+
+        cache = self._get_cache()
+        lock_key = f"{key}:lock"
+
+        # The lock times out so that a crashed process cannot hold it
+        # indefinitely. It is only ever held for a few cache operations.
+        while not cache.add(lock_key, 1, timeout=5):
+            sleep(0.005 * (1 + random.random()))
+        try:
+            yield
+        finally:
+            cache.delete(lock_key)
+
+    def _update_state(self,
+                key: str,
+                update: Callable[[dict[str, dict[str, list[Any]]], float], bool],
+            ) -> bool:
+        from time import time
+
+        cache = self._get_cache()
+        with self._locked(key):
+            state = cache.get(key) or {"running": {}, "waiting": {}}
+            now = time()
+
+            for queue in state.values():
+                for token in [
+                        token for token, entry in queue.items()
+                        if entry[-1] < now]:
+                    del queue[token]
+
+            try:
+                result = update(state, now)
+            finally:
+                cache.set(key, state, timeout=None)
+
+        return result
+
+    def get_limit(self, image: str | None) -> int:
+        return self.max_concurrent_runs_by_image.get(
+                image or "", self.max_concurrent_runs)
+
+    @contextmanager
+    def admit(self,
+                host: str,
+                image: str | None,
+                course_identifier: str,
+                lease_time: float,
+            ) -> Iterator[None]:
+        """Wait until a run on *host* using *image* may proceed, then hold
+        that slot for the duration of the ``with`` block.
+
+        :arg lease_time: the number of seconds after which the slot is
+            reclaimed, should the holder fail to release it.
+        """
+        import random
+        from hashlib import sha256
+        from time import sleep
+        from uuid import uuid4
+
+        key = "relate-code-run-admission:" + sha256(
+                f"{host}\0{image}".encode()).hexdigest()
+        token = uuid4().hex
+        limit = self.get_limit(image)
+        # A waiter that has stopped polling (e.g. because its process died)
+        # is dropped from the queue after this many seconds.
+        waiter_expiry = max(5, 10*self.poll_interval)
+
+        enqueue_time: float | None = None
+
+        def try_admit(state: dict[str, dict[str, list[Any]]], now: float) -> bool:
+            nonlocal enqueue_time
+            if enqueue_time is None:
+                enqueue_time = now
+
+            state["waiting"][token] = [
+                    course_identifier, enqueue_time, now + waiter_expiry]
+
+            if (len(state["running"]) < limit
+                    and _pick_next_waiter(state) == token):
+                del state["waiting"][token]
+                state["running"][token] = [course_identifier, now + lease_time]
+                return True
+
+            if now - enqueue_time > self.max_wait:
+                del state["waiting"][token]
+                raise CodeRunnerBusyError(
+                        f"no code execution slot available on '{host}' "
+                        f"after {self.max_wait} s")
+
+            return False
+
+        while not self._update_state(key, try_admit):
+            # jitter to avoid waiters polling in lockstep
+            sleep(self.poll_interval * (0.5 + random.random()))
+
+        def release(state: dict[str, dict[str, list[Any]]], now: float) -> bool:
+            state["running"].pop(token, None)
+            return True
+
+        try:
+            yield
+        finally:
+            self._update_state(key, release)
+
+
+def get_admission_controller() -> AdmissionController | None:
+    """Return an :class:`AdmissionController` configured by
+    ``RELATE_CODE_RUN_ADMISSION`` in the settings, which is a dictionary of
+    keyword arguments to its constructor. Return *None* if admission control
+    is not configured.
+    """
+    from django.conf import settings
+
+    config = getattr(settings, "RELATE_CODE_RUN_ADMISSION", None)
+    if config is None:
+        return None
+
+    return AdmissionController(**config)
+
+
+@contextmanager
+def admit_code_run(
+            backend: CodeRunnerBackend,
+            image: str | None,
+            course_identifier: str,
+            lease_time: float,
+            stats: CodeRunStats | None = None,
+        ) -> Iterator[None]:
+    """Perform admission control as configured by
+    :func:`get_admission_controller` (if any) for the duration of the
+    ``with`` block.
+
+    :raises CodeRunnerBusyError: if no slot became available in time.
+    """
+    controller = get_admission_controller()
+    if controller is None:
+        yield
+        return
+
+    if stats is None:
+        stats = CodeRunStats()
+
+    from contextlib import ExitStack
+    with ExitStack() as stack:
+        with stats.time_phase("admission_wait"):
+            stack.enter_context(controller.admit(
+                    backend.get_host_key(), image, course_identifier, lease_time))
+
+        yield
+
+# }}}
+
+# vim: foldmethod=marker
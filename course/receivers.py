@@ -26,16 +26,21 @@ THE SOFTWARE.
 from typing import Any
 
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from accounts.models import User
 from course.constants import ParticipationStatus
 from course.models import (
     Course,
+    GradeChange,
+    GradingOpportunity,
     Participation,
     ParticipationPreapproval,
     ParticipationRole,
+    rebuild_grade_summaries,
+    update_grade_summary,
 )
 
 
@@ -112,4 +117,49 @@ def may_preapprove_role(
 
 # }}}
 
+
+# {{{ Keep grade summaries up to date
+
+@receiver(post_save, sender=GradeChange)
+def update_grade_summary_on_grade_change_save(
+        sender: Any,
+        instance: GradeChange,
+        raw: bool,
+        **kwargs: Any) -> None:
+    if raw:
+        return
+
+    update_grade_summary(instance.opportunity, instance.participation)
+
+
+@receiver(post_delete, sender=GradeChange)
+def update_grade_summary_on_grade_change_delete(
+        sender: Any,
+        instance: GradeChange,
+        origin: Any = None,
+        **kwargs: Any) -> None:
+    # If the grade change is deleted because its participation or
+    # opportunity is, the summary goes away along with it.
+    if not (isinstance(origin, GradeChange)
+            or (isinstance(origin, QuerySet) and origin.model is GradeChange)):
+        return
+
+    update_grade_summary(instance.opportunity, instance.participation)
+
+
+@receiver(post_save, sender=GradingOpportunity)
+def update_grade_summaries_on_opportunity_save(
+        sender: Any,
+        instance: GradingOpportunity,
+        created: bool,
+        raw: bool,
+        **kwargs: Any) -> None:
+    if created or raw:
+        return
+
+    # The aggregation strategy or the due time may have changed.
+    rebuild_grade_summaries(instance.course, opportunity=instance)
+
+# }}}
+
 # vim: foldmethod=marker
@@ -179,4 +179,94 @@ def purge_page_view_data(self, course_id):
             % num_deleted_by_kind.get("course.FlowPageVisit", 0)}
 
 
+@shared_task(bind=True)
+def build_submission_archive(self, course_id, commit_sha, flow_id, group_id,
+        page_id, which_attempt, non_in_progress_only, restrict_to_rules_tag,
+        include_feedback, extra_file_name, extra_file_storage_name):
+    from tempfile import TemporaryFile
+
+    from django.conf import settings
+    from django.urls import reverse
+
+    from course.grades import (
+        get_submission_archive_file_name,
+        get_submission_visits,
+        iter_submission_files,
+        save_submission_archive,
+        stream_zip,
+    )
+    from course.repo import deserialize_revision
+
+    course = Course.objects.get(id=course_id)
+    repo = get_course_repo(course)
+
+    def report_progress(current, total):
+        self.update_state(
+                state="PROGRESS",
+                meta={"current": current, "total": total})
+
+    zip_entries = iter_submission_files(
+            course, repo, deserialize_revision(commit_sha),
+            flow_id, group_id, page_id,
+            get_submission_visits(
+                course, flow_id, group_id, page_id,
+                non_in_progress_only=non_in_progress_only,
+                restrict_to_rules_tag=restrict_to_rules_tag),
+            which_attempt=which_attempt,
+            include_feedback=include_feedback,
+            progress_callback=report_progress)
+
+    if extra_file_storage_name is not None:
+        with settings.RELATE_BULK_STORAGE.open(extra_file_storage_name) as inf:
+            extra_file_contents = inf.read()
+        settings.RELATE_BULK_STORAGE.delete(extra_file_storage_name)
+
+        from itertools import chain
+        zip_entries = chain(
+                zip_entries, [(extra_file_name, extra_file_contents)])
+
+    with TemporaryFile() as outf:
+        for chunk in stream_zip(zip_entries):
+            outf.write(chunk)
+
+        outf.seek(0)
+        archive_name = save_submission_archive(
+                course,
+                get_submission_archive_file_name(
+                    course, flow_id, group_id, page_id),
+                outf)
+
+    repo.close()
+
+    return {
+            "message": _("Submission archive created."),
+            "download_url": reverse("relate-download_submission_archive",
+                args=(course.identifier, archive_name)),
+            }
+
+
+@shared_task(bind=True)
+def refresh_flow_analytics_snapshot(self, course_id, flow_id,
+        restrict_to_first_attempt, full=False):
+    from course.analytics import AnalyticsContext, update_flow_analytics_snapshot
+    from course.repo import deserialize_revision
+
+    course = Course.objects.get(id=course_id)
+    repo = get_course_repo(course)
+
+    update_flow_analytics_snapshot(
+            AnalyticsContext(
+                course=course,
+                repo=repo,
+                course_commit_sha=deserialize_revision(
+                    course.active_git_commit_sha)),
+            flow_id,
+            restrict_to_first_attempt=restrict_to_first_attempt,
+            full=full)
+
+    repo.close()
+
+    return {"message": _("Analytics of '%s' refreshed.") % flow_id}
+
+
 # vim: foldmethod=marker
@@ -1075,6 +1075,104 @@ def get_facilities_config(
         return facilities
 
 
+_NO_FACILITIES: frozenset[str] = frozenset()
+
+
+class FacilityIndex:
+    """Finds the facilities whose ``ip_ranges`` contain a given IP address.
+
+    For each IP version, the address space is cut into disjoint intervals
+    at the boundaries of all configured networks, and each interval is
+    labeled with the facilities covering it. A lookup is then a binary
+    search over the interval starts, independent of how the networks were
+    written down or how many of them overlap.
+    """
+
+    def __init__(self, facilities_config: dict[str, dict[str, Any]]) -> None:
+        from collections import Counter
+        from ipaddress import ip_network
+
+        # {version: [(position, +1 for network start/-1 for end, name)]}
+        events: dict[int, list[tuple[int, int, str]]] = {4: [], 6: []}
+        for name, props in facilities_config.items():
+            for ir in props.get("ip_ranges", []):
+                network = ip_network(str(ir))
+                events[network.version].extend([
+                    (int(network.network_address), 1, name),
+                    (int(network.broadcast_address) + 1, -1, name),
+                    ])
+
+        self._starts: dict[int, list[int]] = {}
+        self._facilities: dict[int, list[frozenset[str]]] = {}
+
+        for version, version_events in events.items():
+            version_events.sort()
+
+            starts: list[int] = []
+            facilities: list[frozenset[str]] = []
+            active: Counter[str] = Counter()
+
+            i = 0
+            while i < len(version_events):
+                position = version_events[i][0]
+                while i < len(version_events) and version_events[i][0] == position:
+                    _position, delta, name = version_events[i]
+                    active[name] += delta
+                    i += 1
+
+                interval_facilities = frozenset(
+                        name for name, count in active.items() if count > 0)
+                if not facilities or facilities[-1] != interval_facilities:
+                    starts.append(position)
+                    facilities.append(interval_facilities)
+
+            self._starts[version] = starts
+            self._facilities[version] = facilities
+
+    def get_facilities(
+            self, address: IPv4Address | IPv6Address) -> frozenset[str]:
+        from bisect import bisect_right
+
+        starts = self._starts[address.version]
+        i = bisect_right(starts, int(address)) - 1
+        if i < 0:
+            return _NO_FACILITIES
+        return self._facilities[address.version][i]
+
+
+_facility_index_cache: tuple[
+        dict[str, dict[str, Any]],
+        tuple[tuple[str, tuple[str, ...]], ...],
+        FacilityIndex] | None = None
+
+
+def get_facility_index(
+        facilities_config: dict[str, dict[str, Any]]) -> FacilityIndex:
+    """Return a :class:`FacilityIndex` for *facilities_config*, reusing the
+    previous one if the configured IP ranges have not changed.
+
+    A static ``RELATE_FACILITIES`` is recognized by identity. A callable one
+    may return a new dictionary on every request, in which case only the
+    (cheap) comparison of the IP range strings is repeated, not the parsing.
+    """
+    global _facility_index_cache
+
+    cached = _facility_index_cache
+    if cached is not None and cached[0] is facilities_config:
+        return cached[2]
+
+    key = tuple(
+            (name, tuple(str(ir) for ir in props.get("ip_ranges", [])))
+            for name, props in facilities_config.items())
+    if cached is not None and cached[1] == key:
+        index = cached[2]
+    else:
+        index = FacilityIndex(facilities_config)
+
+    _facility_index_cache = (facilities_config, key, index)
+    return index
+
+
 class FacilityFindingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -1085,20 +1183,12 @@ class FacilityFindingMiddleware:
         if pretend_facilities is not None:
             facilities = pretend_facilities
         else:
-            remote_address = remote_address_from_request(request)
-
-            facilities = set()
-
             facilities_config = get_facilities_config(request)
-            if facilities_config is None:
-                facilities_config = {}
-
-            from ipaddress import ip_network
-            for name, props in facilities_config.items():
-                ip_ranges = props.get("ip_ranges", [])
-                for ir in ip_ranges:
-                    if remote_address in ip_network(str(ir)):
-                        facilities.add(name)
+            if facilities_config:
+                facilities = get_facility_index(facilities_config).get_facilities(
+                        remote_address_from_request(request))
+            else:
+                facilities = _NO_FACILITIES
 
         request = cast("RelateHttpRequest", request)
         request.relate_facilities = frozenset(facilities)
@@ -1115,6 +1205,16 @@ def get_col_contents_or_empty(row, index):
         return row[index]
 
 
+class EchoBuffer:
+    """A file-like object for :func:`csv.writer` whose :meth:`write`
+    returns the written value, so that rows can be passed on to a
+    :class:`django.http.StreamingHttpResponse` as they are produced.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
 def csv_data_importable(file_contents, column_idx_list, header_count):
     import csv
     spamreader = csv.reader(file_contents)
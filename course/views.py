@@ -1392,9 +1392,11 @@ def monitor_task(request: http.HttpRequest, task_id: str) -> http.HttpResponse:
                 _("%(current)d out of %(total)d items processed.")
                 % {"current": current, "total": total})
 
-    if async_res.state == states.SUCCESS and (isinstance(async_res.result, dict)
-            and "message" in async_res.result):
-        progress_statement = async_res.result["message"]
+    download_url = None
+    if async_res.state == states.SUCCESS and isinstance(async_res.result, dict):
+        if "message" in async_res.result:
+            progress_statement = async_res.result["message"]
+        download_url = async_res.result.get("download_url")
 
     traceback = None
     if async_res.state == states.FAILURE:
@@ -1405,6 +1407,7 @@ def monitor_task(request: http.HttpRequest, task_id: str) -> http.HttpResponse:
         "progress_percent": progress_percent,
         "progress_statement": progress_statement,
         "traceback": traceback,
+        "download_url": download_url,
         })
 
 # }}}
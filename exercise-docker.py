@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import sys
+
 from course.page.code_run_backend import RunRequest
 
 
 def main():
     from course.page.code import request_run
+    from course.page.code_runner import CODE_RUN_PHASES, CodeRunStats
+
+    # Number of runs after which to report timings, optional
+    report_every = int(sys.argv[1]) if len(sys.argv) > 1 else 50
 
     req = RunRequest(
         setup_code="a,b=5,2",
@@ -14,14 +20,32 @@ def main():
         compile_only=False,
         )
     count = 0
+    all_stats: list[CodeRunStats] = []
     while True:
         print(count)
         count += 1
-        res = request_run(req, 10)
+        stats = CodeRunStats()
+        res = request_run(req, 10, stats=stats)
         if res.result != "success":
             print(res)
             break
 
+        all_stats.append(stats)
+        if len(all_stats) % report_every == 0:
+            for phase in (*CODE_RUN_PHASES, "total"):
+                timings = sorted(
+                        st.total_time() if phase == "total"
+                        else st.phase_timings[phase]
+                        for st in all_stats
+                        if phase == "total" or phase in st.phase_timings)
+                if not timings:
+                    continue
+
+                p50 = timings[int(0.5*(len(timings)-1))]
+                p99 = timings[int(0.99*(len(timings)-1))]
+                print(f"{phase:>20}: p50 {p50*1000:8.1f} ms  "
+                        f"p99 {p99*1000:8.1f} ms")
+
 
 if __name__ == "__main__":
     main()
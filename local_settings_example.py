@@ -48,6 +48,10 @@ from django.utils.translation import gettext_noop  # ruff:ignore[unused-import,
 # properly if you enable this. (or a similar out-of-process cache
 # backend)
 #
+# Participation roles and permissions are cached as well. Changes to them
+# apply in all processes at once if the cache is shared, otherwise within a
+# minute.
+#
 # To use this, make sure to install with the 'memcache' extra.
 #
 # CACHES = {
@@ -102,6 +106,10 @@ from django.core.files.storage import FileSystemStorage
 # should *not* be accessible under a URL.
 RELATE_BULK_STORAGE = FileSystemStorage(path.join(_BASEDIR, "bulk-storage"))
 
+# Submission archives built in the background (see "Download all
+# submissions") are kept in RELATE_BULK_STORAGE for this many hours.
+# RELATE_SUBMISSION_ARCHIVE_EXPIRATION_HOURS = 24
+
 # }}}
 
 # {{{ email
@@ -410,6 +418,37 @@ RELATE_DOCKER_TLS_CONFIG = None
 #     ca_cert=os.path.join(pki_base_dir, "ca.pem"),
 #     verify=True)
 
+# Which backend executes code questions. The default spawns a Docker
+# container per run, configured as above.
+# RELATE_CODE_RUNNER_BACKEND = {
+#     "backend": "course.page.code.DockerRunnerBackend",
+# }
+
+# Backend used for code run on behalf of trusted users, i.e. in the page
+# sandbox. Defaults to RELATE_CODE_RUNNER_BACKEND. The local process pool does
+# not isolate code from the RELATE process, so only use it for trusted code.
+# RELATE_TRUSTED_CODE_RUNNER_BACKEND = {
+#     "backend": "course.page.code_runner.LocalProcessPoolBackend",
+#     "options": {"pool_size": 2, "mem_limit": 384*10**6},
+# }
+
+# Limits how many code runs may be in flight at once per execution host and
+# image. Runs beyond that wait (courses with fewer running jobs go first) for
+# up to max_wait seconds, after which the answer is saved ungraded. For the
+# limit to apply across processes, CACHES must be shared (e.g. memcached).
+# RELATE_CODE_RUN_ADMISSION = {
+#     "max_concurrent_runs": 8,
+#     "max_concurrent_runs_by_image": {},
+#     "max_wait": 30,
+# }
+
+# Symbolic and floating point answers are evaluated with a time limit. Where
+# that cannot be done with SIGALRM (e.g. in threaded servers), they are
+# evaluated by this many persistent worker processes per RELATE process. At
+# most max_queued evaluations wait for a worker; beyond that, each gets a
+# process of its own.
+# RELATE_CALL_WITH_TIMEOUT_POOL = {"size": 2, "max_queued": 64}
+
 # }}}
 
 # {{{ maintenance and announcements
@@ -471,7 +510,10 @@ RELATE_SITE_ANNOUNCEMENT = None
 #             },
 #     }
 #
-#    # Automatically get denied facilities from PrairieTest
+#    # Automatically get denied facilities from PrairieTest.
+#    # Changes received through the PrairieTest webhook apply in all
+#    # processes at once if CACHES is shared (e.g. memcached), otherwise
+#    # within a minute.
 #    result = {}
 #
 #    from prairietest.utils import denied_ip_networks_at
@@ -496,6 +538,11 @@ RELATE_FACILITIES = {
 # use?
 RELATE_TICKET_MINUTES_VALID_AFTER_USE = 12*60
 
+# If True, the PrairieTest webhook only stores incoming events and answers
+# right away. A Celery task then applies them in batches. Queued events can
+# also be applied with "python manage.py replayprairietestevents FACILITY".
+# RELATE_PRAIRIETEST_QUEUE_WEBHOOK_EVENTS = False
+
 # }}}
 
 # {{{ saml2 (optional)
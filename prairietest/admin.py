@@ -34,7 +34,13 @@ from typing_extensions import override
 
 from accounts.models import User  # ruff:ignore[typing-only-first-party-import]
 from course.constants import ParticipationPermission as PPerm
-from prairietest.models import AllowEvent, DenyEvent, Facility, MostRecentDenyEvent
+from prairietest.models import (
+    AllowEvent,
+    DenyEvent,
+    Facility,
+    MostRecentDenyEvent,
+    QueuedEvent,
+)
 
 
 if TYPE_CHECKING:
@@ -77,7 +83,7 @@ class FacilityAdmin(admin.ModelAdmin[Facility]):
     form = FacilityAdminForm
 
 
-EventT = TypeVar("EventT", bound=AllowEvent | DenyEvent)
+EventT = TypeVar("EventT", bound=AllowEvent | DenyEvent | QueuedEvent)
 
 
 def _filter_events_for_user(
@@ -132,3 +138,16 @@ class MostRecentDenyEventAdmin(admin.ModelAdmin[MostRecentDenyEvent]):
             event__facility__course__participations__roles__permissions__permission=PPerm.use_admin_interface)
 
     list_display = ["deny_uuid", "end"]
+
+
+@admin.register(QueuedEvent)
+class QueuedEventAdmin(admin.ModelAdmin[QueuedEvent]):
+    @override
+    def get_queryset(self, request: http.HttpRequest) -> QuerySet[QueuedEvent]:
+        assert request.user.is_authenticated
+
+        qs = super().get_queryset(request)
+        return _filter_events_for_user(qs, request.user)
+
+    list_display = ["id", "facility", "received_time"]
+    list_filter = ["facility"]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import json
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prairietest.models import Facility
+from prairietest.utils import INGEST_BATCH_SIZE, apply_queued_events, ingest_events
+
+
+def _read_events(f):
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise CommandError(f"{f.name}:{lineno}: {e}") from e
+
+
+class Command(BaseCommand):
+    help = (
+            "Applies a log of PrairieTest webhook events (one JSON payload "
+            "per line) to a facility, e.g. to recover from an outage. "
+            "Events that were already applied are skipped. Without log "
+            "files, applies the events queued for the facility.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("facility_identifier", metavar="FACILITY")
+        parser.add_argument("log_files", nargs="*", metavar="LOG_FILE",
+                help="Event logs to replay. Use '-' for standard input.")
+        parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE,
+                help="Number of events applied per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            facility = Facility.objects.get(
+                    identifier=options["facility_identifier"])
+        except Facility.DoesNotExist as e:
+            raise CommandError(
+                    f"No facility '{options['facility_identifier']}'") from e
+
+        batch_size = options["batch_size"]
+
+        if not options["log_files"]:
+            count = apply_queued_events(facility, batch_size=batch_size)
+            self.stdout.write(f"{count} queued events stored")
+            return
+
+        for log_file in options["log_files"]:
+            with (nullcontext(sys.stdin) if log_file == "-"
+                    else open(log_file)) as f:
+                try:
+                    count = ingest_events(facility, _read_events(f),
+                            batch_size=batch_size)
+                except (KeyError, ValueError) as e:
+                    raise CommandError(f"{log_file}: invalid event: {e}") from e
+
+            self.stdout.write(f"{log_file}: {count} events stored")
@@ -0,0 +1,41 @@
+# Generated by Django 6.1.2 on 2026-10-19 10:36
+
+from django.db import migrations
+
+
+def remove_duplicate_events(apps, schema_editor):
+    # Deliveries that raced past the old existence check may have been
+    # stored twice. Keep the first copy of each.
+    #
+    # This is kept apart from adding the unique constraints in the next
+    # migration, as PostgreSQL does not alter tables with foreign key checks
+    # from these deletions still pending in the same transaction.
+    from django.db.models import Count, Min
+
+    MostRecentDenyEvent = apps.get_model("prairietest", "MostRecentDenyEvent")
+
+    for model_name in ["AllowEvent", "DenyEvent"]:
+        Event = apps.get_model("prairietest", model_name)
+        for dup in (Event.objects
+                .values("facility_id", "event_id")
+                .annotate(first_id=Min("id"), count=Count("id"))
+                .filter(count__gt=1)):
+            dup_qs = (Event.objects
+                .filter(facility_id=dup["facility_id"], event_id=dup["event_id"])
+                .exclude(id=dup["first_id"]))
+            if model_name == "DenyEvent":
+                (MostRecentDenyEvent.objects
+                    .filter(event__in=dup_qs)
+                    .update(event_id=dup["first_id"]))
+            dup_qs.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prairietest', '0003_rename_test_facility_allowevent_facility_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.1.2 on 2026-10-19 10:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prairietest', '0004_remove_duplicate_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('payload', models.JSONField()),
+                ('received_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Received time')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='allowevent',
+            constraint=models.UniqueConstraint(fields=('facility', 'event_id'), name='prairietest_allowevent_unique_event'),
+        ),
+        migrations.AddConstraint(
+            model_name='denyevent',
+            constraint=models.UniqueConstraint(fields=('facility', 'event_id'), name='prairietest_denyevent_unique_event'),
+        ),
+        migrations.AddField(
+            model_name='queuedevent',
+            name='facility',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='prairietest.facility'),
+        ),
+    ]
@@ -27,10 +27,13 @@ THE SOFTWARE.
 
 from django.core.validators import RegexValidator
 from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 from course.models import Course
+from relate.utils import bump_cache_version_on_commit
 
 
 FACILITY_ID_REGEX = "(?P<facility_id>[a-zA-Z][a-zA-Z0-9_]*)"
@@ -92,6 +95,11 @@ class AllowEvent(Event):
             models.Index(fields=["user_uid", "exam_uuid", "start"]),
             models.Index(fields=["user_uid", "exam_uuid", "end"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["facility", "event_id"],
+                name="prairietest_allowevent_unique_event"),
+        ]
 
 
 class DenyEvent(Event):
@@ -111,6 +119,11 @@ class DenyEvent(Event):
             models.Index(fields=["deny_uuid", "start"]),
             models.Index(fields=["deny_uuid", "end"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["facility", "event_id"],
+                name="prairietest_denyevent_unique_event"),
+        ]
 
 
 class MostRecentDenyEvent(models.Model):
@@ -129,6 +142,21 @@ class MostRecentDenyEvent(models.Model):
         return f"PrairieTest current deny event with {self.deny_uuid}"
 
 
+class QueuedEvent(models.Model):
+    """A webhook payload that was accepted but not yet applied, see
+    :func:`prairietest.utils.apply_queued_events`.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE)
+    payload = models.JSONField()
+    received_time = models.DateTimeField(default=now,
+            verbose_name=_("Received time"))
+
+    def __str__(self) -> str:
+        return f"Queued PrairieTest event {self.id} for {self.facility.identifier}"
+
+
 def save_deny_event(devt: DenyEvent) -> None:
     with transaction.atomic():
         devt.save()
@@ -148,3 +176,17 @@ def save_deny_event(devt: DenyEvent) -> None:
             mrde.end = devt.end
             mrde.event = devt
             mrde.save()
+
+
+@receiver(post_save, sender=AllowEvent,
+        dispatch_uid="prairietest_allow_event_saved")
+@receiver(post_delete, sender=AllowEvent,
+        dispatch_uid="prairietest_allow_event_deleted")
+@receiver(post_save, sender=MostRecentDenyEvent,
+        dispatch_uid="prairietest_most_recent_deny_event_saved")
+@receiver(post_delete, sender=MostRecentDenyEvent,
+        dispatch_uid="prairietest_most_recent_deny_event_deleted")
+def _invalidate_prairietest_state(sender, instance, **kwargs) -> None:
+    from prairietest.utils import STATE_VERSION_CACHE_KEY
+
+    bump_cache_version_on_commit(STATE_VERSION_CACHE_KEY)
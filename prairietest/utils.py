@@ -40,23 +40,32 @@ resulting from their use.
 
 import hashlib
 import hmac
-import operator
 import time
+from dataclasses import dataclass
 from datetime import datetime
-from functools import lru_cache, reduce
 from ipaddress import IPv4Address, IPv4Network, IPv6Address, IPv6Network, ip_network
 from secrets import compare_digest
-from typing import TYPE_CHECKING
-from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, Any
+from uuid import UUID
 
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
 
 from course.models import Course
-from prairietest.models import AllowEvent, DenyEvent, MostRecentDenyEvent
+from prairietest.models import (
+    AllowEvent,
+    DenyEvent,
+    MostRecentDenyEvent,
+    QueuedEvent,
+    save_deny_event,
+)
+from relate.utils import bump_cache_version_on_commit, get_cache_version
 
 
 if TYPE_CHECKING:
-    from collections.abc import Collection, Mapping, Sequence
+    from collections.abc import Collection, Iterable, Mapping, Sequence
+
+    from prairietest.models import Facility
 
 
 # {{{ begin code copied from PrairieTest docs
@@ -129,6 +138,125 @@ def check_signature(
 # }}}
 
 
+# {{{ shared state with version counter
+
+# The version is bumped (see :func:`relate.utils.bump_cache_version`) whenever
+# allow or deny events change, so that the per-process snapshots below are
+# refreshed right away in every process that shares the default cache.
+STATE_VERSION_CACHE_KEY = "RELATE_PRAIRIETEST_STATE_VERSION"
+
+# Snapshots are also refreshed after this many seconds, in case the default
+# cache is not shared between processes (e.g. the local-memory cache).
+STATE_MAX_AGE = 60
+
+# Allow events are cached for at most this many exams per snapshot.
+MAX_CACHED_EXAMS = 64
+
+
+def _parse_networks(
+            cidr_blocks: Sequence[str]
+        ) -> frozenset[IPv4Network | IPv6Network]:
+    return frozenset(ip_network(cidr_block) for cidr_block in cidr_blocks)
+
+
+@dataclass(frozen=True)
+class _Denial:
+    course_id: int
+    facility_identifier: str
+    start: datetime
+    end: datetime
+    networks: frozenset[IPv4Network | IPv6Network]
+
+
+@dataclass(frozen=True)
+class _ExamAllows:
+    # in order of creation
+    by_user_uid: Mapping[str, Sequence[tuple[AllowEvent, frozenset[
+        IPv4Network | IPv6Network]]]]
+    by_user_uin: Mapping[str, Sequence[tuple[AllowEvent, frozenset[
+        IPv4Network | IPv6Network]]]]
+
+
+class PrairieTestState:
+    """A per-process snapshot of PrairieTest allow and deny events, with
+    CIDR blocks already parsed into networks. Obtain one through
+    :func:`get_state`.
+    """
+
+    def __init__(self, version: int | None) -> None:
+        from django.utils import timezone
+
+        self.version = version
+        self.load_time = time.monotonic()
+        self.load_datetime = timezone.now()
+
+        self._denials: list[_Denial] | None = None
+        self._exam_allows: dict[tuple[int, str], _ExamAllows] = {}
+
+    def is_stale(self, version: int | None) -> bool:
+        return (version is None
+                or version != self.version
+                or time.monotonic() - self.load_time > STATE_MAX_AGE)
+
+    def get_denials(self) -> Sequence[_Denial]:
+        """Return all denials that have not ended at :attr:`load_datetime`."""
+        denials = self._denials
+        if denials is None:
+            denials = self._denials = [
+                _Denial(
+                    course_id=mrde.event.facility.course_id,
+                    facility_identifier=mrde.event.facility.identifier,
+                    start=mrde.event.start,
+                    end=mrde.end,
+                    networks=_parse_networks(mrde.event.cidr_blocks))
+                for mrde in (MostRecentDenyEvent.objects
+                    .filter(end__gte=self.load_datetime)
+                    .select_related("event", "event__facility"))]
+        return denials
+
+    def get_exam_allows(self, course_id: int, exam_uuid: str) -> _ExamAllows:
+        key = (course_id, str(exam_uuid))
+        allows = self._exam_allows.get(key)
+        if allows is None:
+            by_user_uid: dict[str, list[tuple[
+                AllowEvent, frozenset[IPv4Network | IPv6Network]]]] = {}
+            by_user_uin: dict[str, list[tuple[
+                AllowEvent, frozenset[IPv4Network | IPv6Network]]]] = {}
+
+            for allow_event in (AllowEvent.objects
+                    .filter(facility__course=course_id, exam_uuid=exam_uuid)
+                    .order_by("created", "id")):
+                entry = (allow_event, _parse_networks(allow_event.cidr_blocks))
+                by_user_uid.setdefault(allow_event.user_uid, []).append(entry)
+                by_user_uin.setdefault(allow_event.user_uin, []).append(entry)
+
+            allows = _ExamAllows(by_user_uid=by_user_uid, by_user_uin=by_user_uin)
+
+            if len(self._exam_allows) >= MAX_CACHED_EXAMS:
+                self._exam_allows.clear()
+            self._exam_allows[key] = allows
+
+        return allows
+
+
+_state: PrairieTestState | None = None
+
+
+def get_state() -> PrairieTestState:
+    """Return the current per-process :class:`PrairieTestState`, replacing
+    it if events have changed since it was created.
+    """
+    global _state
+
+    version = get_cache_version(STATE_VERSION_CACHE_KEY)
+    state = _state
+    if state is None or state.is_stale(version):
+        state = _state = PrairieTestState(version)
+    return state
+
+# }}}
+
+
 def has_access_to_exam(
             course: Course,
             user_uid: str | None,
@@ -137,30 +265,28 @@ def has_access_to_exam(
             now: datetime,
             ip_address: IPv4Address | IPv6Address
         ) -> AllowEvent | None:
-    user_filters: list[Q] = []
+    allows = get_state().get_exam_allows(course.id, exam_uuid)
+
+    entries: list[tuple[AllowEvent, frozenset[IPv4Network | IPv6Network]]] = []
     if user_uid and "@" in user_uid:
-        user_filters.append(Q(user_uid=user_uid))
+        entries.extend(allows.by_user_uid.get(user_uid, []))
     if user_uin:
-        user_filters.append(Q(user_uin=user_uin))
-    if not user_filters:
+        entries.extend(allows.by_user_uin.get(user_uin, []))
+    if not entries:
         return None
-    user_filter = reduce(operator.or_, user_filters)
 
-    facility_id_to_most_recent_allow_event: dict[int, AllowEvent] = {}
-    for allow_event in AllowEvent.objects.filter(
-                facility__course=course,
-                exam_uuid=exam_uuid
-            ).filter(user_filter).order_by("created").prefetch_related("facility"):
-        facility_id_to_most_recent_allow_event[
-                allow_event.facility.id] = allow_event
+    facility_id_to_most_recent_allow: dict[
+            int, tuple[AllowEvent, frozenset[IPv4Network | IPv6Network]]] = {}
+    for allow_event, networks in sorted(
+            entries, key=lambda entry: (entry[0].created, entry[0].id)):
+        facility_id_to_most_recent_allow[
+                allow_event.facility_id] = (allow_event, networks)
 
-    for allow_event in facility_id_to_most_recent_allow_event.values():
+    for allow_event, networks in facility_id_to_most_recent_allow.values():
         if now < allow_event.start or allow_event.end < now:
             return None
 
-        if any(
-                ip_address in ip_network(cidr_block)
-                for cidr_block in allow_event.cidr_blocks):
+        if any(ip_address in network for network in networks):
             return allow_event
 
     return None
@@ -186,14 +312,11 @@ def denials_at(
 
 
 def _get_denials_at(
-            now_bucket: int,
+            now: datetime,
             course_id: int | None,
         ) -> Mapping[tuple[int, str], Collection[IPv6Network | IPv4Network]]:
-    from django.conf import settings
-    tz = ZoneInfo(settings.TIME_ZONE)
-
     deny_events = denials_at(
-        datetime.fromtimestamp(now_bucket, tz=tz),
+        now,
         Course.objects.get(id=course_id) if course_id is not None else None,
     )
     result: dict[tuple[int, str], set[IPv6Network | IPv4Network]] = {}
@@ -206,9 +329,6 @@ def _get_denials_at(
     return result
 
 
-_get_denials_at_cached = lru_cache(10)(_get_denials_at)
-
-
 def denied_ip_networks_at(
             now: datetime | None = None,
             course: Course | None = None,
@@ -222,12 +342,215 @@ def denied_ip_networks_at(
         from django.utils import timezone
         now = timezone.now()
 
+    course_id = course.id if course else None
+
     if not cache:
-        get_denials = _get_denials_at
-    else:
-        get_denials = _get_denials_at_cached
+        return _get_denials_at(now, course_id)
+
+    state = get_state()
+    if now < state.load_datetime:
+        # The snapshot does not include denials that ended before it was
+        # taken.
+        return _get_denials_at(now, course_id)
+
+    result: dict[tuple[int, str], frozenset[IPv6Network | IPv4Network]] = {}
+    for denial in state.get_denials():
+        if course_id is not None and denial.course_id != course_id:
+            continue
+        if not (denial.start <= now <= denial.end):
+            continue
+
+        key = (denial.course_id, denial.facility_identifier)
+        result[key] = result.get(key, frozenset()) | denial.networks
+
+    return result
+
 
-    return get_denials(
-        int(now.timestamp() // 60) * 60,
-        course.id if course else None,
+# {{{ event ingestion
+
+SUPPORTED_API_VERSION = "2023-07-18"
+
+# Events are applied in transactions of at most this many events.
+INGEST_BATCH_SIZE = 500
+
+
+def parse_event(
+            facility: Facility,
+            event: Mapping[str, Any],
+        ) -> AllowEvent | DenyEvent:
+    """Turn a webhook payload into an unsaved event.
+
+    :raises ValueError: if the payload has an unknown API version or event
+        type.
+    """
+    api_ver = event["api_version"]
+    if api_ver != SUPPORTED_API_VERSION:
+        raise ValueError(f"Unknown PrairieTest API version: {api_ver}")
+
+    evt_type = event["type"]
+    data = event["data"]
+
+    if evt_type == "allow_access":
+        return AllowEvent(
+            facility=facility,
+            event_id=UUID(event["id"]),
+            created=datetime.fromisoformat(event["created"]),
+            user_uid=data["user_uid"],
+            user_uin=data["user_uin"],
+            exam_uuid=UUID(data["exam_uuid"]),
+            start=datetime.fromisoformat(data["start"]),
+            end=datetime.fromisoformat(data["end"]),
+            cidr_blocks=data["cidr_blocks"],
+        )
+    elif evt_type == "deny_access":
+        return DenyEvent(
+            facility=facility,
+            event_id=UUID(event["id"]),
+            created=datetime.fromisoformat(event["created"]),
+            deny_uuid=UUID(data["deny_uuid"]),
+            start=datetime.fromisoformat(data["start"]),
+            end=datetime.fromisoformat(data["end"]),
+            cidr_blocks=data["cidr_blocks"],
         )
+    else:
+        raise ValueError(f"Unknown PrairieTest event type: {evt_type}")
+
+
+def _ingest_allow_events(
+            facility: Facility,
+            allow_events: Sequence[AllowEvent],
+        ) -> int:
+    # Only the most recent allow for a user and exam matters, so keep just
+    # that one, unless an even more recent one is already stored.
+    newest: dict[tuple[str, UUID], AllowEvent] = {}
+    for aevt in allow_events:
+        key = (aevt.user_uid, aevt.exam_uuid)
+        prev = newest.get(key)
+        if prev is None or prev.created < aevt.created:
+            newest[key] = aevt
+
+    stored_created = {
+        (user_uid, exam_uuid): created
+        for user_uid, exam_uuid, created in (AllowEvent.objects
+            .filter(
+                facility=facility,
+                user_uid__in={user_uid for user_uid, _ in newest},
+                exam_uuid__in={exam_uuid for _, exam_uuid in newest})
+            .values("user_uid", "exam_uuid")
+            .annotate(latest_created=Max("created"))
+            .values_list("user_uid", "exam_uuid", "latest_created"))}
+
+    new_events = [
+        aevt for key, aevt in newest.items()
+        if key not in stored_created or stored_created[key] < aevt.created]
+    if not new_events:
+        return 0
+
+    # The unique constraint on (facility, event_id) drops redeliveries that
+    # race with this batch.
+    AllowEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+
+    # bulk_create does not send post_save.
+    bump_cache_version_on_commit(STATE_VERSION_CACHE_KEY)
+
+    return len(new_events)
+
+
+def _ingest_deny_events(
+            facility: Facility,
+            deny_events: Sequence[DenyEvent],
+        ) -> int:
+    newest: dict[UUID, DenyEvent] = {}
+    for devt in deny_events:
+        prev = newest.get(devt.deny_uuid)
+        if prev is None or prev.created < devt.created:
+            newest[devt.deny_uuid] = devt
+
+    stored_created = dict(DenyEvent.objects
+            .filter(facility=facility, deny_uuid__in=newest)
+            .values("deny_uuid")
+            .annotate(latest_created=Max("created"))
+            .values_list("deny_uuid", "latest_created"))
+
+    count = 0
+    for deny_uuid, devt in newest.items():
+        if (deny_uuid in stored_created
+                and devt.created <= stored_created[deny_uuid]):
+            continue
+
+        try:
+            save_deny_event(devt)
+        except IntegrityError:
+            # redelivered concurrently
+            pass
+        else:
+            count += 1
+
+    return count
+
+
+def ingest_events(
+            facility: Facility,
+            events: Iterable[Mapping[str, Any]],
+            *, batch_size: int = INGEST_BATCH_SIZE,
+        ) -> int:
+    """Apply webhook payloads for *facility*, in transactions of
+    *batch_size* events each. Applying an event more than once has no
+    further effect, and the order of events does not matter: events that are
+    older than a stored event for the same user and exam (or the same denial)
+    are skipped.
+
+    :returns: the number of events stored.
+    :raises ValueError: see :func:`parse_event`.
+    """
+    count = 0
+
+    def flush(batch: list[AllowEvent | DenyEvent]) -> int:
+        with transaction.atomic():
+            return (
+                _ingest_allow_events(facility,
+                    [evt for evt in batch if isinstance(evt, AllowEvent)])
+                + _ingest_deny_events(facility,
+                    [evt for evt in batch if isinstance(evt, DenyEvent)]))
+
+    batch: list[AllowEvent | DenyEvent] = []
+    for event in events:
+        batch.append(parse_event(facility, event))
+        if len(batch) >= batch_size:
+            count += flush(batch)
+            batch = []
+
+    if batch:
+        count += flush(batch)
+
+    return count
+
+
+def apply_queued_events(
+            facility: Facility,
+            *, batch_size: int = INGEST_BATCH_SIZE,
+        ) -> int:
+    """Apply and remove the :class:`~prairietest.models.QueuedEvent` objects
+    of *facility*.
+
+    :returns: the number of events stored.
+    """
+    count = 0
+    while True:
+        with transaction.atomic():
+            queued = list(QueuedEvent.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(facility=facility)
+                    .order_by("id")[:batch_size])
+            if not queued:
+                break
+
+            count += ingest_events(
+                    facility, [qevt.payload for qevt in queued],
+                    batch_size=batch_size)
+            QueuedEvent.objects.filter(
+                    id__in=[qevt.id for qevt in queued]).delete()
+
+    return count
+
+# }}}
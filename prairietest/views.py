@@ -24,20 +24,16 @@ THE SOFTWARE.
 """
 
 import json
-from datetime import datetime
 
 from django import http
+from django.conf import settings
 from django.core.exceptions import BadRequest, SuspiciousOperation
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 
-from prairietest.models import (
-    AllowEvent,
-    DenyEvent,
-    Facility,
-    save_deny_event,
-)
-from prairietest.utils import check_signature
+from prairietest.models import Facility, QueuedEvent
+from prairietest.utils import check_signature, ingest_events, parse_event
 
 
 @csrf_exempt
@@ -59,72 +55,22 @@ def webhook(
         raise SuspiciousOperation(f"Invalid PrairieTest signature: {msg}")
 
     event = json.loads(body)
-    api_ver: str = event["api_version"]
-    if api_ver != "2023-07-18":
-        raise BadRequest(f"Unknown PrairieTest API version: {api_ver}")
-
-    event_id: str = event["id"]
-    if (
-                AllowEvent.objects.filter(
-                    facility=facility, event_id=event_id).exists()
-                or DenyEvent.objects.filter(
-                    facility=facility, event_id=event_id).exists()
-            ):
-        return http.HttpResponse(b"OK", content_type="text/plain", status=200)
-
-    evt_type: str = event["type"]
-    created = datetime.fromisoformat(event["created"])
-    data = event["data"]
-
-    del event
-
-    if evt_type == "allow_access":
-        user_uid: str = data["user_uid"]
-        exam_uuid: str = data["exam_uuid"]
-
-        has_newer_allows = AllowEvent.objects.filter(
-            facility=facility,
-            user_uid=user_uid,
-            exam_uuid=exam_uuid,
-            created__gte=created,
-        ).exists()
-
-        if not has_newer_allows:
-            allow_evt = AllowEvent(
-                facility=facility,
-                event_id=event_id,
-                created=created,
-                user_uid=user_uid,
-                user_uin=data["user_uin"],
-                exam_uuid=exam_uuid,
-                start=datetime.fromisoformat(data["start"]),
-                end=datetime.fromisoformat(data["end"]),
-                cidr_blocks=data["cidr_blocks"],
-            )
-            allow_evt.save()
-
-        return http.HttpResponse(b"OK", content_type="text/plain", status=200)
-
-    elif evt_type == "deny_access":
-        deny_uuid = data["deny_uuid"]
-        has_newer_denies = DenyEvent.objects.filter(
-            facility=facility,
-            deny_uuid=deny_uuid,
-            created__gte=created,
-        ).exists()
-
-        if not has_newer_denies:
-            deny_evt = DenyEvent(
-                facility=facility,
-                event_id=event_id,
-                created=created,
-                deny_uuid=deny_uuid,
-                start=datetime.fromisoformat(data["start"]),
-                end=datetime.fromisoformat(data["end"]),
-                cidr_blocks=data["cidr_blocks"],
-            )
-            save_deny_event(deny_evt)
 
-        return http.HttpResponse(b"OK", content_type="text/plain", status=200)
-    else:
-        raise BadRequest(f"Unknown PrairieTest event type: {evt_type}")
+    try:
+        if getattr(settings, "RELATE_PRAIRIETEST_QUEUE_WEBHOOK_EVENTS", False):
+            from prairietest.tasks import apply_queued_prairietest_events
+
+            # Reject malformed events now rather than when applying the queue.
+            parse_event(facility, event)
+
+            QueuedEvent.objects.create(facility=facility, payload=event)
+            transaction.on_commit(
+                    lambda: apply_queued_prairietest_events.delay(facility.id))
+        else:
+            # Redeliveries are dropped by the unique constraint on
+            # (facility, event_id).
+            ingest_events(facility, [event])
+    except ValueError as e:
+        raise BadRequest(str(e)) from e
+
+    return http.HttpResponse(b"OK", content_type="text/plain", status=200)
@@ -265,6 +265,13 @@ urlpatterns = [
         + "/$",
         course.grades.download_all_submissions,
         name="relate-download_all_submissions"),
+    re_path(r"^course"
+        "/" + COURSE_ID_REGEX
+        + "/grading/submission-archive"
+        r"/(?P<archive_name>[-\w.]+)"
+        "/$",
+        course.grades.download_submission_archive,
+        name="relate-download_submission_archive"),
 
     re_path(r"^course"
         "/" + COURSE_ID_REGEX
@@ -526,6 +533,14 @@ urlpatterns = [
         + "/$",
         course.analytics.flow_analytics,
         name="relate-flow_analytics"),
+    re_path(r"^course"
+        "/" + COURSE_ID_REGEX
+        + "/flow-analytics"
+        "/" + FLOW_ID_REGEX
+        + "/refresh"
+        "/$",
+        course.analytics.refresh_flow_analytics,
+        name="relate-refresh_flow_analytics"),
     re_path(r"^course"
         "/" + COURSE_ID_REGEX
         + "/flow-analytics"
@@ -536,6 +551,19 @@ urlpatterns = [
         "/$",
         course.analytics.page_analytics,
         name="relate-page_analytics"),
+    re_path(r"^course"
+        "/" + COURSE_ID_REGEX
+        + "/code-run-statistics"
+        "/$",
+        course.analytics.code_run_statistics,
+        name="relate-code_run_statistics"),
+    re_path(r"^course"
+        "/" + COURSE_ID_REGEX
+        + "/code-run-statistics"
+        "/csv"
+        "/$",
+        course.analytics.export_code_run_statistics_csv,
+        name="relate-export_code_run_statistics_csv"),
 
     # }}}
 
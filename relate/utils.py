@@ -27,7 +27,9 @@ THE SOFTWARE.
 import datetime
 import multiprocessing
 import multiprocessing.connection
+import os
 import signal
+import threading
 from abc import ABC
 from contextlib import contextmanager
 from dataclasses import dataclass
@@ -49,6 +51,7 @@ from typing_extensions import Sentinel, TypeIs, deprecated, override
 
 if TYPE_CHECKING:
     from collections.abc import Callable, Collection, Mapping
+    from multiprocessing.context import ForkContext, SpawnContext
     from pathlib import Path
     from types import FrameType
 
@@ -316,6 +319,54 @@ def is_running_in_celery():
         return False
 
 
+# {{{ cache versions
+
+# A version counter kept in the default cache under a given key. Data derived
+# from the database is cached along with the version it was computed at, and
+# the version is bumped when that part of the database changes, which
+# invalidates the data in every process sharing the default cache.
+
+def get_cache_version(key: str) -> int | None:
+    """
+    :returns: the current version stored under *key*, or *None* if the
+        default cache does not keep values (e.g. the dummy cache).
+    """
+    from django.core.cache import caches
+    def_cache = caches["default"]
+
+    version = def_cache.get(key)
+    if version is None:
+        def_cache.add(key, 0, timeout=None)
+        version = def_cache.get(key)
+    return version
+
+
+def bump_cache_version(key: str) -> None:
+    from django.core.cache import caches
+    def_cache = caches["default"]
+
+    try:
+        def_cache.incr(key)
+    except ValueError:
+        # key not present
+        def_cache.add(key, 1, timeout=None)
+
+
+def bump_cache_version_on_commit(key: str) -> None:
+    """Bump the version stored under *key* for a change made in the current
+    transaction.
+    """
+    from django.db import transaction
+
+    # Bump right away, so that this process sees its own changes, and again
+    # after commit, so that no other process keeps data read before the
+    # changes became visible.
+    bump_cache_version(key)
+    transaction.on_commit(lambda: bump_cache_version(key))
+
+# }}}
+
+
 # {{{ call with timeout
 
 TIMED_OUT = Sentinel("TIMED_OUT")
@@ -369,14 +420,326 @@ def alarm(timeout: int):
         signal.alarm(0)
 
 
+# {{{ worker pool
+
+class WorkerPoolFull(RuntimeError):
+    pass
+
+
+def _worker_process_main(
+            conn: multiprocessing.connection.Connection,
+            handler: Callable[[Any], object],
+            initializer: Callable[..., object] | None,
+            initializer_args: tuple[Any, ...],
+        ) -> None:
+    if initializer is not None:
+        initializer(*initializer_args)
+
+    conn.send(None)
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        conn.send(handler(request))
+
+
+class WorkerProcess:
+    """A persistent process that passes requests sent to it to *handler*,
+    one at a time, and sends back what it returns. *initializer* is called
+    with *initializer_args* once, before the first request.
+
+    Under the ``spawn`` start method, *handler*, *initializer* and the
+    requests must be picklable.
+    """
+
+    def __init__(self,
+                mp_context: ForkContext | SpawnContext,
+                handler: Callable[[Any], object],
+                initializer: Callable[..., object] | None = None,
+                initializer_args: tuple[Any, ...] = (),
+            ) -> None:
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(
+                target=_worker_process_main,
+                args=(child_conn, handler, initializer, initializer_args),
+                daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self.ready = False
+        # whether the process owes us a reply
+        self.busy = False
+        self.use_count = 0
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def request(self, request: object, timeout: float) -> Any:
+        """
+        :returns: the response of the handler, or :data:`TIMED_OUT` if
+            there was none within *timeout* seconds (not counting the
+            startup of the process).
+        :raises EOFError: if the process died.
+        """
+        self.busy = True
+        if not self.ready:
+            self.conn.recv()
+            self.ready = True
+
+        self.use_count += 1
+        self.conn.send(request)
+        if not self.conn.poll(timeout):
+            return TIMED_OUT
+
+        response = self.conn.recv()
+        self.busy = False
+        return response
+
+    def kill(self) -> None:
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class WorkerPool:
+    """Up to *size* instances of :class:`WorkerProcess` made by
+    *make_worker*, started as needed and reused across requests.
+
+    A worker that still owes a reply when it is released (e.g. because its
+    request timed out, or the caller was interrupted), that died, or that
+    has handled *max_uses* requests is killed and replaced.
+
+    :arg max_waiting: the number of callers that may wait for a worker at
+        the same time. Beyond that, :meth:`acquire` raises
+        :exc:`WorkerPoolFull`. *None* for no limit.
+    """
+
+    def __init__(self,
+                make_worker: Callable[[], WorkerProcess],
+                size: int,
+                max_uses: int | None = None,
+                max_waiting: int | None = None,
+            ) -> None:
+        import queue
+
+        self.make_worker = make_worker
+        self.size = size
+        self.max_uses = max_uses
+        self.max_waiting = max_waiting
+
+        self._idle: queue.Queue[WorkerProcess] = queue.Queue()
+        self._lock = threading.Lock()
+        self._started_count = 0
+        self._waiting_count = 0
+        self._owner_pid = os.getpid()
+
+    def _check_fork(self) -> None:
+        # Workers (and their pipes) belong to the process that created
+        # them. If we got forked ourselves, start over.
+        if os.getpid() != self._owner_pid:
+            import queue
+            with self._lock:
+                self._idle = queue.Queue()
+                self._started_count = 0
+                self._waiting_count = 0
+                self._owner_pid = os.getpid()
+
+    def warm_up(self) -> None:
+        """Start all workers ahead of the first request."""
+        self._check_fork()
+        with self._lock:
+            while self._started_count < self.size:
+                self._idle.put(self.make_worker())
+                self._started_count += 1
+
+    def acquire(self, timeout: float | None = None) -> WorkerProcess:
+        """Return an idle worker, which must be handed back with
+        :meth:`release`.
+
+        :raises queue.Empty: if no worker became idle within *timeout*
+            seconds.
+        :raises WorkerPoolFull: if *max_waiting* callers are already
+            waiting.
+        """
+        import queue
+
+        self._check_fork()
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            if worker.is_alive():
+                return worker
+
+            # died while idle
+            worker.kill()
+            with self._lock:
+                self._started_count -= 1
+
+        with self._lock:
+            if self._started_count < self.size:
+                self._started_count += 1
+                start_new = True
+            elif (self.max_waiting is not None
+                    and self._waiting_count >= self.max_waiting):
+                raise WorkerPoolFull()
+            else:
+                start_new = False
+                self._waiting_count += 1
+
+        if start_new:
+            try:
+                return self.make_worker()
+            except Exception:
+                with self._lock:
+                    self._started_count -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        finally:
+            with self._lock:
+                self._waiting_count -= 1
+
+    def release(self, worker: WorkerProcess) -> None:
+        if (not worker.busy
+                and worker.is_alive()
+                and (self.max_uses is None
+                    or worker.use_count < self.max_uses)):
+            self._idle.put(worker)
+            return
+
+        worker.kill()
+
+        # Keep the pool warm: replace the retired worker right away.
+        try:
+            self._idle.put(self.make_worker())
+        except Exception:
+            with self._lock:
+                self._started_count -= 1
+
+    def shutdown(self) -> None:
+        """Terminate all idle workers."""
+        import queue
+
+        with self._lock:
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                worker.kill()
+                self._started_count -= 1
+
+# }}}
+
+
+# {{{ call with timeout pool
+
+# Modules imported by pool workers before they take on work, so that calls
+# do not pay for importing them.
+CALL_WITH_TIMEOUT_POOL_PRELOAD_MODULES = ("course.expr_evaluation",)
+
+
+def _import_modules(module_names: Collection[str]) -> None:
+    from importlib import import_module
+    for module_name in module_names:
+        import_module(module_name)
+
+
+def _call_in_worker(
+            request: tuple[Callable[..., object], tuple[Any, ...], dict[str, Any]]
+        ) -> object:
+    f, args, kwargs = request
+    try:
+        return f(*args, **kwargs)
+    except Exception as e:
+        return _RaisedException(e)
+
+
+class CallWithTimeoutPool:
+    """A fixed number of persistent worker processes that run functions
+    with a timeout. Unlike a process per call, workers import
+    *preload_modules* once, when they start. A worker whose call times out
+    (or that dies) is killed and replaced.
+
+    At most *max_queued* callers wait for a worker to become idle. Beyond
+    that, :meth:`call` raises :exc:`WorkerPoolFull`.
+    """
+
+    def __init__(self,
+                size: int = 2,
+                max_queued: int = 64,
+                preload_modules: Collection[str] = (
+                    CALL_WITH_TIMEOUT_POOL_PRELOAD_MODULES),
+            ) -> None:
+        from functools import partial
+
+        self.preload_modules = tuple(preload_modules)
+        self._pool = WorkerPool(
+                partial(WorkerProcess, MP_CONTEXT, _call_in_worker,
+                    _import_modules, (self.preload_modules,)),
+                size=size,
+                max_waiting=max_queued)
+        self._pool.warm_up()
+
+    def call(self,
+                timeout: float,
+                f: Callable[P, ResultT],
+                *args: P.args,
+                **kwargs: P.kwargs,
+            ) -> ResultT | TIMED_OUT:  # type: ignore[valid-type]
+        worker = self._pool.acquire()
+        try:
+            result = worker.request((f, args, kwargs), timeout)
+        finally:
+            self._pool.release(worker)
+
+        if isinstance(result, _RaisedException):
+            raise result.exc_value
+        return result
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+
+_call_with_timeout_pool: CallWithTimeoutPool | None = None
+_call_with_timeout_pool_lock = threading.Lock()
+
+
+def get_call_with_timeout_pool() -> CallWithTimeoutPool:
+    """Return this process's :class:`CallWithTimeoutPool`, configured by
+    ``RELATE_CALL_WITH_TIMEOUT_POOL``.
+    """
+    global _call_with_timeout_pool
+
+    with _call_with_timeout_pool_lock:
+        if _call_with_timeout_pool is None:
+            from django.conf import settings
+            pool_kwargs = getattr(settings, "RELATE_CALL_WITH_TIMEOUT_POOL", {})
+            _call_with_timeout_pool = CallWithTimeoutPool(**pool_kwargs)
+
+        return _call_with_timeout_pool
+
+# }}}
+
+
 def call_with_timeout(
             timeout: int,
             f: Callable[P, ResultT],
             *args: P.args,
             **kwargs: P.kwargs,
         ) -> ResultT | TIMED_OUT:  # type: ignore[valid-type]
-    if hasattr(signal, "alarm") and timeout >= 1:
+    if (hasattr(signal, "alarm") and timeout >= 1
+            and threading.current_thread() is threading.main_thread()):
         # Use alarm signal if supported and on Unix-like systems
+        # Note: signals can only be handled in the main thread.
         # Note: signal.alarm only works on Unix and with integer seconds.
         # Since timeout is float, we can only use it for integer timeouts,
         # or fallback if precision is required/platform is Windows.
@@ -394,6 +757,13 @@ def call_with_timeout(
         # grading failures.
         return f(*args, **kwargs)
 
+    try:
+        return get_call_with_timeout_pool().call(timeout, f, *args, **kwargs)
+    except WorkerPoolFull:
+        pass
+
+    # All pool workers are busy and the queue is full: fall back to a
+    # process of our own.
     parent_conn, child_conn = MP_CONTEXT.Pipe(duplex=False)
     p = MP_CONTEXT.Process(
             target=_call_with_timeout_worker,
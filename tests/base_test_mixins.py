@@ -2144,7 +2144,7 @@ class SingleCourseQuizPageTestMixin(SingleCoursePageTestMixin):
 
             import io
             if dl_file_extension:
-                buf = io.BytesIO(resp.content)
+                buf = io.BytesIO(resp.getvalue())
                 import zipfile
                 with zipfile.ZipFile(buf, "r") as zf:
                     assert zf.testzip() is None
@@ -8,6 +8,14 @@ from tests.factories import UserFactory
 # from pytest_factoryboy import register
 
 
+@pytest.fixture(autouse=True)
+def _clear_default_cache():
+    # Cached data (e.g. permissions) is keyed by database ids, which get
+    # reused once a test's database changes are rolled back.
+    from django.core.cache import caches
+    caches["default"].clear()
+
+
 @pytest.fixture
 def admin_user():
     yield UserFactory.create(
@@ -116,6 +116,36 @@ class HistogramTest(CoursesTestMixinBase, TestCase):
         his.add_data_point(value=50, weight=1.2)
         self.assertEqual(his.string_weights["(value smaller than min)"], 1.2)
 
+    def test_add_data_points(self):
+        his = analytics.Histogram(num_min_value=0, num_max_value=100)
+        his.add_data_points([5, 15, 15, None, "foo", 110, -1, 100])
+        his.add_data_points([95, "foo"], weights=[2, 0.5])
+
+        self.assertEqual(his.total_weight(), 10.5)
+        self.assertEqual(his.string_weights, {
+            "(None)": 1,
+            "foo": 1.5,
+            "(value greater than max)": 1,
+            "(value smaller than min)": 1,
+            })
+        self.assertEqual(
+            [(bin_info.title, bin_info.raw_weight)
+                for bin_info in his.get_bin_info_list()],
+            [("0.0", 1), ("10.0", 2)]
+            + [(str(10.0 * i), 0) for i in range(2, 9)]
+            + [("90.0", 3),
+               ("(None)", 1), ("(value greater than max)", 1),
+               ("(value smaller than min)", 1), ("foo", 1.5)])
+
+    def test_get_bin_info_list_out_of_bounds(self):
+        his = analytics.Histogram(num_bin_starts=[10, 20], num_max_value=30)
+        his.add_data_points([5, 10, 25, 30])
+        his.num_max_value = 25
+        self.assertEqual(
+            [(bin_info.title, bin_info.raw_weight)
+                for bin_info in his.get_bin_info_list()],
+            [("10", 1), ("20", 1), ("<out of bounds>", 2)])
+
     def test_get_bin_info_list_num_bin_starts_is_not_none(self):
         # just make sure it works
         his = analytics.Histogram(num_bin_starts=[2])
@@ -176,6 +206,547 @@ class PageAnswerStatsTest(CoursesTestMixinBase, TestCase):
         self.assertEqual(parsed, [None, None, None, None])
 
 
+class PageVisitAggregatesTestMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        from course.constants import ParticipationPermission as PPerm
+        from course.models import ParticipationRolePermission
+
+        cls.course = factories.CourseFactory()
+        cls.role = factories.ParticipationRoleFactory(course=cls.course)
+        ParticipationRolePermission.objects.get_or_create(
+                role=cls.role,
+                permission=PPerm.included_in_grade_statistics)
+
+    def make_participation(self, included=True):
+        if included:
+            return factories.ParticipationFactory(
+                    course=self.course, roles=[self.role])
+        return factories.ParticipationFactory(
+                course=self.course, roles=["auditor"])
+
+    def submit(self, session, page_data, answer, correctness, visit_time):
+        visit = factories.FlowPageVisitFactory(
+                page_data=page_data, flow_session=session,
+                is_submitted_answer=True, answer=answer,
+                visit_time=visit_time)
+        if correctness is not None:
+            factories.FlowPageVisitGradeFactory(
+                    visit=visit, correctness=correctness)
+        return visit
+
+    def get_aggregates(self, **kwargs):
+        kwargs.setdefault("restrict_to_first_attempt", False)
+        kwargs.setdefault("multiple_submit_pages", set())
+        return analytics._get_page_visit_aggregates(
+                mock.MagicMock(course=self.course), factories.DEFAULT_FLOW_ID,
+                **kwargs)
+
+
+class PageVisitAggregatesTest(PageVisitAggregatesTestMixin, TestCase):
+    """Test analytics._get_page_visit_aggregates."""
+
+    def test_aggregates(self):
+        from datetime import timedelta
+
+        from django.utils.timezone import now
+
+        t0 = now()
+        sessions = []
+        for i in range(2):
+            session = factories.FlowSessionFactory(
+                    participation=self.make_participation(),
+                    points=1 + 8*i, max_points=10)
+            sessions.append(session)
+            page_data = factories.FlowPageDataFactory(
+                    flow_session=session, group_id="g", page_id="p")
+            self.submit(session, page_data, {"answer": "a"}, 0.5, t0)
+            # latest grade wins
+            visit = self.submit(
+                    session, page_data, {"answer": "b"}, 0, t0 + timedelta(1))
+            factories.FlowPageVisitGradeFactory(
+                    visit=visit, correctness=1,
+                    grade_time=t0 + timedelta(2))
+            self.submit(session, page_data, None, 0, t0 + timedelta(3))
+
+        # not included in grade statistics
+        excluded_session = factories.FlowSessionFactory(
+                participation=self.make_participation(included=False))
+        self.submit(excluded_session,
+                factories.FlowPageDataFactory(
+                    flow_session=excluded_session, group_id="g",
+                    page_id="p"),
+                {"answer": "c"}, 1, t0)
+
+        # with two ranked sessions, they fall into Q1 and Q3
+        result = self.get_aggregates()
+        self.assertEqual(list(result), [("g", "p")])
+        page_aggr = result["g", "p"]
+        self.assertEqual(page_aggr.overall.total_count, 6)
+        self.assertEqual(page_aggr.overall.empty_count, 2)
+        self.assertEqual(page_aggr.overall.graded_count, 6)
+        self.assertAlmostEqual(page_aggr.overall.points, 3)
+        self.assertEqual(page_aggr.quartile_graded_counts, [3, 0, 3, 0])
+        self.assertEqual(page_aggr.quartile_points, [1.5, 0, 1.5, 0])
+
+        from django.db import connection
+        if not connection.features.can_distinct_on_fields:
+            return
+
+        result = self.get_aggregates(restrict_to_first_attempt=True)
+        self.assertEqual(result["g", "p"].overall.total_count, 2)
+        self.assertAlmostEqual(result["g", "p"].overall.points, 1)
+
+        result = self.get_aggregates(multiple_submit_pages={("g", "p")})
+        self.assertEqual(result["g", "p"].overall.total_count, 2)
+        self.assertEqual(result["g", "p"].overall.empty_count, 2)
+        self.assertAlmostEqual(result["g", "p"].overall.points, 0)
+
+    def test_no_visits(self):
+        self.assertEqual(self.get_aggregates(), {})
+
+
+@pytest.mark.slow
+class PageVisitAggregatesBenchmarkTest(PageVisitAggregatesTestMixin, TestCase):
+    """Aggregate a 200-page flow with 1,000 sessions. Run with ``--slow``."""
+
+    npages = 200
+    nsessions = 1000
+
+    def test_benchmark(self):
+        from time import perf_counter
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from course.models import FlowPageData, FlowPageVisit, FlowPageVisitGrade
+
+        participation = self.make_participation()
+        sessions = FlowSession.objects.bulk_create([
+                FlowSession(
+                    course=self.course, participation=participation,
+                    user=participation.user, flow_id=factories.DEFAULT_FLOW_ID,
+                    in_progress=False, points=i, max_points=self.nsessions)
+                for i in range(self.nsessions)])
+        page_data = FlowPageData.objects.bulk_create([
+                FlowPageData(
+                    flow_session=session, page_ordinal=i,
+                    page_type="TestPageType", group_id="g", page_id=f"p{i}",
+                    data={})
+                for session in sessions
+                for i in range(self.npages)])
+        visits = FlowPageVisit.objects.bulk_create([
+                FlowPageVisit(
+                    flow_session_id=pd.flow_session_id, page_data=pd,
+                    visit_time=pd.flow_session.start_time,
+                    is_submitted_answer=True,
+                    answer={"answer": pd.page_ordinal})
+                for pd in page_data])
+        FlowPageVisitGrade.objects.bulk_create([
+                FlowPageVisitGrade(
+                    visit=visit, grade_time=visit.visit_time,
+                    correctness=(visit.page_data.page_ordinal % 2))
+                for visit in visits])
+
+        start = perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            result = self.get_aggregates()
+        elapsed = perf_counter() - start
+
+        self.assertEqual(len(queries), 1)
+        self.assertLess(elapsed, 30)
+        self.assertEqual(len(result), self.npages)
+        self.assertEqual(
+                result["g", "p1"].overall.total_count, self.nsessions)
+        self.assertAlmostEqual(result["g", "p1"].overall.points, self.nsessions)
+        self.assertEqual(
+                result["g", "p1"].quartile_graded_counts,
+                [self.nsessions // 4] * 4)
+
+
+class SessionQuartileMapCacheTest(PageVisitAggregatesTestMixin, TestCase):
+    """Test ranking and caching in analytics.compute_session_quartile_map."""
+
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def make_session(self, points, max_points=10, participation=None):
+        return factories.FlowSessionFactory(
+                participation=participation or self.make_participation(),
+                points=points, max_points=max_points)
+
+    def get_quartile_map(self):
+        return analytics.compute_session_quartile_map(
+                mock.MagicMock(course=self.course), factories.DEFAULT_FLOW_ID)
+
+    def test_ranking(self):
+        sessions = [self.make_session(points) for points in [6, 1, 6, 9, 3, 8]]
+        self.make_session(None)
+        self.make_session(5, max_points=0)
+        self.make_session(10, participation=self.make_participation(
+            included=False))
+
+        self.assertEqual(self.get_quartile_map(), {
+            sessions[1].id: 0,
+            sessions[4].id: 0,
+            sessions[0].id: 1,
+            sessions[2].id: 2,
+            sessions[5].id: 2,
+            sessions[3].id: 3,
+            })
+
+    def test_cached_until_sessions_change(self):
+        session = self.make_session(5)
+        self.assertEqual(self.get_quartile_map(), {session.id: 0})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_quartile_map(), {session.id: 0})
+
+        new_session = self.make_session(1)
+        self.assertEqual(
+                self.get_quartile_map(), {new_session.id: 0, session.id: 2})
+
+        new_session.points = 9
+        new_session.save()
+        self.assertEqual(
+                self.get_quartile_map(), {session.id: 0, new_session.id: 2})
+
+
+class FlowAnalyticsSnapshotTest(PageVisitAggregatesTestMixin, TestCase):
+    """Test analytics.update_flow_analytics_snapshot and friends."""
+
+    def setUp(self):
+        super().setUp()
+        from types import SimpleNamespace
+
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.flow_desc = SimpleNamespace(groups=[
+            SimpleNamespace(id="g", pages=[
+                SimpleNamespace(id="p1"), SimpleNamespace(id="p2")])])
+        fake_get_flow_desc = mock.patch(
+                "course.analytics.get_flow_desc", return_value=self.flow_desc)
+        fake_get_flow_desc.start()
+        self.addCleanup(fake_get_flow_desc.stop)
+
+        self.mock_make_stats_list = self.patch(
+                "course.analytics.make_page_answer_stats_list",
+                side_effect=self.make_stats_list)
+        self.mock_make_distribution = self.patch(
+                "course.analytics.make_page_answer_distribution",
+                side_effect=self.make_distribution)
+
+        self.actx = analytics.AnalyticsContext(
+                course=self.course, repo=mock.MagicMock(),
+                course_commit_sha=b"abcdef")
+
+        self.session = factories.FlowSessionFactory(
+                participation=self.make_participation(), points=5, max_points=10)
+        self.page_data = {
+                page_id: factories.FlowPageDataFactory(
+                    flow_session=self.session, group_id="g", page_id=page_id)
+                for page_id in ["p1", "p2"]}
+
+    def patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        result = patcher.start()
+        self.addCleanup(patcher.stop)
+        return result
+
+    def make_stats_list(self, actx, flow_id, restrict_to_first_attempt,
+                pages=None):
+        return [
+                analytics.PageAnswerStats(
+                    group_id="g", page_id=page_id, title=f"<b>{page_id}</b>",
+                    average_correctness=0.5, average_emptiness=0,
+                    answer_count=1, total_count=1, url=None,
+                    quartile_correctness_list=[0.5, None, None, None])
+                for page_id in ["p1", "p2"]
+                if pages is None or ("g", page_id) in pages]
+
+    def make_distribution(self, actx, flow_id, group_id, page_id,
+                restrict_to_first_attempt):
+        from django.utils.safestring import mark_safe
+        return analytics.PageAnswerDistribution(
+                title=page_id, body="<p>body</p>",
+                answer_stats_list=[
+                    analytics.AnswerStats(
+                        normalized_answer=mark_safe("<pre>x</pre>"),
+                        correctness=1, count=1, percentage=100),
+                    analytics.AnswerStats(
+                        normalized_answer="a<b", correctness=None,
+                        count=1, percentage=100),
+                    ])
+
+    def update(self, **kwargs):
+        return analytics.update_flow_analytics_snapshot(
+                self.actx, factories.DEFAULT_FLOW_ID,
+                restrict_to_first_attempt=False, **kwargs)
+
+    def visit(self, page_id):
+        return factories.FlowPageVisitFactory(
+                page_data=self.page_data[page_id], is_submitted_answer=True)
+
+    def test_incremental_refresh(self):
+        self.visit("p1")
+        visit = self.visit("p2")
+
+        snapshot = self.update()
+        self.assertIsNone(self.mock_make_stats_list.call_args.kwargs["pages"])
+        self.assertEqual(snapshot.visit_watermark, visit.id)
+        self.assertEqual(snapshot.commit_sha, "abcdef")
+        self.assertEqual(
+                [page_stats["page_id"]
+                    for page_stats in snapshot.data["page_answer_stats"]],
+                ["p1", "p2"])
+        self.assertEqual(snapshot.data["grade_histogram"]["weight"], 1)
+
+        # nothing changed
+        self.mock_make_stats_list.reset_mock()
+        self.update()
+        self.mock_make_stats_list.assert_not_called()
+
+        # a new visit
+        visit = self.visit("p2")
+        snapshot = self.update()
+        self.assertEqual(
+                self.mock_make_stats_list.call_args.kwargs["pages"],
+                {("g", "p2")})
+        self.assertEqual(snapshot.visit_watermark, visit.id)
+        self.assertEqual(len(snapshot.data["page_answer_stats"]), 2)
+
+        # a new grade on an old visit
+        grade = factories.FlowPageVisitGradeFactory(visit=visit, correctness=1)
+        snapshot = self.update()
+        self.assertEqual(
+                self.mock_make_stats_list.call_args.kwargs["pages"],
+                {("g", "p2")})
+        self.assertEqual(snapshot.grade_watermark, grade.id)
+
+        # a new revision
+        self.actx = analytics.AnalyticsContext(
+                course=self.course, repo=mock.MagicMock(),
+                course_commit_sha=b"012345")
+        snapshot = self.update()
+        self.assertIsNone(self.mock_make_stats_list.call_args.kwargs["pages"])
+        self.assertEqual(snapshot.commit_sha, "012345")
+
+    def test_page_answer_distributions(self):
+        from django.utils.safestring import SafeString
+
+        self.visit("p1")
+        snapshot = self.update()
+
+        pctx = mock.MagicMock(course=self.course)
+        distribution = analytics.get_snapshot_page_answer_distribution(
+                pctx, snapshot, "g", "p1")
+        self.assertEqual(self.mock_make_distribution.call_count, 1)
+
+        snapshot.refresh_from_db()
+        distribution = analytics.get_snapshot_page_answer_distribution(
+                pctx, snapshot, "g", "p1")
+        self.assertEqual(self.mock_make_distribution.call_count, 1)
+        self.assertEqual(
+                [astats.normalized_answer
+                    for astats in distribution.answer_stats_list],
+                ["<pre>x</pre>", "a&lt;b"])
+        self.assertIsInstance(
+                distribution.answer_stats_list[1].normalized_answer,
+                SafeString)
+
+        # only distributions that were looked at are refreshed
+        self.visit("p1")
+        self.visit("p2")
+        self.update()
+        self.assertEqual(
+                [call.args[2:4]
+                    for call in self.mock_make_distribution.call_args_list],
+                [("g", "p1"), ("g", "p1")])
+
+    def test_stored_histogram(self):
+        hist = analytics.Histogram(num_min_value=0, num_max_value=100)
+        for value in [10, 20, None, 200]:
+            hist.add_data_point(value)
+
+        stored = analytics.StoredHistogram.from_json(json.loads(json.dumps(
+                analytics.StoredHistogram.from_histogram(hist).to_json())))
+        self.assertEqual(stored.total_weight(), 4)
+        self.assertEqual(stored.get_bin_info_list(), hist.get_bin_info_list())
+        self.assertEqual(stored.html(), hist.html())
+
+
+class FlowHistogramsTest(PageVisitAggregatesTestMixin, TestCase):
+    """Test analytics.make_grade_histogram and analytics.make_time_histogram."""
+
+    def test_histograms(self):
+        from datetime import timedelta
+
+        from django.utils.timezone import now
+
+        start_time = now() - timedelta(hours=2)
+        for points, max_points, minutes in [
+                (5, 10, 1), (10, 10, 10), (None, 10, 100), (3, 0, 100)]:
+            factories.FlowSessionFactory(
+                    participation=self.make_participation(),
+                    points=points, max_points=max_points,
+                    start_time=start_time,
+                    completion_time=start_time + timedelta(minutes=minutes))
+        factories.FlowSessionFactory(
+                participation=self.make_participation(),
+                in_progress=True, completion_time=None)
+
+        pctx = mock.MagicMock(course=self.course)
+
+        grade_weights = {
+                bin_info.title: bin_info.raw_weight
+                for bin_info in analytics.make_grade_histogram(
+                    pctx, factories.DEFAULT_FLOW_ID).get_bin_info_list()
+                if bin_info.raw_weight}
+        self.assertEqual(grade_weights, {
+            "50.0": 1, "90.0": 1, "(None)": 2, "<in progress>": 1})
+
+        time_hist = analytics.make_time_histogram(
+                pctx, factories.DEFAULT_FLOW_ID)
+        time_bins = time_hist.get_bin_info_list()
+        self.assertEqual(time_bins[0].title, "> 1.0 min")
+        self.assertEqual(time_bins[0].raw_weight, 1)
+        self.assertEqual(time_bins[-2].raw_weight, 2)
+        self.assertEqual(time_bins[-1].title, "<in progress>")
+        self.assertEqual(time_hist.total_weight(), 5)
+
+
+class PageAnswerDistributionTest(PageVisitAggregatesTestMixin, TestCase):
+    """Test analytics.make_page_answer_distribution and the normalized
+    answer cache.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from types import SimpleNamespace
+
+        from django.utils.safestring import mark_safe
+
+        self.page = mock.MagicMock()
+        self.page.normalized_answer.side_effect = (
+                lambda page_context, page_data, answer_data:
+                None if answer_data is None
+                else mark_safe("<b>safe</b>") if answer_data["answer"] == "safe"
+                else answer_data["answer"])
+        self.page.page_title.return_value = "Title"
+        self.page.analytic_view_body.return_value = "Body"
+
+        patcher = mock.patch("course.analytics.PageInstanceCache")
+        mock_page_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_page_cache.return_value.get_page.return_value = self.page
+
+        patcher = mock.patch("course.analytics.get_flow_desc",
+                return_value=SimpleNamespace(
+                    rules=SimpleNamespace(access=[])))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_pctx(self, commit_sha=b"abcdef"):
+        return analytics.AnalyticsContext(
+                course=self.course, repo=mock.MagicMock(),
+                course_commit_sha=commit_sha)
+
+    def submit(self, answer, grades=()):
+        session = factories.FlowSessionFactory(
+                participation=self.make_participation())
+        visit = factories.FlowPageVisitFactory(
+                page_data=factories.FlowPageDataFactory(flow_session=session),
+                is_submitted_answer=True,
+                answer=None if answer is None else {"answer": answer})
+        from datetime import timedelta
+        for i, (correctness, feedback) in enumerate(grades):
+            factories.FlowPageVisitGradeFactory(
+                    visit=visit, correctness=correctness,
+                    grade_time=visit.visit_time + timedelta(minutes=i),
+                    feedback=feedback)
+        return visit
+
+    def get_distribution(self, **kwargs):
+        return analytics.make_page_answer_distribution(
+                kwargs.pop("pctx", None) or self.get_pctx(),
+                factories.DEFAULT_FLOW_ID, "TestGroupId", "TestPageId",
+                restrict_to_first_attempt=False)
+
+    def get_counts(self, distribution):
+        return sorted(
+                (astats.normalized_answer, astats.correctness, astats.count)
+                for astats in distribution.answer_stats_list)
+
+    def test_distribution(self):
+        feedback = {"correctness": 1, "feedback": "good"}
+        self.submit("a<b", [(0, {"correctness": 0, "feedback": ""}),
+                            (1, feedback)])
+        self.submit("a<b", [(1, feedback)])
+        self.submit("safe", [(0.5, None)])
+        self.submit("c")
+        self.submit(None, [(0, {"correctness": 0, "feedback": ""})])
+
+        distribution = self.get_distribution()
+        self.assertEqual(distribution.title, "Title")
+        self.assertEqual(distribution.body, "Body")
+        self.assertEqual(self.get_counts(distribution), [
+            ("(No answer)", 0, 1),
+            ("<b>safe</b>", None, 1),
+            ("a&lt;b", 1, 2),
+            ("c", None, 1),
+            ])
+        self.assertEqual(distribution.answer_stats_list[0].percentage, 40)
+        self.assertEqual(self.page.normalized_answer.call_count, 5)
+
+        # normalized answers are cached
+        self.submit("c")
+        distribution = self.get_distribution()
+        self.assertEqual(self.page.normalized_answer.call_count, 6)
+        self.assertIn(("c", None, 2), self.get_counts(distribution))
+
+        # ... per revision
+        self.get_distribution(pctx=self.get_pctx(b"012345"))
+        self.assertEqual(self.page.normalized_answer.call_count, 12)
+
+    def test_no_visits(self):
+        distribution = self.get_distribution()
+        self.assertIsNone(distribution.title)
+        self.assertEqual(distribution.answer_stats_list, [])
+
+    def test_backfill_command(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from course.models import FlowPageVisitNormalizedAnswer
+
+        self.course.active_git_commit_sha = "abcdef"
+        self.course.save()
+        visits = [self.submit("a"), self.submit("b")]
+
+        stdout = StringIO()
+        with mock.patch(
+                "course.management.commands.normalizedanswers.get_course_repo"):
+            call_command("normalizedanswers", self.course.identifier,
+                    stdout=stdout)
+            self.assertIn("2 normalized answers written", stdout.getvalue())
+
+            call_command("normalizedanswers", stdout=stdout)
+            self.assertIn("0 normalized answers written", stdout.getvalue())
+
+        self.assertEqual(
+                sorted(FlowPageVisitNormalizedAnswer.objects
+                    .values_list("visit_id", "commit_sha", "normalized_answer")),
+                [(visits[0].id, "abcdef", "a"), (visits[1].id, "abcdef", "b")])
+
+
 @pytest.mark.slow
 class ComputeSessionQuartileMapTest(SingleCourseTestMixin, TestCase):
     """Test analytics.compute_session_quartile_map."""
@@ -465,4 +1036,77 @@ class FlowAnalyticsTest(SingleCourseQuizPageTestMixin, HackRepoMixin,
                 f"Flow '{self.flow_id}' was not found in the repository, but it exists in "  # ruff:ignore[line-too-long]
                     "the database--maybe it was deleted?")
 
+
+class CodeRunStatisticsTest(SingleCourseTestMixin, TestCase):
+    """test analytics.code_run_statistics and
+    analytics.export_code_run_statistics_csv"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        from course.models import CodeRunRecord
+        for flow_id, result, retry_count in [
+                ("quiz-test", "success", 0),
+                ("quiz-test", "timeout", 1),
+                (None, "success", 0)]:
+            CodeRunRecord.objects.create(
+                course=cls.course,
+                flow_id=flow_id,
+                page_id="addition",
+                backend="DockerRunnerBackend",
+                image="some-image",
+                exec_host="localhost",
+                result=result,
+                retry_count=retry_count,
+                total_time=1.5,
+                phase_timings={
+                    "container_create": 0.2,
+                    "ping_wait": 0.3,
+                    "execution": 1})
+
+    def get_url(self, name, flow_id=None):
+        url = reverse(name, args=(self.course.identifier,))
+        if flow_id is not None:
+            url += f"?flow_id={flow_id}"
+        return url
+
+    def test_no_pperm(self):
+        for name in ["relate-code_run_statistics",
+                     "relate-export_code_run_statistics_csv"]:
+            with self.temporarily_switch_to_user(self.student_participation.user):
+                resp = self.client.get(self.get_url(name))
+                self.assertEqual(resp.status_code, 403)
+
+    def test_view(self):
+        with self.temporarily_switch_to_user(self.instructor_participation.user):
+            resp = self.client.get(self.get_url("relate-code_run_statistics"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertResponseContextEqual(resp, "run_count", 3)
+
+        phases = [pstats.phase for pstats in resp.context["phase_stats_list"]]
+        self.assertEqual(phases,
+                ["container_create", "ping_wait", "execution", "total"])
+        self.assertEqual(resp.context["result_histogram"].string_weights,
+                {"success": 2, "timeout": 1})
+
+    def test_view_flow(self):
+        with self.temporarily_switch_to_user(self.instructor_participation.user):
+            resp = self.client.get(
+                self.get_url("relate-code_run_statistics", "quiz-test"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertResponseContextEqual(resp, "run_count", 2)
+        self.assertEqual(resp.context["retry_histogram"].string_weights,
+                {"0": 1, "1": 1})
+
+    def test_csv(self):
+        with self.temporarily_switch_to_user(self.instructor_participation.user):
+            resp = self.client.get(
+                self.get_url("relate-export_code_run_statistics_csv", "quiz-test"))
+        self.assertEqual(resp.status_code, 200)
+
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("time,flow_id,page_id"))
+
 # vim: fdm=marker
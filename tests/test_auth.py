@@ -2470,6 +2470,82 @@ class APIBearerTokenBackendTest(APITestMixin, TestCase):
             backend.get_user(10000))
 
 
+class FindMatchingTokenTest(TestCase):
+    # test find_matching_token and its cache of verified tokens
+
+    token_secret = "my0token0string"
+
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import caches
+        caches["default"].clear()
+
+        from django.contrib.auth.hashers import make_password
+        self.token = factories.AuthenticationTokenFactory()
+        self.token.token_hash = make_password(self.token_secret)
+        self.token.save()
+        self.course_identifier = self.token.participation.course.identifier
+        self.now = now()
+
+        patcher = mock.patch("django.contrib.auth.hashers.check_password",
+                wraps=check_password)
+        self.mock_check_password = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def find(self, secret=None):
+        from course.auth import find_matching_token
+        return find_matching_token(self.course_identifier, self.token.id,
+                secret or self.token_secret, self.now)
+
+    def test_verified_token_cached(self):
+        self.assertEqual(self.find(), self.token)
+        self.assertEqual(self.find(), self.token)
+        self.assertEqual(self.mock_check_password.call_count, 1)
+
+        # recording a use of the token keeps the cached verification
+        backend = APIBearerTokenBackend()
+        backend.authenticate(None, self.course_identifier, self.token.id,
+                self.token_secret, self.now)
+        self.assertEqual(self.find(), self.token)
+        self.assertEqual(self.mock_check_password.call_count, 1)
+
+    def test_wrong_secret_not_accepted_from_cache(self):
+        self.assertEqual(self.find(), self.token)
+        self.assertIsNone(self.find("not0the0secret"))
+        self.assertIsNone(self.find("not0the0secret"))
+        self.assertEqual(self.mock_check_password.call_count, 3)
+
+    def test_revocation(self):
+        self.assertEqual(self.find(), self.token)
+
+        self.token.revocation_time = self.now
+        self.token.save()
+        self.assertIsNone(self.find())
+
+        # also without signals
+        AuthenticationToken.objects.filter(pk=self.token.pk).update(
+                revocation_time=None)
+        self.assertEqual(self.find(), self.token)
+        AuthenticationToken.objects.filter(pk=self.token.pk).update(
+                revocation_time=self.now)
+        self.assertIsNone(self.find())
+
+    def test_valid_until_change(self):
+        from datetime import timedelta
+
+        self.assertEqual(self.find(), self.token)
+        self.assertEqual(self.mock_check_password.call_count, 1)
+
+        AuthenticationToken.objects.filter(pk=self.token.pk).update(
+                valid_until=self.now - timedelta(minutes=1))
+        self.assertIsNone(self.find())
+
+        AuthenticationToken.objects.filter(pk=self.token.pk).update(
+                valid_until=self.now + timedelta(minutes=1))
+        self.assertEqual(self.find(), self.token)
+        self.assertEqual(self.mock_check_password.call_count, 3)
+
+
 class APIContextTest(APITestMixin, TestCase):
     # test APIContext
 
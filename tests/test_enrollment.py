@@ -35,6 +35,7 @@ from django.urls import reverse
 
 from course import constants, enrollment
 from course.constants import (
+    ParticipationPermission as PPerm,
     ParticipationStatus as PStatus,
     UserStatus as UStatus,
 )
@@ -1534,6 +1535,466 @@ class EnrollmentDecisionEmailConnectionsTest(
     # }}}
 
 
+class BulkPreapprovalsTest(TestCase):
+    # test enrollment.add_preapprovals and enrollment.decide_enrollment
+
+    def setUp(self):
+        super().setUp()
+        self.course = factories.CourseFactory()
+        self.student_role = ParticipationRole.objects.get(
+                course=self.course, identifier="student")
+        mail.outbox = []
+
+        patcher = mock.patch("course.enrollment.get_enrollment_mail_connection",
+                wraps=enrollment.get_enrollment_mail_connection)
+        self.mock_get_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_add_roster(self):
+        import time
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        n_entries = 3000
+        entries = [f"student{i}@example.com" for i in range(n_entries)]
+
+        for i in range(100):
+            factories.ParticipationPreapprovalFactory(
+                    course=self.course, email=entries[i].upper())
+        pending = [
+                factories.ParticipationFactory(
+                    course=self.course, status=PStatus.requested,
+                    user=factories.UserFactory(email=entries[-i]))
+                for i in range(1, 21)]
+
+        start = time.monotonic()
+        with CaptureQueriesContext(connection) as ctx:
+            result = enrollment.add_preapprovals(
+                    self.course, "email", [*entries, "", entries[-1].upper()],
+                    [self.student_role])
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(result, (n_entries - 100, 101, 20))
+        self.assertLess(elapsed, 10)
+        # a few queries to look things up and insert in batches of 1000,
+        # plus saving each approved participation
+        self.assertLessEqual(
+                len(ctx.captured_queries), 12 + 3 * len(pending))
+
+        self.assertEqual(
+                ParticipationPreapproval.objects.filter(course=self.course)
+                .count(),
+                n_entries)
+        self.assertEqual(
+                ParticipationPreapproval.roles.through.objects
+                .filter(participationpreapproval__email__in=entries[100:],
+                    participationrole=self.student_role).count(),
+                n_entries - 100)
+        for participation in pending:
+            participation.refresh_from_db()
+            self.assertEqual(participation.status, PStatus.active)
+
+        self.assertEqual(len(mail.outbox), len(pending))
+        self.assertEqual(self.mock_get_connection.call_count, 1)
+
+    def test_require_verified_inst_id(self):
+        self.course.preapproval_require_verified_inst_id = True
+        self.course.save()
+
+        verified = factories.ParticipationFactory(
+                course=self.course, status=PStatus.requested,
+                user=factories.UserFactory(institutional_id_verified=True))
+        unverified = factories.ParticipationFactory(
+                course=self.course, status=PStatus.requested,
+                user=factories.UserFactory(institutional_id_verified=False))
+
+        result = enrollment.add_preapprovals(
+                self.course, "institutional_id",
+                [verified.user.institutional_id,
+                    unverified.user.institutional_id.upper()],
+                [self.student_role])
+        self.assertEqual(result, (2, 0, 1))
+
+        verified.refresh_from_db()
+        unverified.refresh_from_db()
+        self.assertEqual(verified.status, PStatus.active)
+        self.assertEqual(unverified.status, PStatus.requested)
+
+    def test_decide_enrollment(self):
+        requested = factories.ParticipationFactory.create_batch(
+                5, course=self.course, status=PStatus.requested)
+        active = factories.ParticipationFactory(course=self.course)
+
+        request = RequestFactory().get("/")
+        with mock.patch("course.enrollment.messages.add_message"
+                ) as mock_add_message:
+            enrollment.deny_enrollment(
+                    None, request, Participation.objects.filter(
+                        pk__in=[p.pk for p in [*requested, active]]))
+
+        mock_add_message.assert_called_once()
+        self.assertIn("5 requests processed", mock_add_message.call_args[0][2])
+
+        self.assertEqual(
+                set(Participation.objects.filter(status=PStatus.denied)),
+                set(requested))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(self.mock_get_connection.call_count, 1)
+
+
+class PermissionCacheTest(TestCase):
+    """Tests for the shared cache behind get_participation_permissions and
+    get_participation_role_identifiers
+    """
+    def setUp(self):
+        super().setUp()
+        self.course = factories.CourseFactory()
+        self.participation = factories.ParticipationFactory(course=self.course)
+        self.student_role = ParticipationRole.objects.get(
+                course=self.course, identifier="student")
+
+    def get_permissions(self, participation=None):
+        if participation is not None:
+            # a fresh instance, as for a new request
+            participation = Participation.objects.get(pk=participation.pk)
+        return enrollment.get_participation_permissions(
+                self.course, participation)
+
+    def get_role_identifiers(self, participation=None):
+        if participation is not None:
+            participation = Participation.objects.get(pk=participation.pk)
+        return enrollment.get_participation_role_identifiers(
+                self.course, participation)
+
+    def test_resolved_without_queries(self):
+        perms = self.get_permissions(self.participation)
+        self.assertIn((PPerm.access_files_for, "student"), perms)
+        unenrolled_perms = self.get_permissions()
+        self.assertIn((PPerm.access_files_for, "unenrolled"), unenrolled_perms)
+        self.assertEqual(
+                self.get_role_identifiers(self.participation), {"student"})
+        self.assertEqual(self.get_role_identifiers(), {"unenrolled"})
+
+        participation = Participation.objects.get(pk=self.participation.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(participation.permissions(), perms)
+            self.assertEqual(
+                    enrollment.get_participation_permissions(self.course, None),
+                    unenrolled_perms)
+            self.assertEqual(
+                    enrollment.get_participation_role_identifiers(
+                        self.course, participation),
+                    {"student"})
+            self.assertEqual(
+                    enrollment.get_participation_role_identifiers(
+                        self.course, None),
+                    {"unenrolled"})
+
+    def test_unenrolled_permissions_limited_to_course(self):
+        other_course = factories.CourseFactory(identifier="another-course")
+        other_unenrolled = ParticipationRole.objects.get(
+                course=other_course, identifier="unenrolled")
+        other_unenrolled.permissions.create(permission=PPerm.view_gradebook)
+
+        self.assertNotIn((PPerm.view_gradebook, None), self.get_permissions())
+
+    def test_invalidated_by_role_permission_change(self):
+        self.assertNotIn((PPerm.view_gradebook, None),
+                self.get_permissions(self.participation))
+
+        perm = self.student_role.permissions.create(
+                permission=PPerm.view_gradebook)
+        self.assertIn((PPerm.view_gradebook, None),
+                self.get_permissions(self.participation))
+
+        perm.delete()
+        self.assertNotIn((PPerm.view_gradebook, None),
+                self.get_permissions(self.participation))
+
+    def test_expires_without_invalidation(self):
+        # as if changed by another process, with a cache that is not shared
+        from course.models import PERMISSION_CACHE_MAX_AGE, ParticipationPermission
+
+        self.assertNotIn((PPerm.view_gradebook, None),
+                self.get_permissions(self.participation))
+
+        ParticipationPermission.objects.bulk_create([
+                ParticipationPermission(
+                    participation=self.participation,
+                    permission=PPerm.view_gradebook)])
+        self.assertNotIn((PPerm.view_gradebook, None),
+                self.get_permissions(self.participation))
+
+        import time
+        later = time.time() + PERMISSION_CACHE_MAX_AGE + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertIn((PPerm.view_gradebook, None),
+                    self.get_permissions(self.participation))
+
+    def test_invalidated_by_participation_permission_change(self):
+        self.assertNotIn((PPerm.view_gradebook, None),
+                self.get_permissions(self.participation))
+
+        self.participation.individual_permissions.create(
+                permission=PPerm.view_gradebook)
+        self.assertIn((PPerm.view_gradebook, None),
+                self.get_permissions(self.participation))
+
+    def test_invalidated_by_role_changes(self):
+        self.assertEqual(self.get_role_identifiers(), {"unenrolled"})
+        self.assertEqual(
+                self.get_role_identifiers(self.participation), {"student"})
+
+        ta_role = factories.ParticipationRoleFactory(
+                course=self.course, identifier="ta")
+        self.participation.roles.add(ta_role)
+        self.assertEqual(
+                self.get_role_identifiers(self.participation), {"student", "ta"})
+
+        # from the other side of the relation
+        ta_role.participation.remove(self.participation)
+        self.assertEqual(
+                self.get_role_identifiers(self.participation), {"student"})
+
+        ta_role.is_default_for_unenrolled = True
+        ta_role.save()
+        self.assertEqual(self.get_role_identifiers(), {"unenrolled", "ta"})
+
+
+class ParseQueryTest(TestCase):
+    # test enrollment.parse_query without a course repository
+
+    def setUp(self):
+        super().setUp()
+        self.course = factories.CourseFactory()
+        self.p_ab = factories.ParticipationFactory(
+                course=self.course, tags=["a", "b"])
+        self.p_a = factories.ParticipationFactory(
+                course=self.course, tags=["a"],
+                roles=["student", "ta"])
+        self.p_none = factories.ParticipationFactory(course=self.course)
+
+        factories.FlowSessionFactory(
+                participation=self.p_ab, flow_id="quiz", in_progress=False)
+        factories.FlowSessionFactory(
+                participation=self.p_ab, flow_id="exam", in_progress=True)
+        factories.FlowSessionFactory(
+                participation=self.p_a, flow_id="quiz", in_progress=True)
+
+    def query(self, expr):
+        return list(Participation.objects
+                .filter(course=self.course)
+                .filter(enrollment.parse_query(self.course, expr)))
+
+    def test_related_terms_combine(self):
+        self.assertEqual(self.query("tagged:a and tagged:b"), [self.p_ab])
+        self.assertEqual(
+                self.query("has-started:quiz and has-started:exam"), [self.p_ab])
+        self.assertEqual(
+                self.query("has-submitted:quiz has-started:exam"), [self.p_ab])
+        self.assertEqual(self.query("role:student role:teaching_assistant"),
+                [self.p_a])
+
+    def test_no_duplicates(self):
+        self.assertCountEqual(self.query("tagged:a or tagged:b"),
+                [self.p_ab, self.p_a])
+        self.assertCountEqual(self.query("has-started:quiz or has-started:exam"),
+                [self.p_ab, self.p_a])
+
+    def test_not(self):
+        self.assertEqual(self.query("not has-started:quiz"), [self.p_none])
+        self.assertCountEqual(self.query("not has-submitted:quiz"),
+                [self.p_a, self.p_none])
+        self.assertEqual(self.query("not tagged:a"), [self.p_none])
+
+    def test_limited_to_course(self):
+        other_course = factories.CourseFactory(identifier="another-course")
+        other = factories.ParticipationFactory(
+                course=other_course, user=self.p_none.user, tags=["a"])
+        factories.FlowSessionFactory(participation=other, flow_id="quiz")
+
+        self.assertCountEqual(self.query("tagged:a"), [self.p_ab, self.p_a])
+        self.assertCountEqual(self.query("has-started:quiz"),
+                [self.p_ab, self.p_a])
+
+    def test_view_paginates(self):
+        instructor = factories.ParticipationFactory(
+                course=self.course, roles=["instructor"])
+        self.client.force_login(instructor.user)
+
+        def post(max_count=10, **data):
+            with mock.patch("course.utils.get_course_repo"), \
+                    mock.patch("course.utils.get_course_commit_sha",
+                        return_value=b"abcdef"), \
+                    mock.patch(
+                        "course.enrollment.QUERY_PARTICIPATIONS_PAGE_SIZE", 1), \
+                    mock.patch(
+                        "course.enrollment.QUERY_PARTICIPATIONS_MAX_COUNT",
+                        max_count):
+                return self.client.post(
+                        reverse("relate-query_participations",
+                            args=(self.course.identifier,)),
+                        data={"queries": "tagged:a", "op": "apply_tag",
+                              **data})
+
+        first, second = sorted(
+                [self.p_ab, self.p_a], key=lambda p: p.user.username)
+
+        resp = post(page=2)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["result_page"].count, 2)
+        self.assertFalse(resp.context["result_page"].more)
+        self.assertEqual(resp.context["result"], [second])
+        self.assertContains(resp, "of 2 (page 2 of 2)")
+
+        # beyond the last page
+        resp = post(page=3)
+        self.assertEqual(resp.context["result_page"].number, 2)
+
+        # counting stops at the maximum count
+        resp = post(page=2, max_count=1)
+        self.assertEqual(resp.context["result_page"].count, 1)
+        self.assertTrue(resp.context["result_page"].more)
+        self.assertEqual(resp.context["result"], [second])
+        self.assertContains(resp, "of more than 1 (page 2)")
+
+        # operations apply to all results, not just the listed page
+        resp = post(apply="1", tag="c")
+        self.assertEqual(resp.status_code, 200)
+        self.assertCountEqual(self.query("tagged:c"), [self.p_ab, self.p_a])
+
+        # participations that already have the tag are left alone
+        resp = post(apply="1", tag="b", queries="tagged:a")
+        self.assertEqual(resp.status_code, 200)
+        self.assertCountEqual(self.query("tagged:b"), [self.p_ab, self.p_a])
+
+        # the listed page shows what the operation was applied to
+        resp = post(apply="1", tag="b", op="remove_tag", queries="tagged:b")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.query("tagged:b"), [])
+        self.assertEqual(resp.context["result"], [first])
+        self.assertNotIn("b",
+                {tag.name for tag in resp.context["result"][0].tags.all()})
+
+    def test_view_drops(self):
+        instructor = factories.ParticipationFactory(
+                course=self.course, roles=["instructor"])
+        self.client.force_login(instructor.user)
+
+        with mock.patch("course.utils.get_course_repo"), \
+                mock.patch("course.utils.get_course_commit_sha",
+                    return_value=b"abcdef"):
+            resp = self.client.post(
+                    reverse("relate-query_participations",
+                        args=(self.course.identifier,)),
+                    data={"queries": "status:active and tagged:b",
+                          "op": "drop", "apply": "1"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "Operation successful on 1 participations.")
+        self.p_ab.refresh_from_db()
+        self.assertEqual(self.p_ab.status, PStatus.dropped)
+        self.assertEqual(self.query("status:dropped"), [self.p_ab])
+
+        # still listed, although the query no longer matches it
+        self.assertEqual(resp.context["result"], [self.p_ab])
+
+    def test_unknown_names_not_created(self):
+        from course.models import ParticipationTag
+
+        n_tags = ParticipationTag.objects.count()
+        n_roles = ParticipationRole.objects.count()
+
+        self.assertEqual(self.query("tagged:nonexistent"), [])
+        self.assertEqual(self.query("role:nonexistent"), [])
+
+        self.assertEqual(ParticipationTag.objects.count(), n_tags)
+        self.assertEqual(ParticipationRole.objects.count(), n_roles)
+
+
+@pytest.mark.slow
+class ParseQueryBenchmarkTest(TestCase):
+    """Time representative participation queries on a course with 5000
+    participants. Run with ``--slow``.
+    """
+    n_participations = 5000
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        from course.models import FlowSession, ParticipationTag
+
+        cls.course = factories.CourseFactory()
+        student = ParticipationRole.objects.get(
+                course=cls.course, identifier="student")
+        tags = [ParticipationTag.objects.create(course=cls.course, name=f"tag{i}")
+                for i in range(10)]
+
+        users = get_user_model().objects.bulk_create(
+                factories.UserFactory.build_batch(cls.n_participations))
+        participations = Participation.objects.bulk_create(
+                factories.ParticipationFactory.build(course=cls.course, user=u)
+                for u in users)
+
+        Participation.roles.through.objects.bulk_create(
+                Participation.roles.through(
+                    participation=p, participationrole=student)
+                for p in participations)
+        Participation.tags.through.objects.bulk_create(
+                Participation.tags.through(participation=p, participationtag=tag)
+                for i, p in enumerate(participations)
+                for tag in tags[i % 3::3])
+
+        # every participant starts quiz0..quiz4, and submits every other one
+        FlowSession.objects.bulk_create(
+                factories.FlowSessionFactory.build(
+                    participation=p, flow_id=f"quiz{j}", in_progress=bool(j % 2))
+                for p in participations
+                for j in range(5))
+
+    def test_benchmark(self):
+        from time import perf_counter
+
+        from django.db.models import Q
+
+        def legacy_has_started(flow_id):
+            return (Q(flow_sessions__flow_id=flow_id)
+                    & Q(flow_sessions__course=self.course))
+
+        base_qset = Participation.objects.filter(course=self.course)
+
+        def run(qset):
+            start = perf_counter()
+            count = qset.count()
+            page = list(qset
+                    .order_by("user__username", "id")
+                    .select_related("user")
+                    [:enrollment.QUERY_PARTICIPATIONS_PAGE_SIZE])
+            return count, page, perf_counter() - start
+
+        for expr, legacy_q in [
+                ("has-started:quiz0", legacy_has_started("quiz0")),
+                ("has-started:quiz0 and has-started:quiz1", None),
+                ("has-submitted:quiz0 and not has-submitted:quiz1", None),
+                ("tagged:tag0 and (has-started:quiz3 or role:student)", None),
+                ("not has-started:nonexistent and status:active", None),
+                ("tagged:tag0 or tagged:tag1 or tagged:tag2", None),
+                ]:
+            count, page, elapsed = run(
+                    base_qset.filter(enrollment.parse_query(self.course, expr)))
+
+            if legacy_q is not None:
+                legacy_count, _legacy_page, _legacy_elapsed = run(
+                        base_qset.filter(legacy_q).distinct())
+                self.assertEqual(legacy_count, count)
+
+            self.assertEqual(
+                    len(page), min(count, enrollment.QUERY_PARTICIPATIONS_PAGE_SIZE))
+            self.assertLess(elapsed, 5)
+
+
 @pytest.mark.django_db
 class ParticipationQueryFormTest(unittest.TestCase):
     # test enrollment.ParticipationQueryForm
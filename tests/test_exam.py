@@ -27,6 +27,7 @@ import datetime
 import unittest
 from zoneinfo import ZoneInfo
 
+import pytest
 from django import http
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
@@ -277,6 +278,88 @@ class BatchIssueExamTicketsTest(ExamTestMixin, TestCase):
         self.assertAddMessageCalledWith("3 tickets issued.")
 
 
+class IssueExamTicketsTestMixin:
+    n_participations = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = factories.CourseFactory()
+        cls.exam = factories.ExamFactory(course=cls.course)
+        cls.creator = factories.UserFactory()
+
+        from django.contrib.auth import get_user_model
+
+        from course.models import Participation
+        users = get_user_model().objects.bulk_create(
+                factories.UserFactory.build_batch(cls.n_participations))
+        Participation.objects.bulk_create(
+                factories.ParticipationFactory.build(course=cls.course, user=u)
+                for u in users)
+
+    def get_participations(self):
+        from course.models import Participation
+        return (Participation.objects
+                .filter(course=self.course)
+                .select_related("user"))
+
+    def test_issue(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        prior_ticket = factories.ExamTicketFactory(
+            exam=self.exam,
+            participation=self.get_participations().first())
+
+        with CaptureQueriesContext(connection) as ctx:
+            tickets = exam.make_exam_tickets(
+                    self.exam, self.get_participations(), self.creator,
+                    valid_end_time=now() + timedelta(hours=2))
+            exam.save_exam_tickets(self.exam, tickets, revoke_prior=True)
+
+        # participations, existing codes, revocation, savepoints and one
+        # insert per 1000 tickets
+        self.assertLessEqual(len(ctx.captured_queries),
+                3 + 2 + self.n_participations // 1000 + 1)
+
+        new_tickets = ExamTicket.objects.filter(
+                exam=self.exam, state=constants.ExamTicketState.valid)
+        self.assertEqual(new_tickets.count(), self.n_participations)
+        codes = set(new_tickets.values_list("code", flat=True))
+        self.assertEqual(len(codes), self.n_participations)
+        prior_ticket.refresh_from_db()
+        self.assertEqual(prior_ticket.state, constants.ExamTicketState.revoked)
+        self.assertNotIn(prior_ticket.code, codes)
+
+
+class IssueExamTicketsTest(IssueExamTicketsTestMixin, TestCase):
+    """Tests for exam.make_exam_tickets and exam.save_exam_tickets
+    """
+
+    def test_gen_ticket_codes_avoids_collisions(self):
+        with mock.patch("course.exam.gen_ticket_code") as mock_gen:
+            mock_gen.side_effect = ["a", "b", "a", "c", "d"]
+            self.assertEqual(exam.gen_ticket_codes(2, exclude=["b"]), ["a", "c"])
+
+    def test_issue_with_fixed_code(self):
+        tickets = exam.make_exam_tickets(
+                self.exam, self.get_participations(), self.creator,
+                code="secret", require_login=True)
+        exam.save_exam_tickets(self.exam, tickets)
+
+        self.assertEqual(
+                set(ExamTicket.objects.values_list("code", "require_login")),
+                {("secret", True)})
+        self.assertEqual(ExamTicket.objects.count(), self.n_participations)
+
+
+@pytest.mark.slow
+class IssueManyExamTicketsTest(IssueExamTicketsTestMixin, TestCase):
+    """Issue tickets for 5,000 participants. Run with ``--slow``."""
+
+    n_participations = 5000
+
+
 @override_settings(RELATE_TICKET_MINUTES_VALID_AFTER_USE=120)
 class CheckExamTicketTest(ExamTestMixin, TestCase):
     def setUp(self):
@@ -814,6 +897,95 @@ class ExamFacilityMiddlewareTest(SingleCoursePageTestMixin,
             "your flow's access permissions.")
 
 
+class ExamLockdownStateTest(TestCase):
+    """Unit tests for the lockdown state cached by exam.ExamLockdownMiddleware
+    """
+    def setUp(self):
+        self.fs = factories.FlowSessionFactory()
+        self.middleware = exam.ExamLockdownMiddleware(
+                lambda request: http.HttpResponse())
+
+    def get_request(self, session):
+        from django.test import RequestFactory
+        request = RequestFactory().get("/")
+        request.session = session
+        return request
+
+    def test_lock_down_stores_state(self):
+        ticket = factories.ExamTicketFactory(
+                exam=factories.ExamFactory(course=self.fs.course),
+                participation=self.fs.participation,
+                valid_end_time=now() + timedelta(minutes=1))
+        session = {"relate_exam_ticket_pk_used_for_login": ticket.pk}
+
+        exam.lock_down_to_flow_session(self.get_request(session), self.fs)
+
+        self.assertEqual(session[constants.SESSION_LOCKED_TO_FLOW_PK], self.fs.pk)
+        state = session[constants.SESSION_EXAM_LOCKDOWN_STATE]
+        self.assertEqual(state["flow_id"], self.fs.flow_id)
+        self.assertEqual(state["course_identifier"], self.fs.course.identifier)
+        self.assertEqual(state["ticket_valid_end_time"],
+                ticket.valid_end_time.isoformat())
+        self.assertLessEqual(state["expires"], ticket.valid_end_time.timestamp())
+
+        # a fresh state for the same flow session is not rebuilt
+        with self.assertNumQueries(0):
+            exam.lock_down_to_flow_session(self.get_request(session), self.fs)
+
+    def test_check_without_queries(self):
+        from course.flow import view_flow_page
+        from course.views import home
+
+        session = {}
+        exam.lock_down_to_flow_session(self.get_request(session), self.fs)
+
+        with self.assertNumQueries(0):
+            request = self.get_request(session)
+            self.middleware(request)
+            self.assertTrue(request.relate_exam_lockdown)
+
+            self.assertIsNone(self.middleware.process_view(
+                request, view_flow_page, (),
+                {"course_identifier": self.fs.course.identifier,
+                 "flow_session_id": str(self.fs.pk), "page_ordinal": "0"}))
+
+            with mock.patch("django.contrib.messages.add_message"):
+                resp = self.middleware.process_view(
+                    request, view_flow_page, (),
+                    {"course_identifier": self.fs.course.identifier,
+                     "flow_session_id": str(self.fs.pk + 1),
+                     "page_ordinal": "0"})
+            self.assertEqual(resp.status_code, 302)
+
+            with mock.patch("django.contrib.messages.add_message"):
+                resp = self.middleware.process_view(request, home, (), {})
+            self.assertEqual(resp.status_code, 302)
+
+    def test_missing_or_stale_state_is_rebuilt(self):
+        from course.views import home
+
+        for state in [
+                None,
+                {"flow_session_pk": self.fs.pk, "flow_id": "stale",
+                 "course_identifier": "stale", "ticket_valid_end_time": None,
+                 "expires": 0},
+                ]:
+            with self.subTest(state=state):
+                session = {constants.SESSION_LOCKED_TO_FLOW_PK: self.fs.pk}
+                if state is not None:
+                    session[constants.SESSION_EXAM_LOCKDOWN_STATE] = state
+
+                with mock.patch("django.contrib.messages.add_message"):
+                    resp = self.middleware.process_view(
+                        self.get_request(session), home, (), {})
+
+                self.assertEqual(resp.status_code, 302)
+                self.assertIn(self.fs.course.identifier, resp.url)
+                self.assertEqual(
+                    session[constants.SESSION_EXAM_LOCKDOWN_STATE]["flow_id"],
+                    self.fs.flow_id)
+
+
 class ExamLockdownMiddlewareTest(SingleCoursePageTestMixin,
                                  MockAddMessageMixing, TestCase):
     """Integration tests for exam.ExamLockdownMiddleware
@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2026 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+__doc__ = """
+Load test for the start of an exam: students in several exams-only rooms
+check in with exam tickets and start a locked-down exam at about the same
+time, against a live server running the full middleware stack. Latency
+percentiles and query counts are reported per view.
+
+Run with::
+
+    python -m pytest --slow -s tests/test_exam_load.py
+
+The size of the storm is set through the environment:
+
+``RELATE_EXAM_LOAD_STUDENTS``
+    Number of students checking in (default 200).
+``RELATE_EXAM_LOAD_ROOMS``
+    Number of exams-only facilities they are spread over (default 8).
+``RELATE_EXAM_LOAD_CONCURRENCY``
+    Number of students checking in at the same time (default 32).
+``RELATE_EXAM_LOAD_PAGE_VIEWS``
+    Number of flow page views per student after starting (default 3).
+
+Room *n* is the facility ``room<n>`` with the address range
+``127.0.<n+1>.0/24``, and each student connects from an address in their
+room's range. This relies on the whole of ``127.0.0.0/8`` being routed to
+the loopback interface, as is the case on Linux.
+
+Latencies are only representative with the database used in production.
+With SQLite, the live server shares a single in-memory database connection
+between its threads, so requests are run one at a time.
+"""
+
+import http.client
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from typing import ClassVar
+from urllib.parse import urlencode, urlsplit
+
+import pytest
+from django.conf import settings
+from django.db import connection
+from django.test import LiveServerTestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+
+from course.constants import ExamTicketState
+from course.models import ExamTicket, FlowSession
+from course.repo import python_repo_class
+from tests import factories
+from tests.utils import make_pyclass_course
+
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+EXAM_FLOW_ID = "exam"
+N_EXAM_PAGES = 4
+
+
+def _get_int_from_env(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+N_STUDENTS = _get_int_from_env("RELATE_EXAM_LOAD_STUDENTS", 200)
+N_ROOMS = _get_int_from_env("RELATE_EXAM_LOAD_ROOMS", 8)
+CONCURRENCY = _get_int_from_env("RELATE_EXAM_LOAD_CONCURRENCY", 32)
+N_PAGE_VIEWS = _get_int_from_env("RELATE_EXAM_LOAD_PAGE_VIEWS", 3)
+
+
+# {{{ synthetic course
+
+def _make_exam_flow_yml() -> str:
+    pages = "".join(
+        f"""
+            -
+                type: TextQuestion
+                id: q{i}
+                value: 1
+                prompt: |
+
+                    # Question {i}
+
+                    What is {i} + {i}?
+                answers: ["<plain>{2*i}"]
+            """
+        for i in range(N_EXAM_PAGES))
+
+    return """
+            title: "Load test exam"
+            description: "Load test exam"
+
+            rules:
+                start:
+                -
+                    if_signed_in_with_matching_exam_ticket: True
+                    if_has_fewer_sessions_than: 1
+                    may_start_new_session: True
+                    may_list_existing_sessions: True
+                    lock_down_as_exam_session: True
+                -
+                    if_signed_in_with_matching_exam_ticket: True
+                    may_start_new_session: False
+                    may_list_existing_sessions: True
+                -
+                    may_start_new_session: False
+                    may_list_existing_sessions: False
+
+                access:
+                -
+                    if_signed_in_with_matching_exam_ticket: True
+                    permissions: [view, submit_answer, end_session,
+                        cannot_see_flow_result, lock_down_as_exam_session]
+                -
+                    permissions: []
+
+                grade_identifier: null
+
+            pages:
+            """ + pages
+
+
+@python_repo_class
+class ExamLoadCourse:
+    course_dot_yml: ClassVar[str] = """
+        content: "# Exam load test course"
+        """
+
+    class Flows:
+        exam_dot_yml: ClassVar[str] = _make_exam_flow_yml()
+
+# }}}
+
+
+# {{{ server side
+
+class QueryCountMiddleware:
+    """Reports the number of database queries made while handling a request
+    in the :data:`QUERY_COUNT_HEADER` response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+
+        response[QUERY_COUNT_HEADER] = str(count)
+        return response
+
+
+def _get_room_facilities(n_rooms: int):
+    return {
+        f"room{i}": {
+            "ip_ranges": [f"127.0.{i+1}.0/24"],
+            "exams_only": True,
+        }
+        for i in range(n_rooms)}
+
+# }}}
+
+
+# {{{ client side
+
+@dataclass(frozen=True)
+class Sample:
+    view: str
+    seconds: float
+    query_count: int | None
+
+
+@dataclass(frozen=True)
+class Student:
+    username: str
+    code: str
+    source_address: str
+
+
+class StormClient:
+    """A cookie-keeping HTTP client for one student, sending requests from
+    *source_address*.
+    """
+
+    def __init__(self, server_url: str, source_address: str) -> None:
+        parsed = urlsplit(server_url)
+        assert parsed.hostname is not None
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.source_address = source_address
+        self.cookies: dict[str, str] = {}
+        self.samples: list[Sample] = []
+
+    def request(
+                self, view: str, method: str, path: str,
+                data: dict[str, str] | None = None,
+            ) -> tuple[int, str | None]:
+        """
+        :returns: a tuple *(status, location)*.
+        """
+        headers = {}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                    f"{name}={value}" for name, value in self.cookies.items())
+
+        body = None
+        if data is not None:
+            data = {"csrfmiddlewaretoken": self.cookies.get(
+                settings.CSRF_COOKIE_NAME, ""), **data}
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        conn = http.client.HTTPConnection(
+                self.host, self.port, timeout=120,
+                source_address=(self.source_address, 0))
+        try:
+            start = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            seconds = time.perf_counter() - start
+        finally:
+            conn.close()
+
+        for header in response.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+
+        query_count = response.headers.get(QUERY_COUNT_HEADER)
+        self.samples.append(Sample(
+                view=view, seconds=seconds,
+                query_count=int(query_count) if query_count is not None else None))
+
+        return response.status, response.headers.get("Location")
+
+
+def _run_student(server_url: str, student: Student) -> list[Sample]:
+    client = StormClient(server_url, student.source_address)
+
+    def expect(status: int, expected: int, what: str) -> None:
+        if status != expected:
+            raise AssertionError(
+                    f"{student.username}: {what} returned {status}, "
+                    f"expected {expected}")
+
+    check_in_path = reverse("relate-check_in_for_exam")
+    status, _ = client.request("check_in_for_exam", "GET", check_in_path)
+    expect(status, 200, "check-in form")
+
+    status, start_path = client.request("check_in_for_exam", "POST", check_in_path,
+            {"username": student.username, "code": student.code})
+    expect(status, 302, "check-in")
+    assert start_path is not None
+
+    status, _ = client.request("view_start_flow", "GET", start_path)
+    expect(status, 200, "start page")
+
+    status, page_path = client.request("view_start_flow", "POST", start_path,
+            {"start": ""})
+    expect(status, 302, "flow start")
+    assert page_path is not None
+
+    page_path_prefix = page_path.rstrip("/").rsplit("/", 1)[0]
+    for i in range(N_PAGE_VIEWS):
+        status, _ = client.request("view_flow_page", "GET",
+                f"{page_path_prefix}/{i % N_EXAM_PAGES}/")
+        expect(status, 200, f"flow page {i % N_EXAM_PAGES}")
+
+    return client.samples
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    # nearest-rank
+    idx = max(0, min(len(sorted_values) - 1,
+            round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[idx]
+
+
+def format_report(samples: list[Sample], wall_seconds: float) -> str:
+    lines = [
+        f"{'view':<20} {'n':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+        f"{'max ms':>8} {'avg q':>6} {'max q':>6}"]
+
+    by_view: dict[str, list[Sample]] = {}
+    for sample in samples:
+        by_view.setdefault(sample.view, []).append(sample)
+
+    for view, view_samples in by_view.items():
+        latencies = sorted(1000*s.seconds for s in view_samples)
+        query_counts = [
+            s.query_count for s in view_samples if s.query_count is not None]
+        avg_queries = (sum(query_counts) / len(query_counts)
+                if query_counts else float("nan"))
+        max_queries = max(query_counts, default=-1)
+
+        lines.append(
+            f"{view:<20} {len(view_samples):>6} "
+            f"{_percentile(latencies, 50):>8.1f} "
+            f"{_percentile(latencies, 90):>8.1f} "
+            f"{_percentile(latencies, 99):>8.1f} "
+            f"{latencies[-1]:>8.1f} "
+            f"{avg_queries:>6.1f} {max_queries:>6}")
+
+    lines.append(
+            f"{len(samples)} requests in {wall_seconds:.1f} s "
+            f"({len(samples) / wall_seconds:.1f} requests/s)")
+
+    return "\n".join(lines)
+
+# }}}
+
+
+@pytest.mark.slow
+@override_settings(
+    MIDDLEWARE=(
+        "tests.test_exam_load.QueryCountMiddleware",
+        *settings.MIDDLEWARE),
+    RELATE_FACILITIES=_get_room_facilities(N_ROOMS),
+)
+class ExamCheckInLoadTest(LiveServerTestCase):
+    def setUp(self):
+        super().setUp()
+
+        owner = factories.UserFactory(is_staff=True, is_superuser=True)
+        self.course = make_pyclass_course(
+                ExamLoadCourse, owner, identifier="exam-load-test")
+        self.course.hidden = False
+        self.course.save()
+
+        right_now = now()
+        self.exam = factories.ExamFactory(
+                course=self.course,
+                description="Load test exam",
+                flow_id=EXAM_FLOW_ID,
+                no_exams_before=right_now - timedelta(hours=1),
+                no_exams_after=right_now + timedelta(hours=3))
+
+        self.students: list[Student] = []
+        for i in range(N_STUDENTS):
+            room = i % N_ROOMS
+            participation = factories.ParticipationFactory(course=self.course)
+            ticket = factories.ExamTicketFactory(
+                    exam=self.exam,
+                    participation=participation,
+                    code=f"loadtest{i:06d}",
+                    valid_start_time=right_now - timedelta(hours=1),
+                    valid_end_time=right_now + timedelta(hours=3),
+                    restrict_to_facility=f"room{room}")
+            self.students.append(Student(
+                    username=participation.user.username,
+                    code=ticket.code,
+                    source_address=f"127.0.{room+1}.{i // N_ROOMS % 250 + 2}"))
+
+    def test_check_in_storm(self):
+        concurrency = CONCURRENCY
+        if connection.vendor == "sqlite":
+            concurrency = 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            student_samples = list(executor.map(
+                    lambda student: _run_student(self.live_server_url, student),
+                    self.students))
+        wall_seconds = time.perf_counter() - start
+
+        samples = [sample for ss in student_samples for sample in ss]
+        print(f"\n{N_STUDENTS} students, {N_ROOMS} rooms, "
+                f"{concurrency} at a time, {connection.vendor} database")
+        print(format_report(samples, wall_seconds))
+
+        assert (FlowSession.objects.filter(
+                    course=self.course, flow_id=EXAM_FLOW_ID).count()
+                == N_STUDENTS)
+        assert (ExamTicket.objects.filter(
+                    exam=self.exam, state=ExamTicketState.used).count()
+                == N_STUDENTS)
+
+
+# vim: foldmethod=marker
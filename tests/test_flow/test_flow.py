@@ -4536,6 +4536,38 @@ class PostFlowPageTest(HackRepoMixin, SingleCourseQuizPageTestMixin, TestCase):
         self.assertEqual(
             self.mock_create_flow_page_visit.call_count, 0)
 
+    def test_saved_answer_not_normalized(self):
+        self.mock_get_pressed_button.return_value = "save"
+        with mock.patch(
+                "course.analytics.cache_normalized_answer"
+                ) as mock_cache_normalized_answer:
+            flow.post_flow_page(
+                self.flow_session, self.fpctx, self.request,
+                permissions=frozenset([FPerm.submit_answer, FPerm.change_answer]),
+                generates_grade=True)
+
+        self.assertEqual(mock_cache_normalized_answer.call_count, 0)
+
+    def test_normalized_answer_failure_logged(self):
+        self.mock_get_pressed_button.return_value = "submit"
+        self.fpctx.page.is_answer_gradable.return_value = False
+        with mock.patch(
+                "course.analytics.cache_normalized_answer",
+                side_effect=RuntimeError("my error")
+                ) as mock_cache_normalized_answer, \
+                mock.patch("course.flow.logger") as mock_logger:
+            flow.post_flow_page(
+                self.flow_session, self.fpctx, self.request,
+                permissions=frozenset([FPerm.submit_answer, FPerm.change_answer]),
+                generates_grade=True)
+
+        self.assertEqual(mock_cache_normalized_answer.call_count, 1)
+        self.assertEqual(mock_logger.exception.call_count, 1)
+
+        latest_answer_visit = models.FlowPageVisit.objects.last()
+        self.assertTrue(latest_answer_visit.is_submitted_answer)
+        self.assertEqual(latest_answer_visit.answer, {"answer": "hello"})
+
 
 class SendEmailAboutFlowPageTest(HackRepoMixin,
                                  SingleCourseQuizPageTestMixin, TestCase):
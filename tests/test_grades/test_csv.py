@@ -71,7 +71,7 @@ class ExportGradebook(GradesTestMixin, TestCase):
         self.student_gc.refresh_from_db()
 
     def assertResponseCsvResultEqual(self, resp, expected_result):  # ruff:ignore[invalid-function-name]
-        file_contents = StringIO(resp.content.decode())
+        file_contents = StringIO(resp.getvalue().decode())
         spamreader = csv.reader(file_contents)
         result = list(spamreader)
         self.assertEqual(result, expected_result)
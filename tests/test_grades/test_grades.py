@@ -1870,7 +1870,7 @@ class DownloadAllSubmissionsTest(SingleCourseQuizPageTestMixin,
         return f"{group_id}/{self.page_id}"
 
     def get_zip_file_buf_from_response(self, resp):
-        return io.BytesIO(resp.content)
+        return io.BytesIO(resp.getvalue())
 
     def assertDownloadedFileZippedExtensionCount(self, resp, extensions, counts):  # ruff:ignore[invalid-function-name]
 
@@ -1880,7 +1880,7 @@ class DownloadAllSubmissionsTest(SingleCourseQuizPageTestMixin,
         prefix, _zip_file = resp["Content-Disposition"].split("=")
         self.assertEqual(prefix, "attachment; filename")
         self.assertEqual(resp.get("Content-Type"), "application/zip")
-        buf = io.BytesIO(resp.content)
+        buf = io.BytesIO(resp.getvalue())
         import zipfile
         with zipfile.ZipFile(buf, "r") as zf:
             self.assertIsNone(zf.testzip())
@@ -2002,6 +2002,155 @@ class PointsEqualTest(unittest.TestCase):
         self.assertFalse(grades.points_equal(Decimal("1.11"), Decimal("1.12")))
 
 
+class StreamZipTest(unittest.TestCase):
+    # grades.stream_zip
+    def test(self):
+        import zipfile
+
+        entries = [("a.txt", b"hello"), ("b/c.bin", bytes(range(256)) * 100)]
+        chunks = list(grades.stream_zip(iter(entries)))
+
+        # one chunk per entry plus the central directory
+        self.assertEqual(len(chunks), 3)
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(
+                [(name, zf.read(name)) for name in zf.namelist()], entries)
+
+
+@pytest.mark.django_db
+class IterGradeTableTest(unittest.TestCase):
+    # grades.iter_grade_table
+    def test(self):
+        course = factories.CourseFactory()
+        ptpts = factories.ParticipationFactory.create_batch(size=3, course=course)
+        factories.ParticipationFactory(
+            course=course, status=constants.ParticipationStatus.dropped)
+
+        gopp1 = factories.GradingOpportunityFactory(
+            course=course, identifier="gopp1")
+        gopp2 = factories.GradingOpportunityFactory(
+            course=course, identifier="gopp2")
+
+        for ptpt, gopp, points in [
+                (ptpts[0], gopp2, 3), (ptpts[2], gopp1, 7), (ptpts[2], gopp2, 8)]:
+            factories.GradeChangeFactory(
+                participation=ptpt, opportunity=gopp, points=points,
+                max_points=10, flow_session=None)
+
+        rows = list(grades.iter_grade_table(
+            course, grades.get_gradebook_opportunities(course)))
+
+        self.assertEqual([ptpt for ptpt, _row in rows], ptpts)
+        self.assertEqual(
+            [[grade_info.grade_state_machine.stringify_machine_readable_state()
+              for grade_info in row]
+             for _ptpt, row in rows],
+            [["NONE", "30.000"], ["NONE", "NONE"], ["70.000", "80.000"]])
+
+
+@pytest.mark.django_db
+class GetAverageGradesTest(unittest.TestCase):
+    # grades.get_average_grades
+    def test(self):
+        course = factories.CourseFactory()
+        student_role, _created = models.ParticipationRole.objects.get_or_create(
+            course=course, identifier="student")
+        models.ParticipationRolePermission.objects.get_or_create(
+            role=student_role,
+            permission=PPerm.included_in_grade_statistics)
+        ptpts = factories.ParticipationFactory.create_batch(
+            size=3, course=course, roles=[student_role])
+        auditor = factories.ParticipationFactory(course=course, roles=["auditor"])
+
+        gopp1, gopp2, gopp3 = (
+            factories.GradingOpportunityFactory(
+                course=course, identifier=f"gopp{i}")
+            for i in range(1, 4))
+
+        for ptpt, gopp, points in [
+                (ptpts[0], gopp1, 3), (ptpts[1], gopp1, 6), (ptpts[2], gopp1, None),
+                (auditor, gopp1, 10), (ptpts[2], gopp2, 8), (auditor, gopp3, 1)]:
+            factories.GradeChangeFactory(
+                participation=ptpt, opportunity=gopp, points=points,
+                max_points=10, flow_session=None)
+
+        self.assertEqual(
+            grades.get_average_grades(course),
+            {gopp1.pk: (45, 2), gopp2.pk: (80, 1)})
+        self.assertEqual(
+            grades.get_average_grades(course, [gopp2]), {gopp2.pk: (80, 1)})
+        self.assertEqual(grades.average_grade(gopp3), (None, 0))
+
+
+@pytest.mark.django_db
+class IterSubmissionFilesTest(unittest.TestCase):
+    # grades.iter_submission_files
+    def setUp(self):
+        self.course = factories.CourseFactory()
+        self.ptpt1, self.ptpt2 = factories.ParticipationFactory.create_batch(
+            size=2, course=self.course)
+
+        t0 = now()
+
+        def add_visit(ptpt, answer, minutes):
+            page_data = factories.FlowPageDataFactory(
+                flow_session=factories.FlowSessionFactory(participation=ptpt))
+            return factories.FlowPageVisitFactory(
+                page_data=page_data, answer=answer, is_submitted_answer=True,
+                visit_time=t0 + timedelta(minutes=minutes))
+
+        self.visit1 = add_visit(self.ptpt1, {"answer": "first"}, 0)
+        add_visit(self.ptpt1, {"answer": "second"}, 1)
+        add_visit(self.ptpt1, None, 2)
+        add_visit(self.ptpt2, {"answer": "other"}, 3)
+
+        fake_page = mock.MagicMock()
+        fake_page.normalized_bytes_answer.side_effect = (
+            lambda page_context, page_data, answer_data:
+            None if answer_data is None
+            else (".txt", answer_data["answer"].encode()))
+
+        patcher = mock.patch("course.utils.PageInstanceCache")
+        self.mock_page_cache = patcher.start()
+        self.mock_page_cache.return_value.get_page.return_value = fake_page
+        self.addCleanup(patcher.stop)
+
+    def get_files(self, which_attempt, include_feedback=False):
+        visits = (models.FlowPageVisit.objects
+                  .filter(flow_session__course=self.course)
+                  .order_by("visit_time"))
+        return dict(grades.iter_submission_files(
+            self.course, mock.MagicMock(), "some_sha",
+            "flow", "TestGroupId", "TestPageId", visits,
+            which_attempt=which_attempt, include_feedback=include_feedback))
+
+    def test_last(self):
+        # the last visit without an answer is skipped
+        self.assertEqual(self.get_files("last"), {
+            f"{self.ptpt1.user.username}.txt": b"second",
+            f"{self.ptpt2.user.username}.txt": b"other",
+            })
+
+    def test_first(self):
+        self.assertEqual(self.get_files("first"), {
+            f"{self.ptpt1.user.username}.txt": b"first",
+            f"{self.ptpt2.user.username}.txt": b"other",
+            })
+
+    def test_all(self):
+        self.assertEqual(len(self.get_files("all")), 3)
+
+    def test_feedback(self):
+        factories.FlowPageVisitGradeFactory(
+            visit=self.visit1, correctness=0.5)
+
+        files = self.get_files("first", include_feedback=True)
+        feedback = files[f"{self.ptpt1.user.username}-feedback.txt"]
+        self.assertIn(b"scores: 0.5", feedback)
+
+
 @unittest.SkipTest
 class FixingTest(GradesTestMixin, TestCase):
     # currently skipped
@@ -710,4 +710,107 @@ class ShowGraderStatisticsTest(
             self.assertEqual(resp.status_code, 200)
 
 
+class GraderStatisticsTest(TestCase):
+    """Test grading.get_grader_statistics and its views, without a course
+    repository.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = factories.CourseFactory()
+        cls.instructor = factories.ParticipationFactory(
+                course=cls.course, roles=["instructor"]).user
+        cls.ta = factories.UserFactory(last_name="Assistant")
+        cls.other_grader = factories.UserFactory(last_name="Zebra")
+
+        cls.t0 = now() - timedelta(days=10)
+        session = factories.FlowSessionFactory(
+                participation=factories.ParticipationFactory(course=cls.course))
+
+        from itertools import count
+        seconds = count()
+
+        def grade(page_data, graders):
+            visit = factories.FlowPageVisitFactory(
+                    page_data=page_data, is_submitted_answer=True,
+                    visit_time=cls.t0 + timedelta(seconds=next(seconds)))
+            for days, grader in graders:
+                factories.FlowPageVisitGradeFactory(
+                        visit=visit, grader=grader,
+                        grade_time=cls.t0 + timedelta(days=days))
+
+        page0 = factories.FlowPageDataFactory(
+                flow_session=session, page_ordinal=0, group_id="main",
+                page_id="p0")
+        page1 = factories.FlowPageDataFactory(
+                flow_session=session, page_ordinal=1, group_id="main",
+                page_id="p1")
+
+        # re-graded by a different grader: only the latest grade counts
+        grade(page0, [(1, cls.other_grader), (2, cls.ta)])
+        grade(page0, [(1, cls.ta)])
+        # autograder grades are ignored
+        grade(page0, [(3, cls.ta), (4, None)])
+        grade(page1, [(5, cls.other_grader)])
+        grade(page1, [(6, None)])
+
+    def get_stats(self, **kwargs):
+        from course.grading import get_grader_statistics
+        return list(get_grader_statistics(
+                self.course, factories.DEFAULT_FLOW_ID, **kwargs))
+
+    def test_get_grader_statistics(self):
+        self.assertEqual(self.get_stats(), [
+            (0, "main", "p0", self.ta.id, 3),
+            (1, "main", "p1", self.other_grader.id, 1),
+            ])
+
+    def test_date_range(self):
+        self.assertEqual(
+                self.get_stats(
+                    start_time=self.t0 + timedelta(days=2),
+                    end_time=self.t0 + timedelta(days=5)),
+                [(0, "main", "p0", self.ta.id, 2)])
+
+    def get(self, **params):
+        from urllib.parse import urlencode
+
+        from django.urls import reverse
+
+        self.client.force_login(self.instructor)
+        with mock.patch("course.utils.get_course_repo"), \
+                mock.patch("course.utils.get_course_commit_sha",
+                    return_value=b"abcdef"):
+            return self.client.get(
+                    reverse("relate-show_grader_statistics", kwargs={
+                        "course_identifier": self.course.identifier,
+                        "flow_id": factories.DEFAULT_FLOW_ID,
+                        }) + "?" + urlencode(params))
+
+    def test_view(self):
+        resp = self.get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+                resp.context["graders"], [self.ta, self.other_grader])
+        self.assertEqual(resp.context["pages_stats_counts"], [
+            ((0, "main/p0"), [3, 0], 3),
+            ((1, "main/p1"), [0, 1], 1),
+            ])
+        self.assertEqual(resp.context["grader_counts"], [3, 1])
+
+    def test_export_csv(self):
+        resp = self.get(
+                start_time=(self.t0 + timedelta(days=4)).strftime("%Y-%m-%dT%H:%M"),
+                export_csv="Export CSV")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+                b"".join(resp.streaming_content).decode().splitlines(), [
+                    "page_ordinal,group_id,page_id,"
+                    "grader_username,grader_full_name,count",
+                    f"1,main,p1,{self.other_grader.username},"
+                    f"{self.other_grader.get_full_name()},1",
+                    ])
+
+
 # vim: fdm=marker
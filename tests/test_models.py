@@ -27,6 +27,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import io
 import threading
 import unittest
 from datetime import datetime, timedelta
@@ -836,6 +837,173 @@ class GradingChangeTest(RelateModelTestMixin, unittest.TestCase):
         self.assertIn(expected_error_msg, str(cm.exception))
 
 
+class GradeSummaryTest(RelateModelTestMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.participation = factories.ParticipationFactory(course=self.course)
+        self.opportunity = factories.GradingOpportunityFactory(
+            course=self.course, identifier="gopp1",
+            aggregation_strategy=constants.GradeAggregationStrategy.max_grade)
+
+    def add_grade(self, points, minutes, **kwargs):
+        kwargs.setdefault("state", constants.GradeStateChangeType.graded)
+        return factories.GradeChangeFactory(
+            opportunity=self.opportunity, participation=self.participation,
+            points=points, max_points=10, flow_session=None,
+            grade_time=now() + timedelta(minutes=minutes), **kwargs)
+
+    def get_summary(self):
+        return models.GradeSummary.objects.get(
+            opportunity=self.opportunity, participation=self.participation)
+
+    def test_updated_on_save_and_delete(self):
+        self.add_grade(5, 0)
+        gchange = self.add_grade(7, 1)
+
+        summary = self.get_summary()
+        self.assertEqual(summary.percentage(), 70)
+        self.assertEqual(summary.grade_change_count, 2)
+        self.assertEqual(summary.stringify_state(), "70.0% (/2)")
+        self.assertEqual(summary.stringify_machine_readable_state(), "70.000")
+
+        gchange.delete()
+        self.assertEqual(self.get_summary().percentage(), 50)
+
+        models.GradeChange.objects.all().delete()
+        self.assertFalse(models.GradeSummary.objects.exists())
+
+    def test_attempt_superseded(self):
+        self.add_grade(9, 0, attempt_id="main")
+        self.add_grade(3, 1, attempt_id="main")
+
+        summary = self.get_summary()
+        self.assertEqual(summary.percentage(), 30)
+        self.assertEqual(summary.valid_grade_count, 1)
+
+    def test_exempt_and_invalid_history(self):
+        self.add_grade(9, 0)
+        self.add_grade(None, 1, state=constants.GradeStateChangeType.exempt)
+        self.assertEqual(self.get_summary().stringify_state(), "(exempt)")
+        self.assertIsNone(self.get_summary().percentage())
+
+        # GradeStateMachine refuses grades after an exemption
+        self.add_grade(9, 2)
+        summary = self.get_summary()
+        self.assertIsNotNone(summary.error)
+        self.assertEqual(summary.stringify_machine_readable_state(), "ERROR")
+
+    def test_aggregation_strategy_change(self):
+        self.add_grade(5, 0)
+        self.add_grade(7, 1)
+
+        self.opportunity.aggregation_strategy = (
+            constants.GradeAggregationStrategy.use_earliest)
+        self.opportunity.save()
+        self.assertEqual(self.get_summary().percentage(), 50)
+
+    def test_check_and_rebuild(self):
+        self.add_grade(5, 0)
+        other = factories.ParticipationFactory(course=self.course)
+        factories.GradeChangeFactory(
+            opportunity=self.opportunity, participation=other,
+            points=8, max_points=10, flow_session=None)
+
+        self.assertEqual(
+            models.find_grade_summary_inconsistencies(self.course), [])
+
+        models.GradeSummary.objects.filter(
+            participation=self.participation).update(aggregate_percentage=10)
+        models.GradeSummary.objects.filter(participation=other).delete()
+
+        problems = models.find_grade_summary_inconsistencies(self.course)
+        self.assertEqual(len(problems), 2)
+        self.assertIn("aggregate_percentage", problems[0])
+        self.assertIn("summary missing", problems[1])
+
+        from django.core.management import CommandError, call_command
+        with self.assertRaises(CommandError):
+            call_command("gradesummaries", "check", self.course.identifier,
+                         stdout=io.StringIO())
+
+        self.assertEqual(models.rebuild_grade_summaries(self.course), 2)
+        self.assertEqual(
+            models.find_grade_summary_inconsistencies(self.course), [])
+        self.assertEqual(self.get_summary().percentage(), 50)
+
+    def test_rebuild_builds_missing_summaries(self):
+        from django.core.management import call_command
+
+        self.add_grade(5, 0)
+        other = factories.ParticipationFactory(course=self.course)
+        factories.GradeChangeFactory(
+            opportunity=self.opportunity, participation=other,
+            points=8, max_points=10, flow_session=None)
+
+        # as with grade history from before summaries existed
+        models.GradeSummary.objects.all().delete()
+
+        call_command("gradesummaries", "rebuild", stdout=io.StringIO())
+
+        self.assertEqual(models.GradeSummary.objects.count(), 2)
+        self.assertEqual(
+            models.find_grade_summary_inconsistencies(self.course), [])
+
+    def test_iter_grade_summaries(self):
+        self.add_grade(9, 0, attempt_id="main")
+        self.add_grade(3, 1, attempt_id="main")
+        self.add_grade(5, 2)
+        other = factories.ParticipationFactory(course=self.course)
+        factories.GradeChangeFactory(
+            opportunity=self.opportunity, participation=other,
+            points=None, max_points=10, flow_session=None,
+            state=constants.GradeStateChangeType.exempt)
+        factories.GradeChangeFactory(
+            opportunity=self.opportunity, participation=other,
+            points=8, max_points=10, flow_session=None,
+            grade_time=now() + timedelta(minutes=1))
+
+        compared_fields = [
+            "opportunity_id", "participation_id", "state",
+            "aggregate_percentage", "valid_grade_count", "grade_change_count",
+            "error"]
+
+        def get_fields(summaries):
+            return sorted(
+                tuple(getattr(summary, field) for field in compared_fields)
+                for summary in summaries)
+
+        stored = get_fields(models.GradeSummary.objects.all())
+        with mock.patch("course.models.GradeChange.__init__") as mock_init:
+            computed = get_fields(models.iter_grade_summaries(self.course))
+            self.assertEqual(
+                get_fields(models.iter_grade_summaries(
+                    self.course, self.opportunity, [other.pk])),
+                [stored[1]])
+        mock_init.assert_not_called()
+
+        self.assertEqual(computed, stored)
+        self.assertEqual(stored[0][3], 50)
+        self.assertIsNotNone(stored[1][6])
+
+    def test_grade_table_reads_summaries(self):
+        from course.grades import get_grade_table
+
+        self.add_grade(5, 0)
+        factories.GradingOpportunityFactory(
+            course=self.course, identifier="gopp2")
+
+        participations, opps, grade_table = get_grade_table(self.course)
+        self.assertEqual(participations, [self.participation])
+        self.assertEqual([opp.identifier for opp in opps], ["gopp1", "gopp2"])
+
+        row, = grade_table
+        self.assertEqual(row[0].grade_state_machine.percentage(), 50)
+        self.assertEqual(
+            row[1].grade_state_machine.stringify_machine_readable_state(),
+            "NONE")
+        self.assertTrue(models.GradeSummary.objects.exists())
+
+
 class InstantMessageTest(RelateModelTestMixin, unittest.TestCase):
     def test_unicode(self):
         user = factories.UserFactory()
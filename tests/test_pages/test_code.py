@@ -23,9 +23,11 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import os
 from socket import error as socket_error
 from typing import TYPE_CHECKING, cast
 
+import pytest
 from django.test import Client, RequestFactory, TestCase, override_settings
 
 from course.constants import MAX_EXTRA_CREDIT_FACTOR
@@ -1025,4 +1027,294 @@ class CodeQuestionWithHumanTextFeedbackSpecialCase(
         self.assertIn(
             "The autograder assigned 0/0 points.", feedback.feedback)
 
+
+@pytest.mark.skipif(not hasattr(os, "fork"),
+        reason="LocalProcessPoolBackend requires fork()")
+class LocalProcessPoolBackendTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        from course.page.code_runner import LocalProcessPoolBackend
+        self.backend = LocalProcessPoolBackend(
+                pool_size=1, max_runs_per_worker=3)
+        self.addCleanup(self.backend.shutdown)
+
+    def run_code(self, user_code, run_timeout=5, **kwargs):
+        from course.page.code_run_backend import RunRequest
+        return self.backend.run(
+                RunRequest(user_code=user_code, **kwargs), run_timeout)
+
+    def test_success(self):
+        response = self.run_code(
+                "c = a + b\nprint('hi')",
+                setup_code="a, b = 1, 2",
+                names_for_user=["a", "b"],
+                names_from_user=["c"],
+                test_code="feedback.check_scalar('c', 3, c)\n"
+                    "feedback.set_points(1)")
+        self.assertEqual(response.result, "success")
+        self.assertEqual(response.points, 1)
+        self.assertEqual(response.stdout, "hi\n")
+        self.assertEqual(response.exec_host, "localhost")
+
+    def test_user_error(self):
+        response = self.run_code("1/0")
+        self.assertEqual(response.result, "user_error")
+        self.assertIn("ZeroDivisionError", response.message)
+
+    def test_worker_reused_and_recycled(self):
+        pids = set()
+        for _i in range(6):
+            response = self.run_code("import os\nprint(os.getpid())")
+            self.assertEqual(response.result, "success")
+            pids.add(response.stdout)
+
+        # max_runs_per_worker=3
+        self.assertEqual(len(pids), 2)
+
+    def test_timeout_replaces_worker(self):
+        response = self.run_code("while True: pass", run_timeout=0.5)
+        self.assertEqual(response.result, "timeout")
+
+        response = self.run_code("c = 1")
+        self.assertEqual(response.result, "success")
+
+    def test_mem_limit(self):
+        from course.page.code_runner import LocalProcessPoolBackend
+        backend = LocalProcessPoolBackend(pool_size=1, mem_limit=50*10**6)
+        self.addCleanup(backend.shutdown)
+
+        from course.page.code_run_backend import RunRequest
+        response = backend.run(
+                RunRequest(user_code="x = bytearray(200*10**6)"), 5)
+        self.assertEqual(response.result, "user_error")
+        self.assertIn("MemoryError", response.message)
+
+    def test_get_code_runner_backend(self):
+        from course.page.code import DockerRunnerBackend
+        from course.page.code_runner import (
+            LocalProcessPoolBackend,
+            get_code_runner_backend,
+        )
+
+        local_config = {
+            "backend": "course.page.code_runner.LocalProcessPoolBackend",
+            "options": {"pool_size": 1},
+            }
+
+        with override_settings(RELATE_TRUSTED_CODE_RUNNER_BACKEND=local_config):
+            self.assertIsInstance(get_code_runner_backend(), DockerRunnerBackend)
+
+            backend = get_code_runner_backend(trusted=True)
+            self.assertIsInstance(backend, LocalProcessPoolBackend)
+            self.assertIs(get_code_runner_backend(trusted=True), backend)
+
+    def test_request_run_with_retries_uses_backend(self):
+        from course.page.code import request_run_with_retries
+        from course.page.code_run_backend import RunRequest
+
+        with mock.patch("course.page.code.request_run") as mock_request_run:
+            response = request_run_with_retries(
+                    RunRequest(user_code="c = 1"), run_timeout=5,
+                    backend=self.backend)
+            self.assertEqual(response.result, "success")
+            self.assertEqual(mock_request_run.call_count, 0)
+
+    def test_stats(self):
+        from course.page.code import request_run_with_retries
+        from course.page.code_run_backend import RunRequest, RunResponse
+        from course.page.code_runner import CodeRunStats
+
+        stats = CodeRunStats()
+        response = request_run_with_retries(
+                RunRequest(user_code="c = 1"), run_timeout=5,
+                backend=self.backend, stats=stats)
+        self.assertEqual(response.result, "success")
+        self.assertEqual(stats.retry_count, 0)
+        self.assertEqual(
+                set(stats.phase_timings), {"worker_wait", "execution"})
+        self.assertGreater(stats.total_time(), 0)
+
+        nuisance = RunResponse(result="uncaught_error",
+                traceback="http.client.RemoteDisconnected")
+        with mock.patch.object(self.backend, "run") as mock_run:
+            mock_run.side_effect = [nuisance, nuisance, RunResponse(result="success")]
+
+            stats = CodeRunStats()
+            response = request_run_with_retries(
+                    RunRequest(user_code="c = 1"), run_timeout=5,
+                    backend=self.backend, stats=stats)
+            self.assertEqual(response.result, "success")
+            self.assertEqual(stats.retry_count, 2)
+
+
+class LocalProcessPoolBackendConfigTest(TestCase):
+    def test_requires_fork(self):
+        from django.core.exceptions import ImproperlyConfigured
+
+        from course.page.code_runner import get_code_runner_backend
+
+        local_config = {
+            "backend": "course.page.code_runner.LocalProcessPoolBackend",
+            "options": {"pool_size": 1, "mem_limit": 1},
+            }
+
+        with mock.patch("course.page.code_runner.os") as mock_os, \
+                override_settings(RELATE_CODE_RUNNER_BACKEND=local_config):
+            del mock_os.fork
+            with self.assertRaises(ImproperlyConfigured):
+                get_code_runner_backend()
+
+
+class AdmissionControllerTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_pick_next_waiter(self):
+        from course.page.code_runner import _pick_next_waiter
+
+        state = {
+            "running": {"r1": ["exam-course", 100], "r2": ["exam-course", 100]},
+            "waiting": {
+                "w1": ["exam-course", 1, 100],
+                "w2": ["other-course", 3, 100],
+                "w3": ["other-course", 2, 100],
+                }}
+        self.assertEqual(_pick_next_waiter(state), "w3")
+
+        state["running"] = {}
+        self.assertEqual(_pick_next_waiter(state), "w1")
+
+        state["waiting"] = {}
+        self.assertIsNone(_pick_next_waiter(state))
+
+    def test_busy(self):
+        from course.page.code_runner import AdmissionController, CodeRunnerBusyError
+
+        controller = AdmissionController(
+                max_concurrent_runs=1, max_wait=0.2, poll_interval=0.05)
+
+        with controller.admit("host", "image", "course", lease_time=10):
+            with self.assertRaises(CodeRunnerBusyError):
+                with controller.admit("host", "image", "course", lease_time=10):
+                    pass
+
+            # separate limits for other hosts and images
+            with controller.admit("host", "other-image", "course", lease_time=10):
+                pass
+            with controller.admit("other-host", "image", "course", lease_time=10):
+                pass
+
+        # released
+        with controller.admit("host", "image", "course", lease_time=10):
+            pass
+
+    def test_lease_expiry(self):
+        from course.page.code_runner import AdmissionController
+
+        controller = AdmissionController(
+                max_concurrent_runs=1, max_wait=2, poll_interval=0.05)
+
+        # simulate a holder that died without releasing its slot
+        admission = controller.admit("host", "image", "course", lease_time=0.2)
+        admission.__enter__()
+
+        with controller.admit("host", "image", "course", lease_time=10):
+            pass
+
+    def test_waiter_admitted_after_release(self):
+        import threading
+        import time
+
+        from course.page.code_runner import AdmissionController
+
+        controller = AdmissionController(
+                max_concurrent_runs=1, max_wait=5, poll_interval=0.02)
+
+        order = []
+
+        def run(name, hold):
+            with controller.admit("host", "image", name, lease_time=10):
+                order.append(name)
+                time.sleep(hold)
+
+        holder = threading.Thread(target=run, args=("first", 0.3))
+        holder.start()
+        time.sleep(0.1)
+        run("second", 0)
+        holder.join()
+
+        self.assertEqual(order, ["first", "second"])
+
+    def test_admit_code_run(self):
+        from course.page.code import DockerRunnerBackend
+        from course.page.code_runner import (
+            CodeRunnerBusyError,
+            CodeRunStats,
+            admit_code_run,
+        )
+
+        backend = DockerRunnerBackend()
+        stats = CodeRunStats()
+
+        # not configured: no-op
+        with admit_code_run(backend, None, "course", 10, stats):
+            pass
+        self.assertNotIn("admission_wait", stats.phase_timings)
+
+        with override_settings(RELATE_CODE_RUN_ADMISSION={
+                "max_concurrent_runs": 1, "max_wait": 0.1}):
+            with admit_code_run(backend, None, "course", 10, stats):
+                with self.assertRaises(CodeRunnerBusyError):
+                    with admit_code_run(backend, None, "course", 10):
+                        pass
+
+        self.assertIn("admission_wait", stats.phase_timings)
+
+
+class WaitForContainerListeningTest(TestCase):
+    class FakeLogStream:
+        def __init__(self, chunks, block):
+            import threading
+            self.chunks = chunks
+            self.block = block
+            self.closed = threading.Event()
+
+        def __iter__(self):
+            yield from self.chunks
+            if self.block:
+                # like a container that has nothing more to say
+                self.closed.wait()
+                raise OSError("stream closed")
+
+        def close(self):
+            self.closed.set()
+
+    def wait(self, stream, timeout):
+        from time import time
+
+        from course.page.code import wait_for_container_listening
+
+        container = mock.MagicMock()
+        container.logs.return_value = stream
+        return wait_for_container_listening(container, time() + timeout)
+
+    def test_message_straddling_chunks(self):
+        stream = self.FakeLogStream([b"starting\nLISTEN", b"ING ON 9941"], True)
+        self.assertTrue(self.wait(stream, 5))
+        self.assertTrue(stream.closed.is_set())
+
+    def test_silent_container_respects_deadline(self):
+        from time import time
+
+        stream = self.FakeLogStream([], True)
+        start = time()
+        self.assertFalse(self.wait(stream, 0.3))
+        self.assertLess(time() - start, 3)
+        self.assertTrue(stream.closed.is_set())
+
+    def test_log_ends_without_message(self):
+        self.assertFalse(self.wait(self.FakeLogStream([b"oops"], False), 5))
+
 # vim: fdm=marker
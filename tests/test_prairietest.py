@@ -29,20 +29,39 @@ is unknown.
 """
 
 
+import hashlib
+import hmac
+import json
+import time
 from datetime import timedelta
-from ipaddress import ip_address
+from ipaddress import ip_address, ip_network
+from unittest import mock
 from uuid import uuid1
 
 import pytest
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import override_settings
+from django.urls import reverse
 from django.utils.timezone import now as tz_now
 
 from course.models import Course
-from prairietest.models import AllowEvent, DenyEvent, Facility, save_deny_event
+from prairietest.models import (
+    AllowEvent,
+    DenyEvent,
+    Facility,
+    MostRecentDenyEvent,
+    QueuedEvent,
+    save_deny_event,
+)
 from prairietest.utils import (
+    apply_queued_events,
     check_signature,
     denied_ip_networks_at,
     has_access_to_exam,
+    ingest_events,
 )
+from relate.utils import bump_cache_version
 
 
 # {{{ test signature checking against real-life PT data
@@ -167,6 +186,7 @@ def test_allow_event_processing(fix_facility):
 
     # override for shorter duration
     aevt.pk = None
+    aevt.event_id = uuid1()
     aevt.created = now + timedelta(minutes=1)
     aevt.end = now + timedelta(minutes=10)
     aevt.save()
@@ -180,6 +200,7 @@ def test_allow_event_processing(fix_facility):
 
     # no-op override from the past
     aevt.pk = None
+    aevt.event_id = uuid1()
     aevt.created = now - timedelta(minutes=1)
     aevt.end = now + timedelta(hours=1)
     aevt.save()
@@ -220,6 +241,7 @@ def test_deny_event_processing(fix_facility):
 
     # no-op override from the past
     devt.pk = None
+    devt.event_id = uuid1()
     devt.created = now - timedelta(minutes=1)
     devt.end = now + timedelta(minutes=30)
     save_deny_event(devt)
@@ -229,8 +251,248 @@ def test_deny_event_processing(fix_facility):
 
     # override from the future
     devt.pk = None
+    devt.event_id = uuid1()
     devt.created = now + timedelta(minutes=1)
     devt.end = now + timedelta(minutes=30)
     save_deny_event(devt)
 
     assert not denied_at(now + timedelta(minutes=42))
+
+
+@pytest.mark.django_db
+def test_allow_state_cache(fix_facility, django_assert_num_queries):
+    course = fix_facility.course
+    uid = "test@illinois.edu"
+    exam_uuid = str(uuid1())
+    now = tz_now()
+    ip_addr = ip_address("192.168.123.32")
+
+    assert not has_access_to_exam(course, uid, None, exam_uuid, now, ip_addr)
+
+    AllowEvent(
+        facility=fix_facility,
+        event_id=uuid1(),
+        created=now,
+        user_uid=uid,
+        user_uin="1234",
+        exam_uuid=exam_uuid,
+        start=now - timedelta(hours=1),
+        end=now + timedelta(hours=1),
+        cidr_blocks=["192.168.123.32/27"],
+        ).save()
+
+    # the new event applies at once
+    assert has_access_to_exam(course, uid, None, exam_uuid, now, ip_addr)
+
+    with django_assert_num_queries(0):
+        for _i in range(10):
+            assert has_access_to_exam(course, uid, None, exam_uuid, now, ip_addr)
+            assert not has_access_to_exam(
+                course, uid, None, exam_uuid, now, ip_address("10.0.0.1"))
+
+
+@pytest.mark.django_db
+def test_deny_state_cache(fix_facility, django_assert_num_queries):
+    import prairietest.utils as pt_utils
+
+    now = tz_now()
+    course = fix_facility.course
+
+    def deny(deny_uuid, created, start, end, cidr_blocks):
+        save_deny_event(DenyEvent(
+            facility=fix_facility,
+            event_id=uuid1(),
+            created=created,
+            deny_uuid=deny_uuid,
+            start=start,
+            end=end,
+            cidr_blocks=cidr_blocks))
+
+    deny_uuid = str(uuid1())
+    deny(deny_uuid, now, now - timedelta(hours=1), now + timedelta(hours=1),
+         ["192.168.123.32/27"])
+    deny(str(uuid1()), now, now + timedelta(minutes=10), now + timedelta(hours=1),
+         ["10.0.0.0/8"])
+
+    key = (course.id, "cbtf")
+    assert denied_ip_networks_at(now + timedelta(minutes=1)) == {
+        key: frozenset([ip_network("192.168.123.32/27")])}
+
+    with django_assert_num_queries(0):
+        assert denied_ip_networks_at(now + timedelta(minutes=20)) == {
+            key: frozenset([
+                ip_network("192.168.123.32/27"), ip_network("10.0.0.0/8")])}
+        assert denied_ip_networks_at(now + timedelta(minutes=1), course=course)
+        assert not denied_ip_networks_at(now + timedelta(hours=2))
+
+    # an override applies at once
+    deny(deny_uuid, now + timedelta(minutes=1),
+         now - timedelta(hours=1), now + timedelta(minutes=5),
+         ["192.168.123.32/27"])
+    assert not denied_ip_networks_at(now + timedelta(minutes=6))
+
+    # a bump from another process invalidates this process's snapshot
+    state = pt_utils.get_state()
+    assert pt_utils.get_state() is state
+    bump_cache_version(pt_utils.STATE_VERSION_CACHE_KEY)
+    assert pt_utils.get_state() is not state
+
+    # denials that ended before the snapshot was taken
+    assert denied_ip_networks_at(now - timedelta(minutes=1)) == {
+        key: frozenset([ip_network("192.168.123.32/27")])}
+
+
+# {{{ event ingestion
+
+def _allow_payload(created, user_uid, exam_uuid, end, event_id=None):
+    return {
+        "id": str(event_id or uuid1()),
+        "api_version": "2023-07-18",
+        "created": created.isoformat(),
+        "type": "allow_access",
+        "data": {
+            "end": end.isoformat(),
+            "start": (created - timedelta(minutes=5)).isoformat(),
+            "user_uid": user_uid,
+            "user_uin": "1234",
+            "exam_uuid": str(exam_uuid),
+            "cidr_blocks": ["0.0.0.0/0"],
+        },
+    }
+
+
+def _deny_payload(created, deny_uuid, end):
+    return {
+        "id": str(uuid1()),
+        "api_version": "2023-07-18",
+        "created": created.isoformat(),
+        "type": "deny_access",
+        "data": {
+            "end": end.isoformat(),
+            "start": (created - timedelta(minutes=5)).isoformat(),
+            "deny_uuid": str(deny_uuid),
+            "cidr_blocks": ["10.0.0.0/8"],
+        },
+    }
+
+
+def _post_webhook(client, facility, payload):
+    body = json.dumps(payload).encode()
+    timestamp = str(int(time.time()))
+    signature = hmac.new(
+            facility.secret.encode(), timestamp.encode() + b"." + body,
+            hashlib.sha256).hexdigest()
+    return client.post(
+            reverse("prairietest:webhook",
+                args=(facility.course.identifier, facility.identifier)),
+            data=body, content_type="application/json",
+            headers={"PrairieTest-Signature": f"t={timestamp},v1={signature}"})
+
+
+@pytest.mark.django_db
+def test_webhook_is_idempotent(fix_facility, client):
+    now = tz_now()
+    payload = _allow_payload(now, "test@illinois.edu", uuid1(),
+            now + timedelta(hours=1))
+
+    for _i in range(3):
+        resp = _post_webhook(client, fix_facility, payload)
+        assert resp.status_code == 200
+
+    assert AllowEvent.objects.count() == 1
+
+    deny_payload = _deny_payload(now, uuid1(), now + timedelta(hours=1))
+    for _i in range(2):
+        assert _post_webhook(client, fix_facility, deny_payload).status_code == 200
+    assert DenyEvent.objects.count() == 1
+    assert MostRecentDenyEvent.objects.count() == 1
+
+    bad_payload = {**payload, "api_version": "2020-01-01"}
+    assert _post_webhook(client, fix_facility, bad_payload).status_code == 400
+
+    # the database rejects redeliveries that bypass ingestion
+    aevt = AllowEvent.objects.get()
+    aevt.pk = None
+    with pytest.raises(IntegrityError), transaction.atomic():
+        aevt.save()
+
+
+@pytest.mark.django_db
+def test_ingest_events_batched(fix_facility, django_assert_max_num_queries):
+    now = tz_now()
+    exam_uuid = uuid1()
+    deny_uuid = uuid1()
+
+    payloads = [
+        _allow_payload(now + timedelta(seconds=i), f"user{i % 100}@illinois.edu",
+                exam_uuid, now + timedelta(hours=1, seconds=i))
+        for i in range(1000)]
+    payloads += [
+        _deny_payload(now + timedelta(seconds=i), deny_uuid,
+                now + timedelta(hours=1, seconds=i))
+        for i in range(5)]
+
+    # out of order, with redeliveries
+    payloads = payloads[::-1] + payloads[:50]
+
+    with django_assert_max_num_queries(40):
+        count = ingest_events(fix_facility, payloads, batch_size=400)
+
+    # only the most recent allow per user is kept
+    assert count == 100 + 1
+    assert AllowEvent.objects.count() == 100
+    assert (AllowEvent.objects.get(user_uid="user7@illinois.edu").created
+            == now + timedelta(seconds=907))
+    assert (MostRecentDenyEvent.objects.get(deny_uuid=deny_uuid).end
+            == now + timedelta(hours=1, seconds=4))
+
+    # replaying the same events changes nothing
+    assert ingest_events(fix_facility, payloads) == 0
+    assert AllowEvent.objects.count() == 100
+
+    ip_addr = ip_address("192.168.1.1")
+    assert has_access_to_exam(fix_facility.course, "user7@illinois.edu", None,
+            str(exam_uuid), now + timedelta(minutes=30), ip_addr)
+
+
+@pytest.mark.django_db
+def test_webhook_queue(fix_facility, client, django_capture_on_commit_callbacks):
+    now = tz_now()
+    payloads = [
+        _allow_payload(now, f"user{i}@illinois.edu", uuid1(),
+            now + timedelta(hours=1))
+        for i in range(3)]
+
+    with override_settings(RELATE_PRAIRIETEST_QUEUE_WEBHOOK_EVENTS=True), \
+            mock.patch("prairietest.tasks.apply_queued_prairietest_events.delay") \
+            as mock_delay, \
+            django_capture_on_commit_callbacks(execute=True):
+        for payload in [*payloads, payloads[0]]:
+            assert _post_webhook(client, fix_facility, payload).status_code == 200
+
+    mock_delay.assert_called_with(fix_facility.id)
+    assert QueuedEvent.objects.count() == 4
+    assert not AllowEvent.objects.exists()
+
+    assert apply_queued_events(fix_facility) == 3
+    assert not QueuedEvent.objects.exists()
+    assert AllowEvent.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_replay_command(fix_facility, tmp_path):
+    now = tz_now()
+    log_file = tmp_path / "events.jsonl"
+    log_file.write_text("\n".join(
+        json.dumps(_allow_payload(now, f"user{i}@illinois.edu", uuid1(),
+            now + timedelta(hours=1)))
+        for i in range(10)) + "\n")
+
+    call_command("replayprairietestevents", "cbtf", str(log_file),
+            "--batch-size", "3")
+    assert AllowEvent.objects.count() == 10
+
+    call_command("replayprairietestevents", "cbtf", str(log_file))
+    assert AllowEvent.objects.count() == 10
+
+# }}}
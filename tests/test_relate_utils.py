@@ -24,11 +24,18 @@ THE SOFTWARE.
 """
 
 import operator
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
-from relate.utils import TIMED_OUT, call_with_timeout
+from relate.utils import (
+    TIMED_OUT,
+    CallWithTimeoutPool,
+    WorkerPoolFull,
+    call_with_timeout,
+)
 
 
 def _return_value(x):
@@ -48,6 +55,15 @@ def _large_integer_calc() -> int:
     return 10000000**10000000
 
 
+def _get_pid() -> int:
+    return os.getpid()
+
+
+def _sympy_check_equality(a, b):
+    from course.expr_evaluation import sympy_check_equality
+    return sympy_check_equality(a, b)
+
+
 class TestCallWithTimeout:
     def test_returns_result_on_success(self):
         result = call_with_timeout(5, _return_value, 42)
@@ -76,3 +92,66 @@ class TestCallWithTimeout:
     def test_complex_return_value(self):
         result = call_with_timeout(5, _return_value, {"key": [1, 2, 3]})
         assert result == {"key": [1, 2, 3]}
+
+
+class TestCallWithTimeoutPool:
+    @pytest.fixture
+    def pool(self):
+        pool = CallWithTimeoutPool(size=1, max_queued=0)
+        yield pool
+        pool.close()
+
+    def test_reuses_worker(self, pool):
+        pid = pool.call(30, _get_pid)
+        assert pid != os.getpid()
+        assert pool.call(5, _get_pid) == pid
+        assert pool.call(5, operator.add, 3, 4) == 7
+
+    def test_replaces_timed_out_worker(self, pool):
+        pid = pool.call(30, _get_pid)
+        assert pool.call(1, _sleep_and_return, 10.0, "never") is TIMED_OUT
+
+        new_pid = pool.call(30, _get_pid)
+        assert new_pid != pid
+        assert pool.call(5, _return_value, 42) == 42
+
+    def test_replaces_interrupted_worker(self, pool):
+        from multiprocessing.connection import Connection
+        from unittest import mock
+
+        pid = pool.call(30, _get_pid)
+        with (mock.patch.object(Connection, "poll", side_effect=KeyboardInterrupt),
+                pytest.raises(KeyboardInterrupt)):
+            pool.call(5, _return_value, 42)
+
+        # the interrupted worker still owes a reply and must not be reused
+        assert pool.call(30, _get_pid) != pid
+        assert pool.call(5, _return_value, 42) == 42
+
+    def test_raises_exception_on_error(self, pool):
+        with pytest.raises(ValueError, match="boom"):
+            pool.call(30, _raise_value_error, "boom")
+        assert pool.call(5, _return_value, None) is None
+
+    def test_bounded_queue(self, pool):
+        pool.call(30, _get_pid)
+
+        with ThreadPoolExecutor(1) as executor:
+            busy = executor.submit(pool.call, 5, _sleep_and_return, 1.0, "done")
+            time.sleep(0.2)
+            with pytest.raises(WorkerPoolFull):
+                pool.call(5, _return_value, 42)
+            assert busy.result() == "done"
+
+        assert pool.call(5, _return_value, 42) == 42
+
+    def test_call_with_timeout_off_main_thread(self):
+        with ThreadPoolExecutor(2) as executor:
+            futures = [
+                executor.submit(call_with_timeout, 10,
+                    _sympy_check_equality, f"{i}*x + x", f"{i+1}*x")
+                for i in range(10)]
+            assert all(future.result() for future in futures)
+
+            assert executor.submit(call_with_timeout, 1,
+                _sleep_and_return, 10.0, "never").result() is TIMED_OUT
@@ -23,6 +23,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import io
+import shutil
+import zipfile
+
 import celery
 import pytest
 from django.test import TestCase, override_settings
@@ -32,10 +36,12 @@ from packaging.version import parse as parse_version
 from course import models
 from course.datespec import Datespec
 from course.tasks import (
+    build_submission_archive,
     expire_in_progress_sessions,
     finish_in_progress_sessions,
     purge_page_view_data,
     recalculate_ended_sessions,
+    refresh_flow_analytics_snapshot,
     regrade_flow_sessions,
 )
 from tests import factories
@@ -590,6 +596,114 @@ class PurgePageViewDataTaskTest(TwoCoursePageTestMixin,
     # }}}
 
 
+class BuildSubmissionArchiveTest(TaskTestMixin, TestCase):
+    # test tasks.build_submission_archive
+    def setUp(self):
+        super().setUp()
+
+        import tempfile
+
+        from django.core.files.storage import FileSystemStorage
+        storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage_dir)
+        self.storage = FileSystemStorage(storage_dir)
+        storage_overriding = override_settings(RELATE_BULK_STORAGE=self.storage)
+        storage_overriding.enable()
+        self.addCleanup(storage_overriding.disable)
+
+        self.course = factories.CourseFactory()
+        self.participations = factories.ParticipationFactory.create_batch(
+            size=3, course=self.course)
+        for ptpt in self.participations:
+            page_data = factories.FlowPageDataFactory(
+                flow_session=factories.FlowSessionFactory(participation=ptpt))
+            factories.FlowPageVisitFactory(
+                page_data=page_data, answer={"answer": ptpt.user.username},
+                is_submitted_answer=True)
+
+        fake_page = mock.MagicMock()
+        fake_page.normalized_bytes_answer.side_effect = (
+            lambda page_context, page_data, answer_data:
+            (".txt", answer_data["answer"].encode()))
+
+        page_cache_patcher = mock.patch("course.utils.PageInstanceCache")
+        mock_page_cache = page_cache_patcher.start()
+        mock_page_cache.return_value.get_page.return_value = fake_page
+        self.addCleanup(page_cache_patcher.stop)
+
+        repo_patcher = mock.patch("course.tasks.get_course_repo")
+        repo_patcher.start()
+        self.addCleanup(repo_patcher.stop)
+
+    def build(self):
+        self.storage.save("extra-upload", io.BytesIO(b"reference"))
+        return build_submission_archive(
+            self.course.pk, "some_sha", factories.DEFAULT_FLOW_ID,
+            "TestGroupId", "TestPageId",
+            which_attempt="last", non_in_progress_only=True,
+            restrict_to_rules_tag=None, include_feedback=False,
+            extra_file_name="solution.py",
+            extra_file_storage_name="extra-upload")
+
+    def test_archive(self):
+        result = self.build()
+
+        archive_name = result["download_url"].rstrip("/").split("/")[-1]
+        with self.storage.open(
+                f"submission-archives/{self.course.identifier}/{archive_name}"
+                ) as inf, zipfile.ZipFile(inf) as zf:
+            self.assertEqual(
+                sorted(zf.namelist()),
+                sorted([f"{ptpt.user.username}.txt"
+                        for ptpt in self.participations] + ["solution.py"]))
+            self.assertEqual(zf.read("solution.py"), b"reference")
+
+        self.assertFalse(self.storage.exists("extra-upload"))
+
+        # progress is reported per participant
+        self.assertEqual(self.mock_update_state.call_count, 3)
+        self.assertEqual(
+            self.mock_update_state.call_args.kwargs["meta"],
+            {"current": 3, "total": 3})
+
+    def test_expired_archives_purged(self):
+        from course.grades import purge_expired_submission_archives
+
+        result = self.build()
+        archive_name = result["download_url"].rstrip("/").split("/")[-1]
+        course_dir = f"submission-archives/{self.course.identifier}"
+
+        purge_expired_submission_archives(self.course)
+        self.assertTrue(self.storage.exists(f"{course_dir}/{archive_name}"))
+
+        with mock.patch("course.grades.now") as mock_now:
+            mock_now.return_value = now() + timedelta(days=2)
+            purge_expired_submission_archives(self.course)
+        self.assertFalse(self.storage.exists(f"{course_dir}/{archive_name}"))
+
+
+class RefreshFlowAnalyticsSnapshotTest(TaskTestMixin, TestCase):
+    # test tasks.refresh_flow_analytics_snapshot
+    def test_refresh(self):
+        course = factories.CourseFactory(active_git_commit_sha="abcdef")
+
+        with mock.patch("course.tasks.get_course_repo") as mock_get_repo, \
+                mock.patch(
+                    "course.analytics.update_flow_analytics_snapshot"
+                    ) as mock_update:
+            result = refresh_flow_analytics_snapshot(
+                    course.pk, QUIZ_FLOW_ID, restrict_to_first_attempt=True)
+
+        self.assertIn(QUIZ_FLOW_ID, result["message"])
+        actx, flow_id = mock_update.call_args.args
+        self.assertEqual(actx.course, course)
+        self.assertEqual(actx.course_commit_sha, b"abcdef")
+        self.assertEqual(flow_id, QUIZ_FLOW_ID)
+        self.assertEqual(mock_update.call_args.kwargs, {
+            "restrict_to_first_attempt": True, "full": False})
+        mock_get_repo.return_value.close.assert_called_once_with()
+
+
 @pytest.mark.slow
 class TasksTestsWithCeleryDependency(SingleCourseTestMixin, TestCase):
     """
@@ -1741,6 +1741,170 @@ class GetFacilitiesConfigTest(unittest.TestCase):
             self.assertIsNone(utils.get_facilities_config())
 
 
+def make_facilities_config(rng, nfacilities, nranges):
+    from ipaddress import IPv4Network, IPv6Network
+
+    def random_network():
+        if rng.random() < 0.8:
+            prefixlen = rng.randint(8, 32)
+            return IPv4Network((rng.getrandbits(32), prefixlen), strict=False)
+        else:
+            prefixlen = rng.randint(16, 128)
+            return IPv6Network((rng.getrandbits(128), prefixlen), strict=False)
+
+    return {
+            f"facility{i}": {
+                "ip_ranges": [
+                    str(random_network()) for _j in range(nranges)],
+                }
+            for i in range(nfacilities)}
+
+
+def find_facilities_linearly(facilities_config, address):
+    # the implementation FacilityIndex replaces
+    from ipaddress import ip_network
+    return frozenset(
+            name
+            for name, props in facilities_config.items()
+            for ir in props.get("ip_ranges", [])
+            if address in ip_network(str(ir)))
+
+
+class FacilityIndexTest(unittest.TestCase):
+    # utils.FacilityIndex, utils.get_facility_index
+
+    def test_lookup(self):
+        from ipaddress import IPv4Network, ip_address
+
+        index = utils.FacilityIndex({
+            "campus": {"ip_ranges": ["10.0.0.0/8", "2001:db8::/32"]},
+            "lab": {"ip_ranges": [IPv4Network("10.1.2.0/24"), "10.1.3.0/24"]},
+            "empty": {},
+            "single": {"ip_ranges": ["10.1.2.255"]},
+            })
+
+        for address, expected in [
+                ("9.255.255.255", set()),
+                ("10.0.0.0", {"campus"}),
+                ("10.1.1.255", {"campus"}),
+                ("10.1.2.0", {"campus", "lab"}),
+                ("10.1.2.255", {"campus", "lab", "single"}),
+                ("10.1.3.255", {"campus", "lab"}),
+                ("10.1.4.0", {"campus"}),
+                ("10.255.255.255", {"campus"}),
+                ("11.0.0.0", set()),
+                ("2001:db8::1", {"campus"}),
+                ("2001:db9::", set()),
+                ("::ffff:10.1.2.3", set()),
+                ("::", set()),
+                ]:
+            with self.subTest(address=address):
+                self.assertEqual(
+                        index.get_facilities(ip_address(address)), expected)
+
+        self.assertEqual(
+                utils.FacilityIndex({}).get_facilities(ip_address("10.0.0.1")),
+                set())
+
+    def test_matches_linear_scan(self):
+        import random
+        from ipaddress import IPv4Address, IPv6Address, ip_network
+
+        rng = random.Random(17)
+        for _i in range(20):
+            config = make_facilities_config(rng, 5, 10)
+            index = utils.FacilityIndex(config)
+
+            addresses = [IPv4Address(rng.getrandbits(32)) for _j in range(100)]
+            for props in config.values():
+                for ir in props["ip_ranges"]:
+                    network = ip_network(ir)
+                    addresses.extend([
+                        network.network_address, network.broadcast_address])
+                    if int(network.network_address):
+                        addresses.append(network.network_address - 1)
+            addresses.extend(
+                    IPv6Address(rng.getrandbits(128)) for _j in range(20))
+
+            for address in addresses:
+                self.assertEqual(
+                        index.get_facilities(address),
+                        find_facilities_linearly(config, address),
+                        str(address))
+
+    def test_cache(self):
+        config = {"lab": {"ip_ranges": ["10.0.0.0/8"]}}
+        index = utils.get_facility_index(config)
+        self.assertIs(utils.get_facility_index(config), index)
+
+        # equal configuration from a callable RELATE_FACILITIES
+        self.assertIs(utils.get_facility_index(deepcopy(config)), index)
+
+        config = {"lab": {"ip_ranges": ["10.0.0.0/16"]}}
+        new_index = utils.get_facility_index(config)
+        self.assertIsNot(new_index, index)
+        self.assertIs(utils.get_facility_index(config), new_index)
+
+    def test_middleware(self):
+        request = RequestFactory().get("/", REMOTE_ADDR="192.168.1.5")
+        request.session = {}
+        get_response = mock.MagicMock()
+
+        with override_settings(RELATE_FACILITIES={
+                "lab": {"ip_ranges": ["192.168.1.0/24"]},
+                "other": {"ip_ranges": ["192.168.2.0/24"]},
+                }):
+            utils.FacilityFindingMiddleware(get_response)(request)
+        self.assertEqual(request.relate_facilities, frozenset(["lab"]))
+
+        request.session["relate_pretend_facilities"] = ["other"]
+        utils.FacilityFindingMiddleware(get_response)(request)
+        self.assertEqual(request.relate_facilities, frozenset(["other"]))
+
+
+@pytest.mark.slow
+class FacilityIndexBenchmarkTest(unittest.TestCase):
+    """Compare facility lookup for 50 facilities with 20 IP ranges each
+    against the linear scan it replaces. Run with ``--slow``.
+    """
+
+    def test_benchmark(self):
+        import random
+        from ipaddress import IPv4Address
+        from time import perf_counter
+
+        rng = random.Random(42)
+        config = make_facilities_config(rng, 50, 20)
+        addresses = [IPv4Address(rng.getrandbits(32)) for _i in range(1000)]
+
+        start = perf_counter()
+        expected = [
+                find_facilities_linearly(config, address) for address in addresses]
+        linear_time = (perf_counter() - start) / len(addresses)
+
+        start = perf_counter()
+        utils.get_facility_index(config)
+        build_time = perf_counter() - start
+
+        start = perf_counter()
+        result = [
+                utils.get_facility_index(config).get_facilities(address)
+                for address in addresses]
+        index_time = (perf_counter() - start) / len(addresses)
+
+        # a callable RELATE_FACILITIES returns a new dictionary every time
+        configs = [deepcopy(config) for _i in range(len(addresses))]
+        start = perf_counter()
+        for address, request_config in zip(addresses, configs, strict=True):
+            utils.get_facility_index(request_config).get_facilities(address)
+        callable_time = (perf_counter() - start) / len(addresses)
+
+        self.assertEqual(result, expected)
+        self.assertLess(index_time, linear_time)
+        self.assertLess(callable_time, linear_time)
+        self.assertLess(build_time, 1)
+
+
 class FlowPageContextTest(SingleCourseQuizPageTestMixin, TestCase):
 
     flow_id = QUIZ_FLOW_ID